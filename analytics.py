@@ -0,0 +1,144 @@
+from bisect import bisect_left, insort
+from typing import Iterable, List
+
+
+class SortedAmounts:
+    """Sorted multiset of numbers kept in bounded buckets.
+
+    Inserts only shift one bucket instead of the whole list, and order
+    statistics walk the bucket sizes rather than the values. Buckets are
+    copied before the first insert after a :meth:`view`, so views share
+    the untouched ones.
+    """
+
+    def __init__(self, load: int = 1000):
+        self.load = load
+        self._buckets: List[list] = []
+        self._maxes: list = []
+        self._len = 0
+        # ids of the buckets created since the last view, which no view shares
+        self._owned = set()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, value) -> None:
+        self._len += 1
+        if not self._buckets:
+            bucket = [value]
+            self._buckets.append(bucket)
+            self._maxes.append(value)
+            self._owned.add(id(bucket))
+            return
+        i = bisect_left(self._maxes, value)
+        if i == len(self._buckets):
+            i -= 1
+            self._maxes[i] = value
+        bucket = self._buckets[i]
+        if id(bucket) not in self._owned:
+            bucket = self._buckets[i] = list(bucket)
+            self._owned.add(id(bucket))
+        insort(bucket, value)
+        if len(bucket) > 2 * self.load:
+            left, right = bucket[:self.load], bucket[self.load:]
+            self._buckets[i:i + 1] = [left, right]
+            self._maxes[i:i + 1] = [left[-1], right[-1]]
+            self._owned.update((id(left), id(right)))
+
+    def __getitem__(self, k: int):
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError('index out of range')
+        for bucket in self._buckets:
+            if k < len(bucket):
+                return bucket[k]
+            k -= len(bucket)
+
+    def max(self):
+        return self._maxes[-1]
+
+    def view(self) -> "SortedAmounts":
+        """A read-only copy of the amounts as they are now, sharing their buckets."""
+        view = SortedAmounts(self.load)
+        view._buckets = list(self._buckets)
+        view._maxes = list(self._maxes)
+        view._len = self._len
+        self._owned = set()
+        return view
+
+
+class TransactionStats:
+    """Running sum, count, max and order statistics over transaction amounts.
+
+    Each block is ingested once, so every statistic is answered without
+    rescanning the chain. Amounts equal to ``exclude_amount`` (the genesis
+    issuance) are skipped, matching the chain's historic statistics.
+    """
+
+    def __init__(self, exclude_amount=None):
+        self.exclude_amount = exclude_amount
+        self.amounts = SortedAmounts()
+        self.total = 0
+        self._view = None
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def apply_block(self, block: dict) -> None:
+        for tx in block['transactions']:
+            amount = tx['amount']
+            if amount == self.exclude_amount:
+                continue
+            self.amounts.add(amount)
+            self.total += amount
+            self._view = None
+
+    def rebuild(self, chain: Iterable[dict]) -> None:
+        self.amounts = SortedAmounts()
+        self.total = 0
+        self._view = None
+        for block in chain:
+            self.apply_block(block)
+
+    def view(self) -> "TransactionStats":
+        """A read-only copy of the statistics as they are now, reused until the next change."""
+        if self._view is None:
+            view = TransactionStats(self.exclude_amount)
+            view.amounts = self.amounts.view()
+            view.total = self.total
+            self._view = view
+        return self._view
+
+    def mean(self):
+        if not self.amounts:
+            return 0
+        return self.total / len(self.amounts)
+
+    def max(self):
+        if not self.amounts:
+            return 0
+        return self.amounts.max()
+
+    def percentile(self, p):
+        """Linearly interpolated percentile for ``p`` in ``[0, 100]``."""
+        if not self.amounts:
+            return 0
+        if not 0 <= p <= 100:
+            raise ValueError('percentile must be between 0 and 100')
+        rank = (len(self.amounts) - 1) * p / 100
+        lower = int(rank)
+        fraction = rank - lower
+        low_value = self.amounts[lower]
+        if not fraction:
+            return low_value
+        return low_value + (self.amounts[lower + 1] - low_value) * fraction
+
+    def median(self):
+        if not self.amounts:
+            return 0
+        n = len(self.amounts)
+        mid = n // 2
+        if n % 2:
+            return self.amounts[mid]
+        return (self.amounts[mid - 1] + self.amounts[mid]) / 2
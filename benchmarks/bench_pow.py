@@ -0,0 +1,93 @@
+"""Compare the proof-of-work hashing fast path against full re-serialization.
+
+Usage: python benchmarks/bench_pow.py [--attempts 20000] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from discard_token import DiscardToken  # noqa: E402
+from mining import NonceHasher  # noqa: E402
+
+
+def make_block(num_transactions):
+    transactions = [
+        {
+            'sender': '%064x' % random.getrandbits(256),
+            'recipient': '%064x' % random.getrandbits(256),
+            'amount': random.randint(1, 1000),
+            'fee': 1,
+            'timestamp': time.time(),
+            'nonce': random.random(),
+            'transaction_hash': '%064x' % random.getrandbits(256),
+            'signature': '%0140x' % random.getrandbits(560),
+        }
+        for _ in range(num_transactions)
+    ]
+    return {
+        'index': 1,
+        'timestamp': time.time(),
+        'transactions': transactions,
+        'previous_hash': '%064x' % random.getrandbits(256),
+        'difficulty': 4,
+        'nonce': 0,
+    }
+
+
+def time_serializing(block, attempts):
+    block = dict(block)
+    start = time.perf_counter()
+    for nonce in range(attempts):
+        block['nonce'] = nonce
+        DiscardToken.get_block_hash(block)
+    return time.perf_counter() - start
+
+
+def time_fast_path(block, attempts):
+    start = time.perf_counter()
+    hasher = NonceHasher(block)
+    for nonce in range(attempts):
+        hasher.hash(nonce)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=20000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        block = make_block(size)
+        # The fast path must agree with get_block_hash before its timing means anything
+        check = dict(block, nonce=12345)
+        assert NonceHasher(block).hash(12345) == DiscardToken.get_block_hash(check)
+        attempts = max(args.attempts // max(size // 10, 1), 200)
+        slow = time_serializing(block, attempts)
+        fast = time_fast_path(block, attempts)
+        results.append({
+            'transactions': size,
+            'attempts': attempts,
+            'serializing_hashes_per_sec': attempts / slow,
+            'fast_path_hashes_per_sec': attempts / fast,
+            'speedup': slow / fast,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'txs':>6} {'attempts':>9} {'serialize H/s':>14} {'fast path H/s':>14} {'speedup':>8}")
+    for r in results:
+        print(f"{r['transactions']:>6} {r['attempts']:>9} {r['serializing_hashes_per_sec']:>14.0f} "
+              f"{r['fast_path_hashes_per_sec']:>14.0f} {r['speedup']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
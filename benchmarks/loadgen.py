@@ -0,0 +1,221 @@
+"""Drive a running node with signed transactions and report throughput and latency.
+
+Funded wallets are prepared first, by mining block rewards to them, and
+every transaction is signed before the clock starts. Transactions are then
+submitted at ``--rate`` per second (or as fast as ``--concurrency`` allows),
+either one per ``POST /chain`` or in ``--batch-size`` batches. A block
+watcher records when each transaction is confirmed.
+
+Usage: python benchmarks/loadgen.py [--url http://127.0.0.1:5000] [--transactions 1000]
+                                    [--rate 200] [--concurrency 16] [--batch-size 0]
+                                    [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from discard_token import DiscardToken  # noqa: E402
+from sdk import AsyncSDKChain, SDKChain  # noqa: E402
+
+MINING_REWARD = 50
+
+
+def percentiles(values):
+    """Nearest-rank p50/p95/p99 plus mean and max, in milliseconds."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def rank(p):
+        return values[max(math.ceil(len(values) * p / 100) - 1, 0)] * 1000
+
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) * 1000,
+        'p50': rank(50),
+        'p95': rank(95),
+        'p99': rank(99),
+        'max': values[-1] * 1000,
+    }
+
+
+def load_or_fund_wallets(client, count, needed, wallet_file=None):
+    """Return ``count`` wallets holding at least ``needed`` tokens each, mining rewards to them as required."""
+    wallets = []
+    if wallet_file and os.path.exists(wallet_file):
+        with open(wallet_file) as f:
+            wallets = json.load(f)[:count]
+    while len(wallets) < count:
+        wallets.append(DiscardToken.create_wallet())
+    for i, wallet in enumerate(wallets):
+        balance = client.get_balance(wallet['address'])
+        have = balance['data'].get('balance', 0) if balance['status'] == 200 else 0
+        while have <= needed:
+            result = client.mine(wallet['address'])
+            if result['status'] != 201:
+                raise SystemExit(f"Funding wallet {i} failed: {result['data']}")
+            have += MINING_REWARD
+        print(f"wallet {i + 1}/{count} funded with {have}", file=sys.stderr)
+    if wallet_file:
+        with open(wallet_file, 'w') as f:
+            json.dump(wallets, f)
+    return wallets
+
+
+def sign_transactions(wallets, total, amount, fee):
+    """Round-robin transfers between the wallets, each signed by its sender."""
+    transactions = []
+    for i in range(total):
+        sender = wallets[i % len(wallets)]
+        recipient = wallets[(i + 1) % len(wallets)]
+        transactions.append(SDKChain.create_transaction(
+            sender['private_key'], sender['address'], recipient['address'], amount, fee=fee))
+    return transactions
+
+
+class BlockWatcher(threading.Thread):
+    """Polls for new blocks and records when each transaction was first seen confirmed."""
+
+    def __init__(self, client, interval=0.05):
+        super().__init__(name='block-watcher', daemon=True)
+        self.client = client
+        self.interval = interval
+        self.confirmed_at = {}
+        self._halt = threading.Event()
+        self.height = client.get_total_blocks()['data']['total_blocks']
+
+    def run(self):
+        while not self._halt.is_set():
+            self.poll()
+            self._halt.wait(self.interval)
+
+    def poll(self):
+        tip = self.client.get_total_blocks()['data']['total_blocks']
+        while self.height < tip:
+            block = self.client.get_block(self.height + 1)['data']
+            now = time.perf_counter()
+            for tx in block.get('transactions', []):
+                self.confirmed_at.setdefault(tx.get('transaction_hash'), now)
+            self.height += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+        self.poll()
+
+
+async def submit_all(url, units, rate, concurrency, batch):
+    """Submit each unit (a transaction or a batch) and record ``(start, elapsed, results)`` per unit."""
+    records = [None] * len(units)
+    limit = asyncio.Semaphore(concurrency)
+    async with AsyncSDKChain(base_url=url, max_concurrency=concurrency) as client:
+        begin = time.perf_counter()
+
+        async def send(i, unit):
+            if rate:
+                delay = begin + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    if batch:
+                        resp = await client.post_transactions(unit)
+                        results = resp['data'].get('results') or [
+                            {'status': False, 'error': f"HTTP {resp['status']}"}] * len(unit)
+                    else:
+                        resp = await client.post_transaction(unit)
+                        ok = resp['status'] in (201, 202)
+                        results = [{'status': ok, 'error': None if ok else resp['data'].get('error', resp['status'])}]
+                except Exception as e:  # connection errors count as failures, not crashes
+                    results = [{'status': False, 'error': type(e).__name__}] * (len(unit) if batch else 1)
+                records[i] = (start, time.perf_counter() - start, results)
+
+        await asyncio.gather(*(send(i, unit) for i, unit in enumerate(units)))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--transactions', type=int, default=1000)
+    parser.add_argument('--wallets', type=int, default=10)
+    parser.add_argument('--wallet-file', help='reuse funded wallets from (and save them to) this JSON file')
+    parser.add_argument('--amount', type=int, default=1)
+    parser.add_argument('--fee', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='target submissions (requests) per second; 0 submits as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help='transactions per POST /transactions/batch; 0 posts each to /chain')
+    parser.add_argument('--confirm-timeout', type=float, default=30,
+                        help='seconds to wait for confirmations after the last submission')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    client = SDKChain('chain', base_url=args.url)
+    per_wallet = -(-args.transactions // args.wallets) * (args.amount + args.fee)
+    wallets = load_or_fund_wallets(client, args.wallets, per_wallet, args.wallet_file)
+    transactions = sign_transactions(wallets, args.transactions, args.amount, args.fee)
+    if args.batch_size:
+        units = [transactions[i:i + args.batch_size] for i in range(0, len(transactions), args.batch_size)]
+    else:
+        units = transactions
+    print(f"submitting {len(transactions)} transactions in {len(units)} requests", file=sys.stderr)
+
+    watcher = BlockWatcher(client)
+    watcher.start()
+    begin = time.perf_counter()
+    records = asyncio.run(submit_all(args.url, units, args.rate, args.concurrency, bool(args.batch_size)))
+    submit_duration = time.perf_counter() - begin
+
+    submitted_at = {}
+    request_latencies = []
+    errors = Counter()
+    for unit, (start, elapsed, results) in zip(units, records):
+        request_latencies.append(elapsed)
+        for tx, result in zip(unit if args.batch_size else [unit], results):
+            if result['status']:
+                submitted_at[tx['transaction_hash']] = start
+            else:
+                errors[str(result.get('error'))] += 1
+
+    deadline = time.time() + args.confirm_timeout
+    while time.time() < deadline and not submitted_at.keys() <= watcher.confirmed_at.keys():
+        time.sleep(0.1)
+    watcher.stop()
+    confirm_latencies = [watcher.confirmed_at[h] - start for h, start in submitted_at.items()
+                         if h in watcher.confirmed_at]
+    last_confirmed = max((watcher.confirmed_at[h] for h in submitted_at if h in watcher.confirmed_at),
+                         default=begin)
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'submitted': len(transactions),
+        'accepted': len(submitted_at),
+        'rejected': len(transactions) - len(submitted_at),
+        'errors': dict(errors),
+        'submit_duration': submit_duration,
+        'accepted_tps': len(submitted_at) / submit_duration if submit_duration else 0.0,
+        'confirmed': len(confirm_latencies),
+        'confirmed_tps': len(confirm_latencies) / (last_confirmed - begin) if last_confirmed > begin else 0.0,
+        'submit_latency_ms': percentiles(request_latencies),
+        'confirmation_latency_ms': percentiles(confirm_latencies),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Time DiscardToken hot paths on synthetic chains and compare against a saved baseline.
+
+Synthetic chains of each ``--sizes`` block count are generated once, straight
+into a storage file under ``--fixture-dir``, and reused by later runs. Every
+run works on a copy, so the fixtures never change.
+
+Usage: python benchmarks/microbench.py [--sizes 1000 10000 100000] [--json]
+                                       [--save-baseline base.json] [--baseline base.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from blocks import Block  # noqa: E402
+from discard_token import DiscardToken  # noqa: E402
+from mining import ParallelMiner  # noqa: E402
+
+ADDRESSES = 1000
+FUNDED_REWARD = 10 ** 9
+
+
+def generate_chain(path, size, txs_per_block):
+    """Write a chain of ``size`` blocks after genesis to ``path`` and the funded wallet next to it.
+
+    Block 1 pays a large reward to a real wallet so signed transactions can
+    be admitted; the remaining blocks carry unsigned transfers between
+    random addresses with valid difficulty-1 proof of work.
+    """
+    chain = DiscardToken(path)
+    wallet = chain.create_wallet()
+    addresses = ['%064x' % random.getrandbits(256) for _ in range(ADDRESSES)]
+    blocks = []
+    previous = chain.chain[-1]
+    for index in range(1, size + 1):
+        if index == 1:
+            transactions = [chain.create_transaction('', wallet['address'], FUNDED_REWARD, fee=0)]
+        else:
+            transactions = [
+                chain.create_transaction(random.choice(addresses), random.choice(addresses),
+                                         random.randint(1, 1000))
+                for _ in range(txs_per_block)
+            ]
+        block = {
+            'index': index,
+            'timestamp': time.time(),
+            'transactions': transactions,
+            'previous_hash': previous['hash'],
+            'difficulty': 1,
+            'nonce': 0,
+        }
+        nonce, block_hash, _ = ParallelMiner._mine_inline(block, 1)
+        block['nonce'] = nonce
+        previous = Block(block, hash=block_hash)
+        blocks.append(previous)
+    chain.store.replace_blocks_from(1, blocks)
+    chain.store.set_state('difficulty', 1)
+    chain.store.close()
+    with open(path + '.wallet.json', 'w') as f:
+        json.dump(wallet, f)
+
+
+def fixture(fixture_dir, size, txs_per_block, regenerate=False):
+    path = os.path.join(fixture_dir, f'chain-{size}-{txs_per_block}.db')
+    if regenerate or not os.path.exists(path + '.wallet.json'):
+        for stale in (path, path + '.wallet.json'):
+            if os.path.exists(stale):
+                os.remove(stale)
+        print(f"generating {size}-block chain at {path}", file=sys.stderr)
+        generate_chain(path, size, txs_per_block)
+    with open(path + '.wallet.json') as f:
+        return path, json.load(f)
+
+
+def timed(func, repeat, number=1):
+    """Seconds per call: median and minimum over ``repeat`` runs of ``number`` calls."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {'median': statistics.median(samples), 'min': min(samples), 'calls': repeat * number}
+
+
+def run_size(path, wallet, repeat, lookups):
+    work_dir = tempfile.mkdtemp(prefix='microbench-')
+    copy = os.path.join(work_dir, 'chain.db')
+    shutil.copy(path, copy)
+    try:
+        results = {'load_state': timed(lambda: DiscardToken(copy).store.close(), repeat)}
+        chain = DiscardToken(copy)
+        hashes = [tx['transaction_hash'] for block in chain.chain for tx in block['transactions']]
+        addresses = list(chain.address_registry.sorted())
+        sample_hashes = iter(random.choices(hashes, k=repeat * lookups))
+        sample_addresses = iter(random.choices(addresses, k=repeat * lookups))
+        results['get_wallet_balance'] = timed(lambda: chain.get_wallet_balance(next(sample_addresses)),
+                                              repeat, lookups)
+        results['get_tx'] = timed(lambda: chain.get_tx(next(sample_hashes)), repeat, lookups)
+
+        signed = iter([
+            chain.create_transaction(wallet['address'], random.choice(addresses), 1, wallet['private_key'])
+            for _ in range(repeat * lookups)
+        ])
+        results['add_transaction'] = timed(lambda: chain.add_transaction(next(signed)), repeat, lookups)
+
+        results['tx_largest'] = timed(chain.get_largest_transaction_amount, repeat, lookups)
+        results['tx_average'] = timed(chain.get_average_transaction_amount, repeat, lookups)
+        results['tx_median'] = timed(chain.get_median_transaction_amount, repeat, lookups)
+        results['tx_percentile'] = timed(lambda: chain.get_transaction_amount_percentile(95), repeat, lookups)
+
+        results['is_chain_valid_full'] = timed(lambda: chain.is_chain_valid(full=True), repeat)
+        results['is_chain_valid_incremental'] = timed(lambda: chain.is_chain_valid(full=False), repeat)
+
+        # Attempts per solution are random, so proof of work is reported per attempt
+        chain.difficulty = 3
+        candidate = chain.create_block(chain.mempool.select(500))
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chain.proof_of_work(dict(candidate))
+            samples.append((time.perf_counter() - start) / chain.last_mining_stats['attempts'])
+        results['proof_of_work_attempt'] = {'median': statistics.median(samples), 'min': min(samples),
+                                            'calls': repeat}
+
+        results['save_state'] = timed(chain._save_state, repeat)
+        chain.store.close()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold):
+    """Return ``(size, op, ratio)`` for every timing slower than ``threshold`` times its baseline."""
+    regressions = []
+    for size, ops in results.items():
+        for op, timing in ops.items():
+            base = baseline.get(size, {}).get(op)
+            if base and base['min'] > 0:
+                ratio = timing['min'] / base['min']
+                timing['baseline_ratio'] = ratio
+                if ratio > threshold:
+                    regressions.append((size, op, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--txs-per-block', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--lookups', type=int, default=200, help='calls per repeat for the fast operations')
+    parser.add_argument('--fixture-dir', default=os.path.join(tempfile.gettempdir(), 'discard-token-bench'))
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the synthetic chains')
+    parser.add_argument('--baseline', help='compare against results saved with --save-baseline')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='flag timings more than this many times slower than the baseline')
+    parser.add_argument('--save-baseline', help='write these results to a file for later comparison')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    os.makedirs(args.fixture_dir, exist_ok=True)
+    results = {}
+    for size in args.sizes:
+        path, wallet = fixture(args.fixture_dir, size, args.txs_per_block, args.regenerate)
+        results[str(size)] = run_size(path, wallet, args.repeat, args.lookups)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps({'results': results,
+                          'regressions': [{'size': s, 'op': o, 'ratio': r} for s, o, r in regressions]},
+                         indent=2))
+    else:
+        print(f"{'blocks':>7} {'operation':<28} {'median':>12} {'min':>12} {'vs base':>8}")
+        for size, ops in results.items():
+            for op, t in ops.items():
+                ratio = f"{t['baseline_ratio']:.2f}x" if 'baseline_ratio' in t else ''
+                print(f"{size:>7} {op:<28} {t['median'] * 1e6:>10.1f}us {t['min'] * 1e6:>10.1f}us {ratio:>8}")
+        for size, op, ratio in regressions:
+            print(f"REGRESSION: {op} on {size} blocks is {ratio:.2f}x the baseline")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import hashlib
+import json
+
+
+def canonical_json(data) -> bytes:
+    """The byte encoding that block and transaction hashes are computed over."""
+    return json.dumps(data, sort_keys=True).encode()
+
+
+class Block(dict):
+    """A block that can't be modified, with its canonical JSON and hash computed once.
+
+    ``canonical`` holds the serialized block without its ``'hash'`` field and
+    ``content_hash`` the SHA-256 of it, which is what ``hash`` must equal for
+    a valid block. It is still a plain ``dict`` to JSON encoders and callers.
+    Only the top level is frozen; code that needs to catch tampering with a
+    block's transactions must hash the contents again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.canonical = canonical_json({k: v for k, v in self.items() if k != 'hash'})
+        self.content_hash = hashlib.sha256(self.canonical).hexdigest()
+
+    @classmethod
+    def of(cls, block: dict) -> "Block":
+        return block if isinstance(block, cls) else cls(block)
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Block is immutable; build a new one from dict(block)')
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        # The default pickling of dict subclasses restores items via __setitem__
+        return Block, (dict(self),)
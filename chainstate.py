@@ -0,0 +1,269 @@
+"""Single-writer access to a DiscardToken with snapshots for readers.
+
+Every mutation of the chain (admitting transactions, adding, mining and
+reorganizing blocks) is submitted to a :class:`ChainWriter`, which applies
+them one at a time, in submission order, on its own thread. After each
+batch of writes it publishes a new :class:`ChainSnapshot`; readers take
+``writer.snapshot`` once and get a consistent view of the chain, the
+mempool and the indexes built alongside them without waiting on the
+writer. A blockchain has one writer, found with :meth:`ChainWriter.of`.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from indexes import IndexQueries
+from journal import FrozenMap
+
+
+class ChainSnapshot(IndexQueries):
+    """An immutable view of the chain, its tip, the mempool and the indexes at one point in time.
+
+    It behaves like a read-only sequence of blocks. The blocks themselves are
+    shared with the live chain rather than copied: ``DiscardToken.chain`` is
+    only ever appended to or replaced by a new list, never changed in place,
+    so the first ``height + 1`` entries of the list a snapshot refers to
+    never change. The mempool and the indexes are read-only copies that
+    share everything a write didn't touch (see :mod:`journal`); the mempool
+    is listed into ``pending`` only when that is first read. The lookups of
+    :class:`indexes.IndexQueries` answer from those copies.
+    """
+
+    __slots__ = ('_chain', 'height', 'tip', 'tip_hash', 'difficulty', 'version', '_pool', '_pending',
+                 '_outgoing', 'balances', 'tx_index', 'address_registry', 'tx_stats')
+
+    def __init__(self, chain: list, tip_hash: str, difficulty: int, version: int, pool: FrozenMap,
+                 outgoing: FrozenMap, balances, tx_index, address_registry, tx_stats):
+        self._chain = chain
+        self.height = len(chain) - 1
+        self.tip = chain[-1]
+        self.tip_hash = tip_hash
+        self.difficulty = difficulty
+        self.version = version
+        self._pool = pool
+        self._pending = None
+        self._outgoing = outgoing
+        self.balances = balances
+        self.tx_index = tx_index
+        self.address_registry = address_registry
+        self.tx_stats = tx_stats
+
+    @property
+    def chain(self) -> "ChainSnapshot":
+        return self
+
+    @property
+    def pending(self) -> tuple:
+        """Pending transactions in arrival order."""
+        if self._pending is None:
+            self._pending = tuple(self._pool.values())
+        return self._pending
+
+    def get_pending_outgoing_total(self, address):
+        return self._outgoing.get(address, 0)
+
+    def __len__(self) -> int:
+        return self.height + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._chain[slice(*index.indices(self.height + 1))]
+        if index < 0:
+            index += self.height + 1
+        if not 0 <= index <= self.height:
+            raise IndexError('block index out of range')
+        return self._chain[index]
+
+    def __iter__(self):
+        for index in range(self.height + 1):
+            yield self._chain[index]
+
+    def __repr__(self) -> str:
+        return f'<ChainSnapshot height={self.height} version={self.version} pending={len(self._pool)}>'
+
+
+class ChainWriter:
+    """Applies chain mutations in order on one thread and publishes snapshots.
+
+    ``submit`` queues a call against the blockchain and returns a
+    ``Future``; ``call`` waits for its result. The writer drains whatever is
+    queued, up to ``max_batch`` calls, before publishing one snapshot, so a
+    burst of writes costs one snapshot. Futures complete only after the
+    snapshot reflecting them is published, so a caller always reads its own
+    writes.
+
+    Until :meth:`start` is called (in tests and scripts, say) calls run in
+    the caller's thread, still one at a time. Calls made from the writer
+    thread itself also run inline, so a write may make further writes.
+
+    Only one writer may be created per blockchain; it is kept as
+    ``blockchain.writer``.
+    """
+
+    _attach_lock = threading.RLock()
+
+    def __init__(self, blockchain, max_batch: int = 256):
+        with self._attach_lock:
+            if getattr(blockchain, 'writer', None) is not None:
+                raise ValueError('blockchain already has a writer; use ChainWriter.of')
+            blockchain.writer = self
+        self.blockchain = blockchain
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._inline = threading.RLock()
+        self._mining = threading.Lock()
+        self._version = 0
+        self.writes = 0
+        self.batches = 0
+        self.snapshot = self._take_snapshot()
+
+    @classmethod
+    def of(cls, blockchain) -> "ChainWriter":
+        """The writer of ``blockchain``, created on first use."""
+        with cls._attach_lock:
+            writer = getattr(blockchain, 'writer', None)
+            return writer if writer is not None else cls(blockchain)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name='chain-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Apply everything already queued, then stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue ``fn(*args, **kwargs)`` to run on the writer; returns a future for its result."""
+        future: Future = Future()
+        if self.running and threading.current_thread() is not self._thread:
+            self._queue.put((future, fn, args, kwargs))
+            return future
+        with self._inline:
+            outcome = self._apply(future, fn, args, kwargs)
+            if threading.current_thread() is not self._thread:
+                self._publish()
+        self._complete(future, outcome)
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the writer and return its result (or raise its exception)."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def add_transaction(self, transaction: dict) -> dict:
+        # Signatures are verified in the caller's thread; the writer only admits
+        if not self.blockchain.verifier.verify(transaction):
+            return {'status': False, 'error': 'Invalid Signature'}
+        return self.call(self.blockchain.add_transaction, transaction, verified=True)
+
+    def add_transactions(self, transactions: list) -> list:
+        verdicts = self.blockchain.verify_transactions(transactions)
+        return self.call(self.blockchain.add_transactions, transactions, verdicts)
+
+    def add_block(self, block: dict, verify_signatures: bool = True) -> bool:
+        if verify_signatures and not self.blockchain.verify_block_signatures(block):
+            return False
+        return self.call(self.blockchain.add_block, block, verify_signatures=False)
+
+    def is_chain_valid(self, full: bool = False, workers: Optional[int] = None) -> bool:
+        """Validate the chain, moving its verified checkpoint on the writer.
+
+        A full validation hashes every block, so it checks the current
+        snapshot in the calling thread and only records the result on the
+        writer.
+        """
+        if not full:
+            return self.call(self.blockchain.is_chain_valid, full=False, workers=workers)
+        snapshot = self.snapshot
+        chain = snapshot[:]
+        valid = self.blockchain.validate_chain(chain, snapshot.difficulty, workers)
+        return self.call(self.blockchain.record_validation, chain, valid)
+
+    def mine(self, miner_address: Optional[str] = None, max_transactions: Optional[int] = None) -> dict:
+        """Mine a block from the mempool without holding up other writes.
+
+        The candidate block is assembled on the writer, its proof of work is
+        found in the calling thread, and the result is committed on the
+        writer again. If the chain or the candidate's transactions changed
+        in the meantime, a new candidate is mined. One block is mined at a
+        time.
+        """
+        with self._mining:
+            while True:
+                block = self.call(self.blockchain.prepare_block, miner_address, max_transactions)
+                if block is None:
+                    return {'status': False, 'error': 'No transactions to mine'}
+                block_hash = self.blockchain.proof_of_work(block)
+                result = self.call(self.blockchain.commit_block, block, block_hash)
+                if result is not None:
+                    return result
+                logging.info("Chain changed while mining block %s, mining a new candidate", block['index'])
+
+    def _take_snapshot(self) -> ChainSnapshot:
+        blockchain = self.blockchain
+        pool, outgoing = blockchain.mempool.view()
+        return ChainSnapshot(blockchain.chain, blockchain.get_last_block_hash(), blockchain.difficulty,
+                             self._version, pool, outgoing, blockchain.balances.view(),
+                             blockchain.tx_index.view(pool), blockchain.address_registry.view(),
+                             blockchain.tx_stats.view())
+
+    def _publish(self) -> None:
+        self._version += 1
+        self.snapshot = self._take_snapshot()
+
+    def _apply(self, future: Future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return None
+        self.writes += 1
+        try:
+            return True, fn(*args, **kwargs)
+        except Exception as e:
+            # Raised again in the caller by Future.result()
+            return False, e
+
+    @staticmethod
+    def _complete(future: Future, outcome) -> None:
+        if outcome is None:
+            return
+        ok, value = outcome
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if not batch:
+                continue
+            with self._inline:
+                outcomes = [self._apply(future, fn, args, kwargs) for future, fn, args, kwargs in batch]
+                self._publish()
+            self.batches += 1
+            for (future, _, _, _), outcome in zip(batch, outcomes):
+                self._complete(future, outcome)
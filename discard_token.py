@@ -5,92 +5,148 @@ import json
 import time
 import logging
 import sqlite3
-from statistics import mean, median
 import string
+from concurrent.futures import ProcessPoolExecutor
 
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.exceptions import InvalidSignature
+
+from analytics import TransactionStats
+from blocks import Block, canonical_json
+from indexes import AddressRegistry, BalanceIndex, IndexQueries, TxIndex
+from mempool import Mempool
+from metrics import mining_duration, mining_hash_rate, mining_hashes
+from mining import ParallelMiner
+from storage import ChainStore
+from verification import REQUIRED_FIELDS, SignatureVerifier
+
+# Fixed so that every node creates the same genesis block and independent nodes can sync
+GENESIS_TIMESTAMP = 1700000000.0
+
+
+def _content_hash(block, use_cache):
+    if use_cache and isinstance(block, Block):
+        return block.content_hash
+    return DiscardToken.get_block_hash({k: block[k] for k in block if k != 'hash'})
+
+
+def _validate_blocks(blocks, default_difficulty, use_cache=False, first_hash=None):
+    """Check that ``blocks[1:]`` are correctly linked to each other and to ``blocks[0]``.
+
+    Each hash is computed once and reused as the next block's expected
+    ``previous_hash``. With ``use_cache`` the hashes cached on
+    :class:`Block` objects are trusted; otherwise every block is hashed from
+    its contents, which also catches edits to its transactions. A known
+    ``first_hash`` for ``blocks[0]`` saves hashing it. Module level so it
+    can run in a worker process.
+    """
+    prev_hash = _content_hash(blocks[0], use_cache) if first_hash is None else first_hash
+    for current in blocks[1:]:
+        if current['previous_hash'] != prev_hash:
+            return False
+        difficulty = current.get('difficulty', default_difficulty)
+        calculated_hash = _content_hash(current, use_cache)
+        if not calculated_hash.startswith('0' * difficulty):
+            return False
+        if calculated_hash != current['hash']:
+            return False
+        prev_hash = calculated_hash
+    return True
 
 
-class DiscardToken:
-    def __init__(self, storage_file='chain_data.db'):
+class DiscardToken(IndexQueries):
+    def __init__(self, storage_file='chain_data.db', mining_workers=1, verify_workers=1):
         self.tx_fee = 1
         self.genesis_hash = self.hash_str('DISKARDDDD DOLLARRRR TO THE MOONNNNNN!🚀')
         self.genesis_tokens = 99999999999999
+        genesis_payload = {
+            'sender': "GENESIS COIN BASE",
+            'recipient': "the_kings_wallet",
+            'amount': self.genesis_tokens,
+            'fee': 0,
+            'timestamp': GENESIS_TIMESTAMP,
+            'nonce': 0,
+        }
         self.genesis_block = {
             'index': 0,
-            "timestamp": time.time(),
-            'transactions': [
-                self.create_transaction(
-                    "GENESIS COIN BASE",
-                    "the_kings_wallet",
-                    self.genesis_tokens,
-                    fee=0
-                )
-            ],
+            "timestamp": GENESIS_TIMESTAMP,
+            'transactions': [dict(genesis_payload, transaction_hash=self.hash_str(genesis_payload))],
             'previous_hash': self.genesis_hash,
         }
         self.difficulty = 4
         self.max_difficulty = 6
         self.target_block_time = 1.0
         self.mining_reward = 50
+        self.miner = ParallelMiner(workers=mining_workers)
+        self.last_mining_stats = {}
+        self.verifier = SignatureVerifier(workers=verify_workers)
         self.genesis_block['nonce'] = 0
-        self.genesis_block['hash'] = self.get_block_hash(self.genesis_block)
+        self.genesis_block = Block(self.genesis_block, hash=self.get_block_hash(self.genesis_block))
         self.chain = [self.genesis_block]
-        self.current_trans = []
+        self.mempool = Mempool()
+        self.balances = BalanceIndex()
+        self.tx_index = TxIndex(pending=self.mempool)
+        self.address_registry = AddressRegistry()
+        self.tx_stats = TransactionStats(exclude_amount=self.genesis_tokens)
+        self._reset_validation_checkpoint()
+        # The chainstate.ChainWriter that applies this chain's writes, once one is created
+        self.writer = None
         self.storage_file = storage_file
         self._init_db()
         self._load_state()
-        self._save_state()
+        if not self.store.block_count():
+            self._save_state()
 
     def _init_db(self):
-        """Create the database and state table if they do not exist."""
-        self.conn = sqlite3.connect(self.storage_file)
-        with self.conn:
-            self.conn.execute(
-                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)"
-            )
+        """Open the database, creating and migrating its tables as needed."""
+        self.store = ChainStore(self.storage_file)
+        self.conn = self.store.conn
 
     def __del__(self):
-        if hasattr(self, 'conn'):
+        if hasattr(self, 'store'):
             try:
-                self.conn.close()
+                self.store.close()
             except Exception:
                 pass
 
     def _load_state(self):
         """Load chain and pending transactions from the database if available."""
         try:
-            cur = self.conn.cursor()
-            for key, attr in (
-                ("chain", "chain"),
-                ("pending", "current_trans"),
-                ("difficulty", "difficulty"),
-            ):
-                row = cur.execute("SELECT value FROM state WHERE key=?", (key,)).fetchone()
-                if row is not None:
-                    value = json.loads(row[0])
-                    setattr(self, attr, value)
+            chain = self.store.load_chain()
+            if chain:
+                self.chain = [Block(block) for block in chain]
+                self._reset_validation_checkpoint()
+            self.mempool.clear()
+            for tx, added_at in self.store.load_mempool():
+                # Keep the original arrival time so expiry carries across restarts
+                self.mempool.add(tx, now=added_at)
+            difficulty = self.store.get_state('difficulty')
+            if difficulty is not None:
+                self.difficulty = difficulty
+            self.tx_index.rebuild(self.chain)
+            self.address_registry.rebuild(self.chain)
+            self.tx_stats.rebuild(self.chain)
+            rows, height = self.store.load_balances()
+            if height == len(self.chain) - 1:
+                self.balances.load(rows, height)
+            else:
+                self.rebuild_balance_index()
         except (sqlite3.DatabaseError, json.JSONDecodeError) as e:
             logging.exception("Failed to load blockchain state: %s", e)
 
     def _save_state(self):
-        """Persist chain and pending transactions to the database."""
-        data = {
-            'chain': json.dumps(self.chain),
-            'pending': json.dumps(self.current_trans),
-            'difficulty': json.dumps(self.difficulty),
-        }
-        try:
-            with self.conn:
-                for k, v in data.items():
-                    self.conn.execute(
-                        "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
-                        (k, v),
-                    )
-        except sqlite3.DatabaseError as e:
-            logging.exception("Failed to save blockchain state: %s", e)
+        """Rewrite the whole chain, mempool and difficulty to the database.
+
+        Regular operation persists each change incrementally; this is only
+        needed to bootstrap a fresh database.
+        """
+        self.store.replace_all(self.chain, self.mempool, {'difficulty': self.difficulty},
+                               balances=self.balances.accounts, pending_arrival=self.mempool.added_at)
+
+    def rebuild_balance_index(self):
+        """Recompute every account balance from the chain and persist the result."""
+        self.balances.rebuild(self.chain)
+        self.store.replace_balances(self.balances.accounts, self.balances.height)
 
     def create_transaction(self, sender, recipient, amount, private_key_pem=None, fee=None):
         """Create and sign a transaction dict."""
@@ -124,44 +180,27 @@ class DiscardToken:
         return tx
 
     def _verify_transaction(self, transaction):
-        required = ['sender', 'recipient', 'amount', 'fee', 'timestamp', 'nonce',
-                    'transaction_hash', 'signature', 'public_key']
-        if not all(k in transaction for k in required):
-            return False
+        return self.verifier.verify(transaction)
 
-        payload = {
-            'sender': transaction['sender'],
-            'recipient': transaction['recipient'],
-            'amount': transaction['amount'],
-            'fee': transaction['fee'],
-            'timestamp': transaction['timestamp'],
-            'nonce': transaction['nonce'],
-        }
-        if self.hash_str(payload) != transaction['transaction_hash']:
-            return False
-
-        if self.hash_str(transaction['public_key']) != transaction['sender']:
-            return False
+    def add_transaction(self, transaction, verified=None):
+        """Verify a transaction's signature and admit it to the mempool if its sender can pay.
 
-        public_key = serialization.load_pem_public_key(
-            transaction['public_key'].encode())
-        try:
-            public_key.verify(
-                bytes.fromhex(transaction['signature']),
-                json.dumps(payload, sort_keys=True).encode(),
-                ec.ECDSA(hashes.SHA256()),
-            )
-            return True
-        except InvalidSignature:
-            return False
-
-    def add_transaction(self, transaction):
-        if not self._verify_transaction(transaction):
+        ``verified`` is the signature's verdict when it was already checked,
+        as the chain writer does before handing the transaction over.
+        """
+        if verified is None:
+            verified = self._verify_transaction(transaction)
+        if not verified:
             return {'status': False, 'error': 'Invalid Signature'}
+        return self._admit(transaction)
+
+    def _admit(self, transaction, added_at=None):
+        """Add a transaction whose signature is already verified to the mempool if its sender can pay."""
         if transaction['amount'] <= 0 or transaction.get('fee', 0) < 0:
             return {'status': False, 'error': 'Invalid Amount'}
-        if self.get_tx(transaction['transaction_hash']):
+        if transaction['transaction_hash'] in self.tx_index:
             return {'status': False, 'error': 'Duplicate Transaction'}
+        self._expire_pending()
         sender = transaction['sender']
         amount = transaction['amount']
         fee = transaction.get('fee', self.tx_fee)
@@ -169,177 +208,298 @@ class DiscardToken:
         pending_outgoing = self.get_pending_outgoing_total(sender)
         available_balance = sender_balance - pending_outgoing
         if available_balance > amount + fee:
-            self.current_trans.append(transaction)
-            self._save_state()
+            if not self._add_pending(transaction, added_at):
+                return {'status': False, 'error': 'Mempool Full'}
             return {'status': True, 'transaction': transaction}
         return {'status': False, 'error': 'Insufficient Balance'}
 
-    def add_block(self, block):
-        """Add a mined block to the chain after validation."""
+    def verify_transactions(self, transactions):
+        """Signature verdicts for ``transactions``, one per transaction, checked as one batch.
+
+        Reads no chain state, so it can run before a batch is handed to the
+        chain writer. Malformed transactions and repeats within the batch
+        come back ``False`` without being verified.
+        """
+        verdicts = [False] * len(transactions)
+        candidates = []
+        batch_hashes = set()
+        for i, tx in enumerate(transactions):
+            if isinstance(tx, dict) and all(k in tx for k in REQUIRED_FIELDS) \
+                    and tx['transaction_hash'] not in batch_hashes:
+                batch_hashes.add(tx['transaction_hash'])
+                candidates.append(i)
+        for i, valid in zip(candidates, self.verifier.verify_batch([transactions[i] for i in candidates])):
+            verdicts[i] = valid
+        return verdicts
+
+    def add_transactions(self, transactions, verdicts=None):
+        """Admit many transactions at once; return one result per transaction, in order.
+
+        ``verdicts`` are the signature checks from :meth:`verify_transactions`;
+        if not given, the signatures are verified here as one batch.
+        Duplicates (within the batch or already known) and bad amounts are
+        rejected. Balances are checked against a running total per sender,
+        so a batch can't overspend, and everything admitted is written to
+        the mempool table in a single database transaction.
+        """
+        if verdicts is None:
+            verdicts = self.verify_transactions(transactions)
+        results = [None] * len(transactions)
+        candidates = []
+        batch_hashes = set()
+        for i, tx in enumerate(transactions):
+            if not isinstance(tx, dict) or not all(k in tx for k in REQUIRED_FIELDS):
+                results[i] = {'status': False, 'error': 'Invalid Signature'}
+                continue
+            tx_hash = tx['transaction_hash']
+            amount, fee = tx['amount'], tx['fee']
+            if not isinstance(amount, (int, float)) or not isinstance(fee, (int, float)) or amount <= 0 or fee < 0:
+                results[i] = {'status': False, 'error': 'Invalid Amount', 'transaction_hash': tx_hash}
+            elif tx_hash in batch_hashes or tx_hash in self.tx_index:
+                results[i] = {'status': False, 'error': 'Duplicate Transaction', 'transaction_hash': tx_hash}
+            else:
+                batch_hashes.add(tx_hash)
+                candidates.append(i)
+        self._expire_pending()
+        available = {}
+        admitted = []
+        evicted = set()
+        for i in candidates:
+            tx = transactions[i]
+            tx_hash = tx['transaction_hash']
+            if not verdicts[i]:
+                results[i] = {'status': False, 'error': 'Invalid Signature', 'transaction_hash': tx_hash}
+                continue
+            sender = tx['sender']
+            if sender not in available:
+                available[sender] = (self.get_wallet_balance(sender).get('balance')
+                                     - self.get_pending_outgoing_total(sender))
+            if available[sender] <= tx['amount'] + tx['fee']:
+                results[i] = {'status': False, 'error': 'Insufficient Balance', 'transaction_hash': tx_hash}
+                continue
+            accepted, dropped = self.mempool.add(tx)
+            if not accepted:
+                results[i] = {'status': False, 'error': 'Mempool Full', 'transaction_hash': tx_hash}
+                continue
+            available[sender] -= tx['amount']
+            for t in dropped:
+                # An evicted transaction no longer holds its sender's funds
+                if t.get('sender') in available:
+                    available[t['sender']] += t.get('amount', 0)
+                evicted.add(t.get('transaction_hash'))
+            admitted.append(tx)
+            results[i] = {'status': True, 'transaction_hash': tx_hash}
+        if evicted:
+            for result in results:
+                if result['status'] and result['transaction_hash'] in evicted:
+                    result.update(status=False, error='Mempool Full')
+            admitted = [tx for tx in admitted if tx['transaction_hash'] not in evicted]
+        if admitted or evicted:
+            self.store.update_pending(admitted, evicted, arrival=self.mempool.added_at)
+        return results
+
+    def add_block(self, block, verify_signatures=True):
+        """Add a mined block to the chain after validation.
+
+        Signatures of the block's transactions are verified as one batch;
+        ``mine`` skips that because its transactions were verified on entry
+        to the mempool. Reward transactions (empty sender) carry no signature.
+        """
         previous_hash = self.get_last_block_hash()
         if block['previous_hash'] != previous_hash:
             return False
+        block = Block.of(block)
         difficulty = block.get('difficulty', self.difficulty)
-        block_hash = self.get_block_hash({k: block[k] for k in block if k != 'hash'})
+        block_hash = block.content_hash
         if not block_hash.startswith('0' * difficulty):
             return False
         if block_hash != block['hash']:
             return False
+        if verify_signatures and not self.verify_block_signatures(block):
+            return False
         self.chain.append(block)
-        self._save_state()
+        height = len(self.chain) - 1
+        touched = self.balances.apply_block(block, height)
+        self.tx_index.apply_block(block, height)
+        self.address_registry.apply_block(block, height)
+        self.tx_stats.apply_block(block)
+        self.store.append_block(height, block, balances=touched)
+        self.mempool.remove(tx.get('transaction_hash') for tx in block['transactions'])
         return True
 
-    def is_chain_valid(self):
-        for index in range(1, len(self.chain)):
-            current = self.chain[index]
-            previous = self.chain[index - 1]
-            prev_hash = self.get_block_hash({k: previous[k] for k in previous if k != 'hash'})
-            if current['previous_hash'] != prev_hash:
-                return False
-            difficulty = current.get('difficulty', self.difficulty)
-            calculated_hash = self.get_block_hash({k: current[k] for k in current if k != 'hash'})
-            if not calculated_hash.startswith('0' * difficulty):
-                return False
-            if calculated_hash != current['hash']:
-                return False
+    def verify_block_signatures(self, block):
+        """Whether every signed transaction in ``block`` verifies, checked as one batch.
+
+        Like :meth:`verify_transactions` it reads no chain state.
+        """
+        try:
+            signed = [tx for tx in block['transactions'] if tx.get('sender') != '']
+        except (KeyError, TypeError, AttributeError):
+            return False
+        return all(self.verifier.verify_batch(signed))
+
+    def reorganize(self, fork_height, blocks):
+        """Replace the blocks above ``fork_height`` with ``blocks``, which must already be validated.
+
+        Every index is rebuilt and the validation checkpoint is moved back
+        to the fork point. Signed transactions from the replaced blocks that
+        are not in the new ones, then those already pending, are admitted
+        again against the new balances, so any that the new chain can no
+        longer pay for are dropped.
+        """
+        if not blocks or fork_height >= len(self.chain):
+            return False
+        if blocks[0]['previous_hash'] != self.chain[fork_height].get('hash'):
+            return False
+        blocks = [Block.of(block) for block in blocks]
+        detached = self.chain[fork_height + 1:]
+        self.chain = self.chain[:fork_height + 1] + blocks
+        self.store.replace_blocks_from(fork_height + 1, blocks)
+        self.tx_index.rebuild(self.chain)
+        self.address_registry.rebuild(self.chain)
+        self.tx_stats.rebuild(self.chain)
+        self.rebuild_balance_index()
+        if self.verified_height > fork_height:
+            self.verified_height = fork_height
+            self.verified_hash = self.chain[fork_height].get('hash')
+        readmit = [(tx, None) for block in detached for tx in block['transactions'] if tx.get('sender')]
+        readmit += [(tx, self.mempool.added_at(tx['transaction_hash'])) for tx in self.mempool]
+        self.store.remove_pending([tx['transaction_hash'] for tx in self.mempool])
+        self.mempool.clear()
+        for tx, added_at in readmit:
+            # Signatures were verified when these first arrived; confirmed ones are rejected as duplicates
+            self._admit(tx, added_at)
         return True
 
+    def get_block_locator(self, chain=None):
+        """Hashes of the tip, then of blocks at exponentially growing distances back to genesis.
+
+        ``chain`` defaults to the live chain; readers pass a snapshot.
+        """
+        chain = self.chain if chain is None else chain
+        heights = []
+        height, step = len(chain) - 1, 1
+        while height > 0:
+            heights.append(height)
+            if len(heights) >= 10:
+                step *= 2
+            height -= step
+        heights.append(0)
+        return [chain[h].get('hash') for h in heights]
+
+    def is_chain_valid(self, full=True, workers=None):
+        """Validate the chain.
+
+        A full validation re-hashes every block since genesis, split across
+        ``workers`` processes when given. With ``full=False`` only blocks
+        after the last verified checkpoint are checked against the cached
+        hash of the checkpoint block.
+        """
+        if full:
+            chain = self.chain
+            return self.record_validation(chain, self.validate_chain(chain, self.difficulty, workers))
+        start = self.verified_height
+        if start >= len(self.chain) or self.chain[start].get('hash') != self.verified_hash:
+            # The checkpoint no longer matches the chain, so trust nothing
+            return self.is_chain_valid(full=True, workers=workers)
+        blocks = self.chain[start:]
+        valid = len(blocks) < 2 or _validate_blocks(blocks, self.difficulty, use_cache=True,
+                                                    first_hash=self.verified_hash)
+        if valid:
+            self.verified_height = len(self.chain) - 1
+            self.verified_hash = self.chain[-1].get('hash')
+        return valid
+
+    def record_validation(self, chain, valid):
+        """Move the checkpoint after a full validation of ``chain``; returns ``valid``.
+
+        ``chain`` may be an earlier version of this chain, validated while
+        the chain moved on. The result is only recorded if this chain still
+        has ``chain``'s last block, and a valid result never moves the
+        checkpoint back.
+        """
+        height = len(chain) - 1
+        if height >= len(self.chain) or self.chain[height].get('hash') != chain[-1].get('hash'):
+            return valid
+        if not valid:
+            self._reset_validation_checkpoint()
+        elif height >= self.verified_height:
+            self.verified_height = height
+            self.verified_hash = chain[-1].get('hash')
+        return valid
+
+    def _reset_validation_checkpoint(self):
+        """Forget what has been verified; only the genesis block is trusted."""
+        self.verified_height = 0
+        self.verified_hash = self.chain[0].get('hash')
+
+    @staticmethod
+    def validate_chain(chain, difficulty, workers=None):
+        """Re-hash and check every block of ``chain``; it reads nothing else, so any thread may call it."""
+        if not workers or workers < 2 or len(chain) < 2 * workers:
+            return _validate_blocks(chain, difficulty)
+        # Chunks overlap by one block so links across chunk boundaries are checked too. Workers hash
+        # every block anyway, so they get plain dicts: unpickling a Block would hash it a second time.
+        step = -(-(len(chain) - 1) // workers)
+        chunks = [[dict(block) for block in chain[i:i + step + 1]] for i in range(0, len(chain) - 1, step)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_validate_blocks, chunks, [difficulty] * len(chunks))
+            return all(results)
+
     def get_last_block_hash(self):
         last_block = self.chain[-1]
-        block_contents = {k: last_block[k] for k in last_block if k != 'hash'}
-        block_string = json.dumps(block_contents, sort_keys=True).encode()
-        previous_block_hash = hashlib.sha256(block_string).hexdigest()
-        return previous_block_hash
+        if isinstance(last_block, Block):
+            return last_block.content_hash
+        return self.get_block_hash({k: last_block[k] for k in last_block if k != 'hash'})
 
     def get_chain(self):
         return self.chain
 
+    @property
+    def current_trans(self):
+        """Pending transactions in arrival order."""
+        return list(self.mempool)
+
     def get_pending_transactions(self):
         """Return transactions waiting to be mined."""
         return self.current_trans
 
     def get_pending_outgoing_total(self, address):
         """Total amount of tokens this address has in pending outgoing tx."""
-        total = 0
-        for tx in self.current_trans:
-            if tx.get('sender') == address:
-                total += tx.get('amount', 0)
-        return total
-
-    def get_all_addresses(self):
-        address_lst = []
-        for block in self.chain:
-            for transaction in block['transactions']:
-                sender = transaction.get('sender')
-                rec = transaction.get('recipient')
-                if sender not in address_lst:
-                    address_lst.append(sender)
-                if rec not in address_lst:
-                    address_lst.append(rec)
-        return {'address_lst': list(set(address_lst))}
-
-    def get_wallet_balance(self, address):
-        transactions = 0
-        # check how many tokens address has received
-        amount_received = 0
-        for block in self.chain:
-            for transaction in block['transactions']:
-                if transaction['recipient'] == address:
-                    amount_received += transaction['amount']
-                    transactions += 1
-
-        # check how many tokens address has sent
-        amount_sent = 0
-        for block in self.chain:
-            for transaction in block['transactions']:
-                if transaction['sender'] == address:
-                    amount_sent += transaction['amount'] + transaction.get('fee', 0)
-                    transactions += 1
-
-        # find difference
-        wallet_balance = amount_received - amount_sent
-        pending_outgoing = self.get_pending_outgoing_total(address)
-        return {
-            'amount_received': amount_received,
-            'amount_sent': amount_sent,
-            'transactions': transactions,
-            'balance': wallet_balance,
-            'pending_outgoing': pending_outgoing,
-        }
+        return self.mempool.pending_outgoing(address)
 
-    def get_largest_transaction_amount(self):
-        transaction_amount_lst = self.get_transaction_amount_lst()
-        for block in self.chain:
-            for transaction in block['transactions']:
-                transaction_amount = transaction['amount']
-                if transaction_amount == self.genesis_tokens:
-                    continue
-                transaction_amount_lst.append(transaction_amount)
-        largest_transaction = max(transaction_amount_lst)
-        return largest_transaction
-
-    def get_average_transaction_amount(self):
-        transaction_amount_lst = self.get_transaction_amount_lst()
-        return mean(transaction_amount_lst)
-
-    def get_median_transaction_amount(self):
-        """Return the median value of all transactions on the chain."""
-        amounts = self.get_transaction_amount_lst()
-        if not amounts:
-            return 0
-        return median(amounts)
-
-    def get_total_tokens(self):
-        # sum all transactions
-        transaction_amount_lst = self.get_transaction_amount_lst()
-        return sum(transaction_amount_lst)
-
-    def get_transaction_amount_lst(self):
-        # create a list of transaction amounts
-        transaction_amount_lst = []
-        for block in self.chain:
-            for transaction in block['transactions']:
-                transaction_amount = transaction['amount']
-                if transaction_amount == self.genesis_tokens:
-                    continue
-                transaction_amount_lst.append(transaction_amount)
-        return transaction_amount_lst
-
-    def get_last_index(self):
-        last_block = self.chain[-1]
-        last_block_index = last_block.get('index')
-        return last_block_index
-
-    def get_tx(self, tx_hash):
-        for block in self.chain:
-            for transaction in block['transactions']:
-                if transaction.get('transaction_hash') == tx_hash:
-                    return transaction
-        # Also check pending transactions
-        for transaction in self.current_trans:
-            if transaction.get('transaction_hash') == tx_hash:
-                return transaction
-
-    def issue_newly_generated_coins(self, address, reward):
-        issuance_transaction = self.create_transaction('', address, reward, fee=0)
-        self.current_trans.append(issuance_transaction)
-        self._save_state()
+    def _add_pending(self, transaction, added_at=None):
+        """Admit a transaction to the mempool and persist it along with any evictions."""
+        accepted, evicted = self.mempool.add(transaction, now=added_at)
+        if not accepted:
+            return False
+        if evicted:
+            self.store.remove_pending(tx.get('transaction_hash') for tx in evicted)
+        self.store.add_pending([transaction], arrival=self.mempool.added_at)
+        return True
+
+    def _expire_pending(self):
+        expired = self.mempool.expire()
+        if expired:
+            self.store.remove_pending(tx.get('transaction_hash') for tx in expired)
+        return expired
 
     def proof_of_work(self, block):
-        block['nonce'] = 0
         difficulty = block.get('difficulty', self.difficulty)
-        block_hash = self.get_block_hash(block)
-        while not block_hash.startswith('0' * difficulty):
-            block['nonce'] += 1
-            block_hash = self.get_block_hash(block)
-        return block_hash
+        stats = self.miner.mine(block, difficulty)
+        mining_duration.observe(stats['elapsed'])
+        mining_hashes.inc(stats['attempts'])
+        mining_hash_rate.set(stats['hash_rate'])
+        block['nonce'] = stats['nonce']
+        self.last_mining_stats = stats
+        return stats['hash']
 
     def adjust_difficulty(self, elapsed):
         if elapsed < self.target_block_time * 0.5 and self.difficulty < self.max_difficulty:
             self.difficulty += 1
         elif elapsed > self.target_block_time * 1.5 and self.difficulty > 1:
             self.difficulty -= 1
-        self._save_state()
+        self.store.set_state('difficulty', self.difficulty)
 
     def create_block(self, transactions, timestamp=None):
         """Create a new block structure without proof of work."""
@@ -352,24 +512,49 @@ class DiscardToken:
             'nonce': 0,
         }
 
-    def mine(self, miner_address=None):
-        total_fees = sum(tx.get('fee', 0) for tx in self.current_trans)
+    def prepare_block(self, miner_address=None, max_transactions=None):
+        """Build the next block from pending transactions, without proof of work.
+
+        At most ``max_transactions`` pending transactions are included,
+        highest fee rate first; the miner's reward transaction comes on top
+        of them. Returns ``None`` if there is nothing to mine.
+        """
+        self._expire_pending()
+        transactions = self.mempool.select(max_transactions)
+        total_fees = sum(tx.get('fee', 0) for tx in transactions)
         if miner_address:
-            self.issue_newly_generated_coins(miner_address, self.mining_reward + total_fees)
-        if not self.current_trans:
-            return {'status': False, 'error': 'No transactions to mine'}
-        start_time = time.time()
-        block = self.create_block(self.current_trans.copy(), timestamp=start_time)
-        block_hash = self.proof_of_work(block)
-        block['hash'] = block_hash
-        self.current_trans = []
-        added = self.add_block(block)
-        end_time = time.time()
-        if added and self.is_chain_valid():
-            self.adjust_difficulty(end_time - start_time)
-            return {'status': True, 'block': block}
+            transactions.append(
+                self.create_transaction('', miner_address, self.mining_reward + total_fees, fee=0)
+            )
+        if not transactions:
+            return None
+        return self.create_block(transactions)
+
+    def commit_block(self, block, block_hash):
+        """Add a block from :meth:`prepare_block` once its proof of work is found.
+
+        Returns ``None`` without changing anything if the chain tip moved or
+        one of the block's transactions left the mempool since it was
+        prepared; the block has to be prepared and mined again.
+        """
+        if block['previous_hash'] != self.get_last_block_hash():
+            return None
+        if any(tx.get('sender') and tx.get('transaction_hash') not in self.mempool for tx in block['transactions']):
+            return None
+        block = Block(block, hash=block_hash)
+        added = self.add_block(block, verify_signatures=False)
+        if added and self.is_chain_valid(full=False):
+            self.adjust_difficulty(time.time() - block['timestamp'])
+            return {'status': True, 'block': block, 'hash_rate': self.last_mining_stats['hash_rate']}
         return {'status': False, 'block': block}
 
+    def mine(self, miner_address=None, max_transactions=None):
+        """Mine pending transactions into a block."""
+        block = self.prepare_block(miner_address, max_transactions)
+        if block is None:
+            return {'status': False, 'error': 'No transactions to mine'}
+        return self.commit_block(block, self.proof_of_work(block))
+
     @staticmethod
     def create_wallet():
         """Generate an ECDSA key pair and return wallet details."""
@@ -399,9 +584,7 @@ class DiscardToken:
 
     @staticmethod
     def get_block_hash(block):
-        block_string = json.dumps(block, sort_keys=True).encode()
-        block_hash = hashlib.sha256(block_string).hexdigest()
-        return block_hash
+        return hashlib.sha256(canonical_json(block)).hexdigest()
 
     @staticmethod
     def determine_winner():
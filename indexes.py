@@ -0,0 +1,321 @@
+import sys
+from typing import Dict, Iterable, List
+
+from journal import FrozenMap, Journal
+
+
+def _intern(address):
+    return sys.intern(address) if isinstance(address, str) else address
+
+
+class BalanceIndex:
+    """Running received/sent totals per address, updated one block at a time.
+
+    An account's dict is replaced rather than changed when a block touches
+    it, so the read-only copies made by :meth:`view` share the rest.
+    """
+
+    def __init__(self):
+        self.accounts: Dict[str, dict] = {}
+        self.height = -1
+        self._journal = Journal(self.accounts)
+
+    def __contains__(self, address) -> bool:
+        return address in self.accounts
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def _account(self, address, touched: Dict[str, dict]) -> dict:
+        """The account of ``address`` as changed by the current block, copied on first touch."""
+        account = touched.get(address)
+        if account is None:
+            current = self.accounts.get(address)
+            if current is None:
+                account = {'received': 0, 'sent': 0, 'tx_count': 0, 'balance': 0}
+            else:
+                account = dict(current)
+            address = _intern(address)
+            self.accounts[address] = touched[address] = account
+            self._journal.touch(address)
+        return account
+
+    def apply_block(self, block: dict, height: int) -> Dict[str, dict]:
+        """Fold the block's transactions into the index and return the touched accounts."""
+        touched = {}
+        for tx in block['transactions']:
+            recipient = self._account(tx['recipient'], touched)
+            recipient['received'] += tx['amount']
+            recipient['balance'] += tx['amount']
+            recipient['tx_count'] += 1
+
+            spent = tx['amount'] + tx.get('fee', 0)
+            sender = self._account(tx['sender'], touched)
+            sender['sent'] += spent
+            sender['balance'] -= spent
+            sender['tx_count'] += 1
+        self.height = height
+        return touched
+
+    def rebuild(self, chain: Iterable[dict]) -> None:
+        self.accounts = {}
+        self.height = -1
+        self._journal = Journal(self.accounts)
+        for height, block in enumerate(chain):
+            self.apply_block(block, height)
+        self._journal.reset()
+
+    def load(self, rows: Iterable[tuple], height: int) -> None:
+        """Restore the index from ``(address, received, sent, tx_count)`` rows."""
+        self.accounts = {
+            _intern(address): {
+                'received': received,
+                'sent': sent,
+                'tx_count': tx_count,
+                'balance': received - sent,
+            }
+            for address, received, sent, tx_count in rows
+        }
+        self.height = height
+        self._journal = Journal(self.accounts)
+
+    def get(self, address) -> dict:
+        account = self.accounts.get(address)
+        if account is None:
+            return {'received': 0, 'sent': 0, 'tx_count': 0, 'balance': 0}
+        return dict(account)
+
+    def view(self) -> "BalanceIndex":
+        """A read-only copy of the index as it is now, for readers on other threads."""
+        view = BalanceIndex.__new__(BalanceIndex)
+        view.accounts = self._journal.view()
+        view.height = self.height
+        return view
+
+
+class TxIndex:
+    """Transaction hash lookups for confirmed (height, position) and pending transactions.
+
+    ``pending`` is the mempool (or any mapping of hash to transaction); it
+    owns the pending set, so the index only tracks confirmed locations.
+    Block hashes are indexed to their height alongside.
+    """
+
+    def __init__(self, pending=None):
+        self.confirmed: Dict[str, tuple] = {}
+        self.blocks: Dict[str, int] = {}
+        self.pending = pending if pending is not None else {}
+        self._journals = (Journal(self.confirmed), Journal(self.blocks))
+
+    def __contains__(self, tx_hash) -> bool:
+        return tx_hash in self.confirmed or tx_hash in self.pending
+
+    def __len__(self) -> int:
+        return len(self.confirmed) + len(self.pending)
+
+    def apply_block(self, block: dict, height: int) -> None:
+        confirmed, blocks = self._journals
+        self.blocks[block.get('hash')] = height
+        blocks.touch(block.get('hash'))
+        for position, tx in enumerate(block['transactions']):
+            self.confirmed[tx.get('transaction_hash')] = (height, position)
+            confirmed.touch(tx.get('transaction_hash'))
+
+    def rebuild(self, chain: Iterable[dict]) -> None:
+        self.confirmed = {}
+        self.blocks = {}
+        self._journals = (Journal(self.confirmed), Journal(self.blocks))
+        for height, block in enumerate(chain):
+            self.apply_block(block, height)
+        for journal in self._journals:
+            journal.reset()
+
+    def locate(self, tx_hash):
+        """Return ``(height, position)`` for a confirmed transaction, else ``None``."""
+        return self.confirmed.get(tx_hash)
+
+    def block_height(self, block_hash):
+        return self.blocks.get(block_hash)
+
+    def view(self, pending: FrozenMap) -> "TxIndex":
+        """A read-only copy of the index as it is now, over ``pending``, a view of the mempool."""
+        view = TxIndex.__new__(TxIndex)
+        view.confirmed, view.blocks = (journal.view() for journal in self._journals)
+        view.pending = pending
+        return view
+
+
+class AddressRegistry:
+    """Every address seen on the chain with the heights it was first and last seen at.
+
+    Addresses are interned here and in :class:`BalanceIndex`, so the two
+    share one string object per address (``TxIndex`` only holds hashes).
+    The sorted listing is refreshed lazily by merging in addresses added
+    since the last listing. Seen heights are tuples and the lists behind
+    the listing are only ever appended to or replaced, so the read-only
+    copies made by :meth:`view` share them.
+    """
+
+    def __init__(self):
+        self.addresses: Dict[str, tuple] = {}
+        # (sorted addresses, addresses added since, how many of those count; None for all)
+        self._listing = ([], [], None)
+        self._journal = Journal(self.addresses)
+
+    def __contains__(self, address) -> bool:
+        return address in self.addresses
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def _see(self, address, height: int) -> None:
+        seen = self.addresses.get(address)
+        if seen is None:
+            address = _intern(address)
+            self.addresses[address] = (height, height)
+            self._listing[1].append(address)
+        elif seen[1] != height:
+            self.addresses[address] = (seen[0], height)
+        else:
+            return
+        self._journal.touch(address)
+
+    def apply_block(self, block: dict, height: int) -> None:
+        for tx in block['transactions']:
+            self._see(tx.get('sender'), height)
+            self._see(tx.get('recipient'), height)
+
+    def rebuild(self, chain: Iterable[dict]) -> None:
+        self.addresses = {}
+        self._listing = ([], [], None)
+        self._journal = Journal(self.addresses)
+        for height, block in enumerate(chain):
+            self.apply_block(block, height)
+        self._journal.reset()
+
+    def sorted(self) -> List[str]:
+        listed, added, count = self._listing
+        if count is not None:
+            added = added[:count]
+        if added:
+            # Both runs are already ordered after the first sort, which timsort merges in linear time.
+            listed = sorted(listed + sorted(added, key=str), key=str)
+            self._listing = (listed, [], None)
+        return listed
+
+    def page(self, offset: int = 0, limit: int = 100) -> List[dict]:
+        return [
+            {'address': address, 'first_seen': self.addresses[address][0],
+             'last_seen': self.addresses[address][1]}
+            for address in self.sorted()[offset:offset + limit]
+        ]
+
+    def view(self) -> "AddressRegistry":
+        """A read-only copy of the registry as it is now, for readers on other threads."""
+        listed, added, _ = self._listing
+        view = AddressRegistry.__new__(AddressRegistry)
+        view.addresses = self._journal.view()
+        view._listing = (listed, added, len(added))
+        return view
+
+
+class IndexQueries:
+    """Lookups answered from the chain and its indexes.
+
+    Shared by :class:`discard_token.DiscardToken`, which answers them from
+    its live indexes on the chain writer, and :class:`chainstate.ChainSnapshot`,
+    which answers them from read-only copies on any thread. Both provide
+    ``chain``, ``balances``, ``tx_index``, ``address_registry`` and
+    ``tx_stats`` along with ``get_pending_outgoing_total``.
+    """
+
+    __slots__ = ()
+
+    def get_all_addresses(self):
+        return {'address_lst': list(self.address_registry.sorted())}
+
+    def has_address(self, address):
+        return address in self.address_registry
+
+    def get_addresses_page(self, offset=0, limit=100):
+        """Return a slice of the sorted address list with first/last seen heights."""
+        return {
+            'addresses': self.address_registry.page(offset, limit),
+            'total': len(self.address_registry),
+            'offset': offset,
+            'limit': limit,
+        }
+
+    def get_wallet_balance(self, address):
+        account = self.balances.get(address)
+        pending_outgoing = self.get_pending_outgoing_total(address)
+        return {
+            'amount_received': account['received'],
+            'amount_sent': account['sent'],
+            'transactions': account['tx_count'],
+            'balance': account['balance'],
+            'pending_outgoing': pending_outgoing,
+        }
+
+    def get_largest_transaction_amount(self):
+        return self.tx_stats.max()
+
+    def get_average_transaction_amount(self):
+        return self.tx_stats.mean()
+
+    def get_median_transaction_amount(self):
+        """Return the median value of all transactions on the chain."""
+        return self.tx_stats.median()
+
+    def get_transaction_amount_percentile(self, percentile):
+        """Return the given percentile (0-100) of all transaction amounts."""
+        return self.tx_stats.percentile(percentile)
+
+    def get_total_tokens(self):
+        return self.tx_stats.total
+
+    def get_last_index(self):
+        last_block = self.chain[-1]
+        last_block_index = last_block.get('index')
+        return last_block_index
+
+    def get_block_by_hash(self, block_hash):
+        height = self.tx_index.block_height(block_hash)
+        if height is None:
+            return None
+        return self.chain[height]
+
+    def get_headers(self, locator, limit=2000):
+        """Headers of the blocks after the first ``locator`` hash on this chain (from genesis if none match)."""
+        start = 0
+        for block_hash in locator:
+            height = self.tx_index.block_height(block_hash)
+            if height is not None:
+                start = height + 1
+                break
+        return [
+            {k: v for k, v in block.items() if k != 'transactions'}
+            for block in self.chain[start:start + limit]
+        ]
+
+    def get_tx_status(self, tx_hash):
+        """Report whether a transaction is confirmed, pending or unknown."""
+        location = self.tx_index.locate(tx_hash)
+        if location is not None:
+            height = location[0]
+            return {
+                'status': 'confirmed',
+                'block_index': height,
+                'confirmations': len(self.chain) - height,
+            }
+        if tx_hash in self.tx_index.pending:
+            return {'status': 'pending'}
+        return {'status': 'unknown'}
+
+    def get_tx(self, tx_hash):
+        location = self.tx_index.locate(tx_hash)
+        if location is not None:
+            height, position = location
+            return self.chain[height]['transactions'][position]
+        # Also check pending transactions
+        return self.tx_index.pending.get(tx_hash)
@@ -0,0 +1,116 @@
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional
+
+_DELETED = object()
+_MISSING = object()
+
+
+class FrozenMap(Mapping):
+    """A read-only mapping over a base dict and layers of later changes.
+
+    Neither the base nor the layers are changed once a map refers to them,
+    so a map can be shared between threads without copying. Lookups check
+    the layers newest first; iterating merges everything into one dict on
+    first use.
+    """
+
+    __slots__ = ('_base', '_layers', '_len', '_merged')
+
+    def __init__(self, base: dict, layers: tuple = (), length: Optional[int] = None):
+        self._base = base
+        self._layers = layers
+        self._len = len(base) if length is None else length
+        self._merged = None if layers else base
+
+    def __getitem__(self, key):
+        for layer in reversed(self._layers):
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                if value is _DELETED:
+                    raise KeyError(key)
+                return value
+        return self._base[key]
+
+    def __contains__(self, key) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        return iter(self._merge())
+
+    def values(self):
+        return self._merge().values()
+
+    def items(self):
+        return self._merge().items()
+
+    def _merge(self) -> dict:
+        merged = self._merged
+        if merged is None:
+            merged = dict(self._base)
+            for layer in self._layers:
+                for key, value in layer.items():
+                    if value is _DELETED:
+                        merged.pop(key, None)
+                    else:
+                        merged[key] = value
+            self._merged = merged
+        return merged
+
+
+class Journal:
+    """Publishes :class:`FrozenMap` views of a dict that its owner keeps changing in place.
+
+    The owner calls :meth:`touch` with each key it changes and :meth:`reset`
+    after replacing or clearing the dict wholesale. :meth:`view` then costs
+    only the keys changed since the last view: they become a new layer over
+    a base copy, and the base is copied afresh once the layers add up to a
+    quarter of it. ``value`` maps stored values to the ones readers see.
+    """
+
+    max_layers = 16
+
+    def __init__(self, data: dict, value: Optional[Callable] = None):
+        self.data = data
+        self.value = value
+        self.reset()
+
+    def reset(self) -> None:
+        value = self.value
+        self._base = dict(self.data) if value is None else {k: value(v) for k, v in self.data.items()}
+        self._layers: List[dict] = []
+        self._changed = 0
+        self._dirty: Dict = {}
+        self._view: Optional[FrozenMap] = None
+
+    def touch(self, key) -> None:
+        self._dirty[key] = None
+
+    def view(self) -> FrozenMap:
+        if self._dirty:
+            data, value = self.data, self.value
+            layer = {}
+            for key in self._dirty:
+                current = data.get(key, _DELETED)
+                layer[key] = current if current is _DELETED or value is None else value(current)
+            self._dirty = {}
+            self._changed += len(layer)
+            if self._changed > len(self._base) // 4 + 1024:
+                self.reset()
+            else:
+                self._layers.append(layer)
+                if len(self._layers) > self.max_layers:
+                    merged = {}
+                    for older in self._layers:
+                        merged.update(older)
+                    self._layers = [merged]
+                self._view = None
+        if self._view is None:
+            self._view = FrozenMap(self._base, tuple(self._layers), len(self.data))
+        return self._view
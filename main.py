@@ -1,23 +1,70 @@
+import argparse
 import logging
+import os
+import threading
 import hashlib
 import json
+import time
 
 from flask import Flask
 from flask import request
 from flask import jsonify
 from flask import render_template
-from flask_restful import reqparse, abort, Api, Resource
+from flask import g
+from flask_restful import inputs, reqparse, abort, Api, Resource
 
+from chainstate import ChainWriter
 from discard_token import DiscardToken
+from metrics import REGISTRY, http_request_duration
 from p2p import PeerNode
+from producer import BlockProducer
+from profiling import RequestProfiler
+from sync import ChainSync
+from verification import public_key_cache
 
 logging.basicConfig(level=logging.DEBUG)
 
 app = Flask(__name__)
 api = Api(app)
 
-blockchain = DiscardToken()
+blockchain = DiscardToken(mining_workers=os.cpu_count(), verify_workers=os.cpu_count())
+# Every chain mutation goes through the writer; request handlers read writer.snapshot
+writer = ChainWriter.of(blockchain)
 node = PeerNode(blockchain)
+producer = BlockProducer(blockchain, on_block=node.broadcast_block)
+node.on_transaction = producer.notify
+syncer = ChainSync(node)
+
+# Node state gauges are read when /metrics is scraped, not on every change
+REGISTRY.gauge('discard_difficulty', 'Current proof-of-work difficulty.', fn=lambda: blockchain.difficulty)
+REGISTRY.gauge('discard_chain_height', 'Index of the last block.', fn=lambda: writer.snapshot.height)
+REGISTRY.gauge('discard_writer_queue_depth', 'Chain writes waiting for the writer.', fn=writer.queue_depth)
+REGISTRY.gauge('discard_mempool_transactions', 'Pending transactions.', fn=lambda: len(blockchain.mempool))
+REGISTRY.gauge('discard_mempool_bytes', 'Serialized size of pending transactions.',
+               fn=lambda: blockchain.mempool.bytes)
+REGISTRY.gauge('discard_peers', 'Registered peers.', fn=lambda: len(node.peers))
+REGISTRY.gauge('discard_orphan_blocks', 'Blocks buffered until their parent arrives.', fn=lambda: len(node.orphans))
+REGISTRY.gauge('discard_public_key_cache_lookups', 'Public key cache lookups in this process, by result.',
+               ('result',), fn=lambda: {('hit',): public_key_cache.hits, ('miss',): public_key_cache.misses})
+REGISTRY.gauge('discard_public_key_cache_size', 'Parsed public keys cached in this process.',
+               fn=lambda: len(public_key_cache))
+REGISTRY.gauge('discard_broadcast_queue_depth', 'Messages waiting to be sent, by peer.', ('peer',),
+               fn=lambda: {(peer,): depth for peer, depth in node.dispatcher.queue_depths().items()})
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # The endpoint name, not the path, keeps label cardinality bounded
+        http_request_duration.observe(time.perf_counter() - start, request.endpoint or 'unmatched',
+                                      request.method, response.status_code)
+    return response
 
 
 class Chain(Resource):
@@ -25,7 +72,7 @@ class Chain(Resource):
     # get blockchain
     @staticmethod
     def get():
-        chain = blockchain.get_chain()
+        chain = writer.snapshot[:]
         return chain, 200
 
     # add transaction and block to blockchain
@@ -37,27 +84,56 @@ class Chain(Resource):
         }
         if not required.issubset(tx_data):
             abort(400, error_code='invalid', error='Missing transaction fields')
-        is_transaction_added = blockchain.add_transaction(tx_data)
-        if is_transaction_added.get('status'):
-            node.broadcast_transaction(tx_data)
+        is_transaction_added = writer.add_transaction(tx_data)
+        if not is_transaction_added.get('status'):
+            return is_transaction_added, 404
+        node.broadcast_transaction(tx_data)
+
+        # the block producer confirms the transaction in the background
+        if producer.running:
+            producer.notify()
+            tx_hash = tx_data['transaction_hash']
+            return {
+                'status': True,
+                'pending': True,
+                'transaction_hash': tx_hash,
+                'receipt': f'/tx/{tx_hash}/receipt',
+            }, 202
 
         # add block to chain
-        if is_transaction_added.get('status'):
-            is_block_mined = blockchain.mine()
-            if is_block_mined.get('status'):
-                node.broadcast_block(is_block_mined['block'])
-                return is_block_mined, 201
-            else:
-                return is_block_mined, 404
-        else:
-            return is_transaction_added, 404
+        is_block_mined = writer.mine()
+        if is_block_mined.get('status'):
+            node.broadcast_block(is_block_mined['block'])
+            return is_block_mined, 201
+        return is_block_mined, 404
+
+
+class TransactionBatch(Resource):
+    max_batch = 10000
+
+    def post(self):
+        data = request.get_json(silent=True)
+        transactions = data.get('transactions') if isinstance(data, dict) else data
+        if not isinstance(transactions, list):
+            abort(400, error_code='invalid', error='Expected a list of transactions')
+        if len(transactions) > self.max_batch:
+            abort(413, error_code='too_large', error=f'At most {self.max_batch} transactions per batch')
+        results = writer.add_transactions(transactions)
+        accepted = 0
+        for tx, result in zip(transactions, results):
+            if result['status']:
+                accepted += 1
+                node.broadcast_transaction(tx)
+        if accepted and producer.running:
+            producer.notify()
+        return {'accepted': accepted, 'rejected': len(results) - accepted, 'results': results}, 200
 
 
 class TxLargest(Resource):
 
     @staticmethod
     def get():
-        largest_transaction = {'largest_transaction': blockchain.get_largest_transaction_amount()}
+        largest_transaction = {'largest_transaction': writer.snapshot.get_largest_transaction_amount()}
         return largest_transaction, 200
 
 
@@ -65,7 +141,7 @@ class TxAverage(Resource):
 
     @staticmethod
     def get():
-        average_transaction = {'average_transaction': blockchain.get_average_transaction_amount()}
+        average_transaction = {'average_transaction': writer.snapshot.get_average_transaction_amount()}
         return average_transaction, 200
 
 
@@ -73,15 +149,27 @@ class TxMedian(Resource):
 
     @staticmethod
     def get():
-        median_transaction = {'median_transaction': blockchain.get_median_transaction_amount()}
+        median_transaction = {'median_transaction': writer.snapshot.get_median_transaction_amount()}
         return median_transaction, 200
 
 
+class TxPercentile(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('percentile', type=float, default=50.0, location='args')
+
+    def get(self):
+        percentile = self.parser.parse_args()['percentile']
+        if not 0 <= percentile <= 100:
+            abort(400, error_code='invalid', error='percentile must be between 0 and 100')
+        value = writer.snapshot.get_transaction_amount_percentile(percentile)
+        return {'percentile': percentile, 'transaction_amount': value}, 200
+
+
 class ChainTotalTokens(Resource):
 
     @staticmethod
     def get():
-        total_tokens = {'total_tokens': blockchain.get_total_tokens()}
+        total_tokens = {'total_tokens': writer.snapshot.get_total_tokens()}
         return total_tokens, 200
 
 
@@ -89,45 +177,51 @@ class ChainTotalBlocks(Resource):
 
     @staticmethod
     def get():
-        total_blocks = {'total_blocks': blockchain.get_last_index()}
+        total_blocks = {'total_blocks': writer.snapshot.height}
         return total_blocks, 200
 
 
 class Block(Resource):
 
     @staticmethod
-    def abort_if_block_doesnt_exist(block_index):
-        if block_index == 0:
-            return
-
-        num_blocks = blockchain.get_last_index() + 1
-        if block_index not in range(num_blocks):
+    def get_block_or_abort(block_index):
+        snapshot = writer.snapshot
+        if block_index not in range(len(snapshot)):
             abort(404, error_code='block_doesnt_exist', error=f"Block {block_index} doesn't exist")
+        return snapshot[block_index]
 
     def get(self, block_index):
-        self.abort_if_block_doesnt_exist(block_index)
-        return blockchain.get_chain()[block_index], 200
+        return self.get_block_or_abort(block_index), 200
 
 
 class Address(Resource):
 
     @staticmethod
     def get():
-        address_lst = blockchain.get_all_addresses()
+        address_lst = writer.snapshot.get_all_addresses()
         return address_lst, 200
 
 
+class AddressPage(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('offset', type=int, default=0, location='args')
+    parser.add_argument('limit', type=int, default=100, location='args')
+
+    def get(self):
+        args = self.parser.parse_args()
+        offset = max(args['offset'], 0)
+        limit = min(max(args['limit'], 1), 1000)
+        return writer.snapshot.get_addresses_page(offset, limit), 200
+
+
 class AddressBalance(Resource):
+
     @staticmethod
-    def abort_if_address_doesnt_exist(address):
-        address_lst = blockchain.get_all_addresses()['address_lst']
-        if address not in address_lst:
+    def get(address):
+        snapshot = writer.snapshot
+        if not snapshot.has_address(address):
             abort(404, error_code='address_doesnt_exist', error=f"Wallet Address: {address} doesn't exist")
-
-    def get(self, address):
-        self.abort_if_address_doesnt_exist(address)
-        balance_data = blockchain.get_wallet_balance(address)
-        return balance_data, 200
+        return snapshot.get_wallet_balance(address), 200
 
 
 class CreateWallet(Resource):
@@ -140,44 +234,65 @@ class CreateWallet(Resource):
 
 class Tx(Resource):
     @staticmethod
-    def abort_if_tx_hash_doesnt_exist(tx_hash):
-        transaction = blockchain.get_tx(tx_hash)
+    def abort_if_tx_hash_doesnt_exist(tx_hash, transaction):
         if not transaction:
             abort(404, error_code='transaction_doesnt_exist', error=f"Transaction Hash: {tx_hash} doesn't exist")
 
     def get(self, tx_hash):
-        transaction = blockchain.get_tx(tx_hash)
-        self.abort_if_tx_hash_doesnt_exist(tx_hash)
+        transaction = writer.snapshot.get_tx(tx_hash)
+        self.abort_if_tx_hash_doesnt_exist(tx_hash, transaction)
         return {"transaction": transaction}, 200
 
 
+class TxReceipt(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('wait', type=float, default=0, location='args')
+
+    def get(self, tx_hash):
+        wait = min(max(self.parser.parse_args()['wait'], 0), 30)
+        if wait and producer.running:
+            receipt = producer.wait_for_confirmation(tx_hash, wait)
+        else:
+            receipt = writer.snapshot.get_tx_status(tx_hash)
+        if receipt['status'] == 'unknown':
+            abort(404, error_code='transaction_doesnt_exist', error=f"Transaction Hash: {tx_hash} doesn't exist")
+        receipt['transaction_hash'] = tx_hash
+        return receipt, 200
+
+
 class ChainLastBlock(Resource):
 
     @staticmethod
     def get():
-        last_block = blockchain.get_chain()[-1]
+        last_block = writer.snapshot.tip
         return last_block, 200
 
 
 class ChainValid(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('full', type=inputs.boolean, default=False, location='args')
+    parser.add_argument('workers', type=int, location='args')
 
-    @staticmethod
-    def get():
-        return {'is_valid': blockchain.is_chain_valid()}, 200
+    def get(self):
+        args = self.parser.parse_args()
+        # Each worker is a process, so never start more than there are CPUs
+        workers = min(max(args['workers'] or 1, 1), os.cpu_count() or 1)
+        is_valid = writer.is_chain_valid(full=args['full'], workers=workers)
+        return {'is_valid': is_valid, 'verified_height': blockchain.verified_height}, 200
 
 
 class ChainLastHash(Resource):
 
     @staticmethod
     def get():
-        return {'last_hash': blockchain.get_last_block_hash()}, 200
+        return {'last_hash': writer.snapshot.tip_hash}, 200
 
 
 class ChainTotalTransactions(Resource):
 
     @staticmethod
     def get():
-        total_transactions = sum(len(block['transactions']) for block in blockchain.get_chain())
+        total_transactions = sum(len(block['transactions']) for block in writer.snapshot)
         return {'total_transactions': total_transactions}, 200
 
 
@@ -185,17 +300,17 @@ class PendingTransactions(Resource):
 
     @staticmethod
     def get():
-        return {'pending_transactions': blockchain.get_pending_transactions()}, 200
+        return {'pending_transactions': list(writer.snapshot.pending)}, 200
 
 
 class Mine(Resource):
     parser = reqparse.RequestParser()
-    parser.add_argument('miner_address', type=str)
+    parser.add_argument('miner_address', type=str, location='args')
 
     def get(self):
         args = self.parser.parse_args()
         miner_address = args.get('miner_address')
-        result = blockchain.mine(miner_address)
+        result = writer.mine(miner_address)
         if result.get('status'):
             node.broadcast_block(result['block'])
             return result, 201
@@ -206,9 +321,8 @@ class BlockHash(Resource):
 
     @staticmethod
     def get(block_index):
-        Block.abort_if_block_doesnt_exist(block_index)
-        block = blockchain.get_chain()[block_index]
-        return {'block_hash': blockchain.get_block_hash(block)}, 200
+        block = Block.get_block_or_abort(block_index)
+        return {'block_hash': block.content_hash}, 200
 
 
 class DetermineWinner(Resource):
@@ -243,12 +357,22 @@ class PeerTransaction(Resource):
             abort(400, error_code='invalid', error='missing data')
         if peer_id != hashlib.sha256(pub.encode()).hexdigest():
             return {'status': False, 'error': 'Invalid identity'}, 400
+        seen_key = PeerNode.gossip_key('tx', tx)
+        if seen_key is None:
+            return {'status': False, 'error': 'Invalid transaction'}, 400
+        if seen_key in node.seen:
+            # The sender is only recorded as a source once its signature checks out
+            if PeerNode.verify(tx, pub, sig):
+                node.seen.seen(seen_key, peer_id)
+            return {'status': True, 'duplicate': True}, 200
         if not PeerNode.verify(tx, pub, sig):
             return {'status': False, 'error': 'Invalid signature'}, 400
-        res = blockchain.add_transaction(tx)
+        # Marked first so it isn't announced back to the sender; forgotten if rejected
+        node.seen.add(seen_key, peer_id)
+        res = node.accept_transaction(tx)
         if res.get('status'):
-            node.broadcast_transaction(tx)
             return res, 201
+        node.seen.discard(seen_key)
         return res, 400
 
 
@@ -264,40 +388,120 @@ class PeerBlock(Resource):
             abort(400, error_code='invalid', error='missing data')
         if peer_id != hashlib.sha256(pub.encode()).hexdigest():
             return {'status': False, 'error': 'Invalid identity'}, 400
+        seen_key = PeerNode.gossip_key('block', block)
+        if seen_key is None:
+            return {'status': False, 'error': 'Invalid block'}, 400
+        if seen_key in node.seen:
+            # The sender is only recorded as a source once its signature checks out
+            if PeerNode.verify(block, pub, sig):
+                node.seen.seen(seen_key, peer_id)
+            return {'status': True, 'duplicate': True}, 200
         if not PeerNode.verify(block, pub, sig):
             return {'status': False, 'error': 'Invalid signature'}, 400
-        added = blockchain.add_block(block)
-        if added and blockchain.is_chain_valid():
-            node.broadcast_block(block)
+        node.seen.add(seen_key, peer_id)
+        if node.accept_block(block):
             return {'status': True}, 201
+        if block.get('hash') in node.orphans:
+            return {'status': True, 'orphan': True}, 202
+        node.seen.discard(seen_key)
         return {'status': False}, 400
 
 
+class PeerInventory(Resource):
+
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        res = node.handle_inventory(data)
+        if res is None:
+            return {'status': False, 'error': 'Invalid inventory'}, 400
+        return res, 200
+
+
+class PeerData(Resource):
+
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        res = node.handle_data(data)
+        if res is None:
+            return {'status': False, 'error': 'Invalid data'}, 400
+        return res, 200
+
+
+class PeerHeaders(Resource):
+
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        locator = data.get('locator') or []
+        if not isinstance(locator, list):
+            abort(400, error_code='invalid', error='locator must be a list of block hashes')
+        try:
+            limit = min(max(int(data.get('limit') or 2000), 1), 2000)
+        except (TypeError, ValueError):
+            abort(400, error_code='invalid', error='limit must be an integer')
+        snapshot = writer.snapshot
+        return {'headers': snapshot.get_headers(locator[:64], limit), 'height': snapshot.get_last_index()}, 200
+
+
+class PeerBlocks(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('start', type=int, required=True, location='args')
+    parser.add_argument('end', type=int, required=True, location='args')
+
+    def get(self):
+        args = self.parser.parse_args()
+        start = max(args['start'], 0)
+        end = min(args['end'], start + 500)
+        return {'blocks': writer.snapshot[start:end]}, 200
+
+
+class PeerSync(Resource):
+
+    @staticmethod
+    def post():
+        result = syncer.sync()
+        return result, 200 if result.get('status') else 409
+
+
+class PeerStats(Resource):
+
+    @staticmethod
+    def get():
+        return node.stats(), 200
+
+
 # ----- Simple HTML Frontend Routes -----
 @app.route('/')
 def index():
-    total_blocks = blockchain.get_last_index() + 1
+    total_blocks = len(writer.snapshot)
     return render_template('index.html', total_blocks=total_blocks)
 
 
 @app.route('/chain/view')
 def chain_page():
-    chain_json = json.dumps(blockchain.get_chain(), indent=2)
+    chain_json = json.dumps(writer.snapshot[:], indent=2)
     return render_template('chain.html', chain_json=chain_json)
 
 
+@app.route('/metrics')
+def metrics():
+    return app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 
 api.add_resource(Chain, '/chain')
+api.add_resource(TransactionBatch, '/transactions/batch')
 api.add_resource(ChainTotalTokens, '/chain/total-tokens')
 api.add_resource(ChainTotalBlocks, '/chain/total-blocks')
 api.add_resource(Block, '/chain/block/<int:block_index>')
 api.add_resource(Address, '/all-addresses')
+api.add_resource(AddressPage, '/addresses')
 api.add_resource(AddressBalance, '/address/<string:address>')
 api.add_resource(CreateWallet, '/address/create')
 api.add_resource(Tx, '/tx/<string:tx_hash>')
+api.add_resource(TxReceipt, '/tx/<string:tx_hash>/receipt')
 api.add_resource(TxLargest, '/tx/largest-transaction')
 api.add_resource(TxAverage, '/tx/average-transaction')
 api.add_resource(TxMedian, '/tx/median-transaction')
+api.add_resource(TxPercentile, '/tx/percentile-transaction')
 api.add_resource(ChainLastBlock, '/chain/last-block')
 api.add_resource(ChainValid, '/chain/valid')
 api.add_resource(ChainLastHash, '/chain/last-hash')
@@ -309,6 +513,54 @@ api.add_resource(DetermineWinner, '/determine-winner')
 api.add_resource(RegisterPeer, '/register-peer')
 api.add_resource(PeerTransaction, '/p2p/transaction')
 api.add_resource(PeerBlock, '/p2p/block')
+api.add_resource(PeerInventory, '/p2p/inv')
+api.add_resource(PeerData, '/p2p/data')
+api.add_resource(PeerHeaders, '/p2p/headers')
+api.add_resource(PeerBlocks, '/p2p/blocks')
+api.add_resource(PeerSync, '/p2p/sync')
+api.add_resource(PeerStats, '/p2p/stats')
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    arg_parser = argparse.ArgumentParser(description='Run a Discard Token node.')
+    arg_parser.add_argument('--verify-chain', action='store_true',
+                            help='fully revalidate the stored chain and exit')
+    arg_parser.add_argument('--workers', type=int, default=None,
+                            help='processes to use for --verify-chain')
+    arg_parser.add_argument('--max-block-transactions', type=int, default=500,
+                            help='most pending transactions mined into one block')
+    arg_parser.add_argument('--max-block-interval', type=float, default=2.0,
+                            help='seconds to wait for a block to fill before mining it anyway')
+    arg_parser.add_argument('--min-block-fill', type=int, default=1,
+                            help='pending transactions needed before a block is mined')
+    arg_parser.add_argument('--miner-address', default=None,
+                            help='address credited with block rewards and fees')
+    arg_parser.add_argument('--profile', action='store_true',
+                            default=os.environ.get('DISCARD_PROFILE', '') not in ('', '0'),
+                            help='time every request and keep profiles of slow ones at /admin/profiles '
+                                 '(or set DISCARD_PROFILE=1)')
+    arg_parser.add_argument('--profile-threshold', type=float,
+                            default=float(os.environ.get('DISCARD_PROFILE_THRESHOLD', 0.5)),
+                            help='seconds after which a request profile is kept')
+    arg_parser.add_argument('--profile-keep', type=int, default=20,
+                            help='number of slow request profiles to keep')
+    arg_parser.add_argument('--profile-token', default=os.environ.get('DISCARD_PROFILE_TOKEN'),
+                            help='bearer token required by /admin/profiles; without one only local '
+                                 'requests are served (or set DISCARD_PROFILE_TOKEN)')
+    cli_args = arg_parser.parse_args()
+    if cli_args.verify_chain:
+        valid = blockchain.is_chain_valid(full=True, workers=cli_args.workers)
+        print(f"Chain valid: {valid} ({len(blockchain.get_chain())} blocks)")
+        raise SystemExit(0 if valid else 1)
+    producer.max_transactions = cli_args.max_block_transactions
+    producer.max_interval = cli_args.max_block_interval
+    producer.min_fill = max(cli_args.min_block_fill, 1)
+    producer.miner_address = cli_args.miner_address
+    if cli_args.profile:
+        RequestProfiler(cli_args.profile_threshold, cli_args.profile_keep, cli_args.profile_token).install(app)
+    writer.start()
+    producer.start()
+    if node.peers:
+        # Catch up with peers in the background while serving requests
+        threading.Thread(target=syncer.sync, name='chain-sync', daemon=True).start()
+    # The reloader would start a second producer in its child process
+    app.run(debug=True, use_reloader=False)
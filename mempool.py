@@ -0,0 +1,157 @@
+import heapq
+import itertools
+import json
+import time
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from journal import FrozenMap, Journal
+
+
+class Mempool:
+    """Bounded pool of pending transactions.
+
+    Transactions are kept in arrival order for listing and expiry, and in a
+    min-heap keyed by fee rate (fee per serialized byte) so the cheapest can
+    be evicted when the pool is full. Pending outgoing amounts are tracked
+    per sender so balance checks don't scan the pool. :meth:`view` gives
+    readers an immutable copy that costs only the changes since the last one.
+    """
+
+    def __init__(self, max_size: int = 50000, expiry: Optional[float] = 3600.0):
+        self.max_size = max_size
+        self.expiry = expiry
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.sender_totals: Dict[str, float] = {}
+        self.bytes = 0
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._entries_journal = Journal(self.entries, value=itemgetter('tx'))
+        self._totals_journal = Journal(self.sender_totals)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, tx_hash) -> bool:
+        return tx_hash in self.entries
+
+    def __iter__(self):
+        return (entry['tx'] for entry in self.entries.values())
+
+    def get(self, tx_hash, default=None):
+        entry = self.entries.get(tx_hash)
+        return entry['tx'] if entry is not None else default
+
+    def added_at(self, tx_hash) -> Optional[float]:
+        entry = self.entries.get(tx_hash)
+        return entry['added_at'] if entry is not None else None
+
+    def pending_outgoing(self, sender) -> float:
+        return self.sender_totals.get(sender, 0)
+
+    def view(self) -> Tuple[FrozenMap, FrozenMap]:
+        """Read-only ``(transaction by hash, pending outgoing by sender)`` maps of the pool as it is now."""
+        return self._entries_journal.view(), self._totals_journal.view()
+
+    def _lowest(self):
+        """Return the live heap entry with the lowest fee rate, dropping stale ones."""
+        while self._heap:
+            fee_rate, neg_seq, tx_hash = self._heap[0]
+            entry = self.entries.get(tx_hash)
+            if entry is not None and entry['seq'] == -neg_seq:
+                return self._heap[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def add(self, tx: dict, now: Optional[float] = None):
+        """Add ``tx``; return ``(accepted, evicted_transactions)``.
+
+        When the pool is full the lowest fee-rate transaction is evicted,
+        unless the new one pays no more than it, in which case it is refused.
+        """
+        tx_hash = tx.get('transaction_hash')
+        if tx_hash in self.entries:
+            return False, []
+        size = len(json.dumps(tx))
+        fee_rate = tx.get('fee', 0) / size
+        evicted = []
+        if len(self.entries) >= self.max_size:
+            lowest = self._lowest()
+            if lowest is None or fee_rate <= lowest[0]:
+                return False, []
+            evicted.append(self._remove(lowest[2]))
+        seq = next(self._seq)
+        self.entries[tx_hash] = {
+            'tx': tx,
+            'fee_rate': fee_rate,
+            'size': size,
+            'added_at': time.time() if now is None else now,
+            'seq': seq,
+        }
+        heapq.heappush(self._heap, (fee_rate, -seq, tx_hash))
+        sender = tx.get('sender')
+        self.sender_totals[sender] = self.sender_totals.get(sender, 0) + tx.get('amount', 0)
+        self.bytes += size
+        self._entries_journal.touch(tx_hash)
+        self._totals_journal.touch(sender)
+        return True, evicted
+
+    def _remove(self, tx_hash):
+        entry = self.entries.pop(tx_hash, None)
+        if entry is None:
+            return None
+        tx = entry['tx']
+        sender = tx.get('sender')
+        remaining = self.sender_totals.get(sender, 0) - tx.get('amount', 0)
+        if remaining:
+            self.sender_totals[sender] = remaining
+        else:
+            self.sender_totals.pop(sender, None)
+        self.bytes -= entry['size']
+        self._entries_journal.touch(tx_hash)
+        self._totals_journal.touch(sender)
+        # The heap entry is dropped lazily by _lowest
+        if len(self._heap) > 2 * len(self.entries) + 64:
+            self._heap = [(e['fee_rate'], -e['seq'], h) for h, e in self.entries.items()]
+            heapq.heapify(self._heap)
+        return tx
+
+    def remove(self, tx_hashes: Iterable[str]) -> List[dict]:
+        removed = []
+        for tx_hash in tx_hashes:
+            tx = self._remove(tx_hash)
+            if tx is not None:
+                removed.append(tx)
+        return removed
+
+    def expire(self, now: Optional[float] = None) -> List[dict]:
+        """Drop transactions that have waited longer than ``expiry`` seconds."""
+        if self.expiry is None:
+            return []
+        cutoff = (time.time() if now is None else now) - self.expiry
+        expired = []
+        while self.entries:
+            tx_hash, entry = next(iter(self.entries.items()))
+            if entry['added_at'] > cutoff:
+                break
+            expired.append(self._remove(tx_hash))
+        return expired
+
+    def select(self, limit: Optional[int] = None) -> List[dict]:
+        """Return up to ``limit`` transactions, highest fee rate first (oldest first on ties)."""
+        entries = self.entries.values()
+        key = lambda e: (e['fee_rate'], -e['seq'])  # noqa: E731
+        if limit is None or limit >= len(self.entries):
+            best = sorted(entries, key=key, reverse=True)
+        else:
+            best = heapq.nlargest(limit, entries, key=key)
+        return [entry['tx'] for entry in best]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.sender_totals.clear()
+        self.bytes = 0
+        self._heap = []
+        self._entries_journal.reset()
+        self._totals_journal.reset()
@@ -0,0 +1,195 @@
+"""Minimal Prometheus-compatible metrics: counters, gauges and histograms.
+
+Recording a value is a dict lookup and an addition under a per-metric lock,
+so it is cheap enough for the hot paths. Values that are already tracked
+elsewhere (mempool size, difficulty, queue depths) are exposed with
+callback gauges that are only evaluated when ``/metrics`` is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *label_values) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """A value that is set directly or, with ``fn``, read when metrics are rendered."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), fn: Optional[Callable] = None):
+        super().__init__(name, documentation, labels)
+        self.fn = fn
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *label_values) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        if self.fn is not None:
+            result = self.fn()
+            # A labelled callback gauge returns {label_values_tuple: value}
+            items = sorted(result.items()) if isinstance(result, dict) else [((), result)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), fn=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, fn))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """The exposition text for every registered metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Instrumented in the modules that do the work; node-level gauges are added by main.py
+mining_duration = REGISTRY.histogram(
+    'discard_mining_duration_seconds', 'Time spent searching for a proof-of-work nonce.',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+mining_hashes = REGISTRY.counter('discard_mining_hashes_total', 'Proof-of-work hashes computed.')
+mining_hash_rate = REGISTRY.gauge('discard_mining_hash_rate', 'Hash rate of the most recent proof-of-work search.')
+signature_verify_duration = REGISTRY.histogram(
+    'discard_signature_verify_seconds', 'Time to verify one transaction or one batch of signatures.', ('kind',))
+signatures_verified = REGISTRY.counter(
+    'discard_signatures_verified_total', 'Signatures verified, by outcome.', ('result',))
+storage_write_duration = REGISTRY.histogram(
+    'discard_storage_write_seconds', 'Duration of storage write transactions.', ('operation',))
+storage_bytes_written = REGISTRY.counter(
+    'discard_storage_bytes_written_total', 'Serialized JSON bytes written to storage.', ('operation',))
+http_request_duration = REGISTRY.histogram(
+    'discard_http_request_duration_seconds', 'API request latency.', ('endpoint', 'method', 'status'))
+broadcast_messages = REGISTRY.counter(
+    'discard_broadcast_messages_total', 'Messages sent to peers, by result.', ('result',))
+broadcast_latency = REGISTRY.histogram(
+    'discard_broadcast_latency_seconds', 'Latency of successful peer deliveries.')
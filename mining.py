@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import time
+from typing import Optional
+
+
+# Nonces tried between checks of the shared stop flag
+CHECK_INTERVAL = 2000
+
+
+class NonceHasher:
+    """Hash one block for many nonces while serializing it only once.
+
+    The canonical JSON (``sort_keys=True``, as in ``get_block_hash``) is
+    split around the nonce value. The SHA-256 state of the fixed prefix is
+    computed once and copied per attempt, so only the nonce digits and the
+    suffix are hashed each time.
+    """
+
+    def __init__(self, block: dict):
+        template = dict(block)
+        while True:
+            marker = str(random.getrandbits(128) | (1 << 127))
+            template['nonce'] = int(marker)
+            text = json.dumps(template, sort_keys=True)
+            if text.count(marker) == 1:
+                break
+        prefix, suffix = text.split(marker)
+        self._prefix_state = hashlib.sha256(prefix.encode())
+        self._suffix = suffix.encode()
+
+    def hash(self, nonce: int) -> str:
+        state = self._prefix_state.copy()
+        state.update(str(nonce).encode())
+        state.update(self._suffix)
+        return state.hexdigest()
+
+
+def _search(block: dict, start: int, step: int, difficulty: int, stop, results) -> None:
+    """Try nonces ``start, start + step, ...`` until a hash meets the difficulty or ``stop`` is set."""
+    target = '0' * difficulty
+    hasher = NonceHasher(block)
+    nonce = start
+    attempts = 0
+    while not stop.is_set():
+        for _ in range(CHECK_INTERVAL):
+            block_hash = hasher.hash(nonce)
+            attempts += 1
+            if block_hash.startswith(target):
+                stop.set()
+                results.put(('found', nonce, block_hash, attempts))
+                return
+            nonce += step
+    results.put(('stopped', None, None, attempts))
+
+
+class ParallelMiner:
+    """Proof-of-work search with the nonce space split across worker processes.
+
+    Worker ``i`` of ``n`` tries nonces ``i, i + n, i + 2n, ...``; the first
+    solution stops every worker. Hashes are computed exactly like
+    ``DiscardToken.get_block_hash`` so peers validate the result unchanged.
+    Below ``inline_below`` difficulty the process start-up costs more than
+    the search, so the work is done in the calling process instead.
+    """
+
+    def __init__(self, workers: Optional[int] = None, inline_below: int = 4):
+        self.workers = workers or os.cpu_count() or 1
+        self.inline_below = inline_below
+        self.last_stats: dict = {}
+
+    def mine(self, block: dict, difficulty: int) -> dict:
+        """Find a nonce for ``block`` and return the nonce, hash and hash rate."""
+        start_time = time.time()
+        if self.workers < 2 or difficulty < self.inline_below:
+            nonce, block_hash, attempts = self._mine_inline(block, difficulty)
+        else:
+            nonce, block_hash, attempts = self._mine_parallel(block, difficulty)
+        elapsed = time.time() - start_time
+        self.last_stats = {
+            'nonce': nonce,
+            'hash': block_hash,
+            'attempts': attempts,
+            'elapsed': elapsed,
+            'hash_rate': attempts / elapsed if elapsed > 0 else 0.0,
+            'workers': self.workers,
+        }
+        return self.last_stats
+
+    @staticmethod
+    def _mine_inline(block: dict, difficulty: int):
+        target = '0' * difficulty
+        hasher = NonceHasher(block)
+        nonce = 0
+        while True:
+            block_hash = hasher.hash(nonce)
+            if block_hash.startswith(target):
+                return nonce, block_hash, nonce + 1
+            nonce += 1
+
+    def _mine_parallel(self, block: dict, difficulty: int):
+        ctx = multiprocessing.get_context()
+        stop = ctx.Event()
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=_search, args=(block, i, self.workers, difficulty, stop, results), daemon=True)
+            for i in range(self.workers)
+        ]
+        for proc in procs:
+            proc.start()
+        found = None
+        attempts = 0
+        reported = 0
+        try:
+            while reported < len(procs):
+                try:
+                    status, nonce, block_hash, worker_attempts = results.get(timeout=1)
+                except queue.Empty:
+                    if not any(proc.is_alive() for proc in procs):
+                        break
+                    continue
+                reported += 1
+                attempts += worker_attempts
+                if status == 'found' and found is None:
+                    found = (nonce, block_hash)
+                    stop.set()
+        finally:
+            stop.set()
+            for proc in procs:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.terminate()
+        if found is None:
+            logging.warning("Mining workers exited without a solution, mining inline")
+            return self._mine_inline(block, difficulty)
+        return found[0], found[1], attempts
@@ -2,23 +2,348 @@ import os
 import json
 import hashlib
 import logging
+import queue
+import threading
 import time
+from collections import OrderedDict
 from typing import Dict
 
 import requests
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.exceptions import InvalidSignature
+
+from blocks import Block
+from chainstate import ChainWriter
+from metrics import broadcast_latency, broadcast_messages
+from verification import payload_hash, verify_signature
+
+
+class BroadcastDispatcher:
+    """Delivers messages to peers from background threads.
+
+    Each peer gets a bounded queue drained by its own sender thread over a
+    keep-alive ``requests.Session``, so messages to one peer stay in order,
+    a slow peer only delays itself, and callers never wait on the network.
+    Messages for a peer whose queue is full are dropped and counted. A
+    reply with a non-2xx status counts as ``rejected``, apart from the
+    ``failed`` sends that got no reply at all. A per-message
+    ``on_response`` callback receives the peer's successful replies.
+    """
+
+    def __init__(self, max_queue: int = 1000, timeout: float = 3, on_success=None,
+                 on_failure=None, session_factory=requests.Session):
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.session_factory = session_factory
+        self._queues: Dict[str, queue.Queue] = {}
+        # Peers removed after a failure; nothing is queued for them until they are added again
+        self._removed: set = set()
+        self._lock = threading.Lock()
+        self.stats = {
+            'enqueued': 0,
+            'delivered': 0,
+            'rejected': 0,
+            'failed': 0,
+            'dropped': 0,
+            'latency_total': 0.0,
+        }
+
+    def submit(self, peer_id: str, url: str, message: dict, on_response=None) -> bool:
+        """Queue ``message`` for ``url``; return ``False`` if the peer's queue is full."""
+        body = json.dumps(message)
+        with self._lock:
+            if peer_id in self._removed:
+                return False
+            q = self._queues.get(peer_id)
+            if q is None:
+                q = queue.Queue(maxsize=self.max_queue)
+                self._queues[peer_id] = q
+                threading.Thread(target=self._drain, args=(peer_id, q),
+                                 name=f'broadcast-{peer_id[:8]}', daemon=True).start()
+            # Enqueued under the lock so remove_peer can't retire the queue in between
+            try:
+                q.put_nowait((url, body, on_response))
+            except queue.Full:
+                self.stats['dropped'] += 1
+                full = True
+            else:
+                self.stats['enqueued'] += 1
+                full = False
+        if full:
+            broadcast_messages.inc(1, 'dropped')
+            logging.warning("Broadcast queue for peer %s is full, dropping message", peer_id)
+            return False
+        return True
+
+    def _drain(self, peer_id: str, q: queue.Queue) -> None:
+        session = self.session_factory()
+        try:
+            while True:
+                item = q.get()
+                if item is None:
+                    q.task_done()
+                    return
+                url, body, on_response = item
+                start = time.perf_counter()
+                try:
+                    resp = session.post(url, data=body, timeout=self.timeout,
+                                        headers={'Content-Type': 'application/json'})
+                except requests.RequestException as e:
+                    with self._lock:
+                        self.stats['failed'] += 1
+                    broadcast_messages.inc(1, 'failed')
+                    if self.on_failure:
+                        self.on_failure(peer_id, url, e)
+                else:
+                    if not 200 <= resp.status_code < 300:
+                        with self._lock:
+                            self.stats['rejected'] += 1
+                        broadcast_messages.inc(1, 'rejected')
+                        logging.warning("Peer %s rejected a message to %s with HTTP %s",
+                                        peer_id, url, resp.status_code)
+                        continue
+                    latency = time.perf_counter() - start
+                    with self._lock:
+                        self.stats['delivered'] += 1
+                        self.stats['latency_total'] += latency
+                    broadcast_messages.inc(1, 'delivered')
+                    broadcast_latency.observe(latency)
+                    if self.on_success:
+                        self.on_success(peer_id, url, resp)
+                    if on_response:
+                        try:
+                            on_response(peer_id, resp)
+                        except Exception as e:
+                            logging.exception("Handling response from %s failed: %s", url, e)
+                finally:
+                    q.task_done()
+        finally:
+            session.close()
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._lock:
+            return {peer_id: q.qsize() for peer_id, q in self._queues.items()}
+
+    def remove_peer(self, peer_id: str) -> None:
+        """Stop the sender thread for a peer, discarding anything still queued.
+
+        Later messages for the peer are refused until :meth:`add_peer` is called.
+        """
+        with self._lock:
+            self._removed.add(peer_id)
+            q = self._queues.pop(peer_id, None)
+            if q is None:
+                return
+            try:
+                while True:
+                    q.get_nowait()
+                    q.task_done()
+            except queue.Empty:
+                pass
+            q.put_nowait(None)
+
+    def add_peer(self, peer_id: str) -> None:
+        """Accept messages for a peer again after :meth:`remove_peer`."""
+        with self._lock:
+            self._removed.discard(peer_id)
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Wait until every queued message has been attempted; return ``False`` on timeout."""
+        deadline = time.time() + timeout
+        with self._lock:
+            queues = list(self._queues.values())
+        for q in queues:
+            while q.unfinished_tasks:
+                if time.time() > deadline:
+                    return False
+                time.sleep(0.01)
+        return True
+
+
+class SeenCache:
+    """Bounded, time-expiring record of gossiped item hashes and the peers that sent them.
+
+    Keys are namespaced like ``'tx:<hash>'`` or ``'block:<hash>'``. The oldest
+    entries are dropped once ``maxsize`` is reached or ``ttl`` seconds pass.
+    """
+
+    def __init__(self, maxsize: int = 100000, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.ttl
+        while self._entries:
+            key, (seen_at, _) = next(iter(self._entries.items()))
+            if seen_at > cutoff and len(self._entries) <= self.maxsize:
+                break
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        """Whether ``key`` is known; unlike :meth:`seen` nothing is counted or recorded."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.time() - self.ttl
+
+    def seen(self, key: str, source: str | None = None) -> bool:
+        """Return ``True`` if ``key`` was already seen, counting it and remembering ``source``."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if source:
+                entry[1].add(source)
+            kind = key.split(':', 1)[0]
+            self.duplicates[kind] = self.duplicates.get(kind, 0) + 1
+            return True
+
+    def add(self, key: str, source: str | None = None) -> None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = (now, {source} if source else set())
+                self._expire(now)
+            elif source:
+                entry[1].add(source)
+
+    def discard(self, key: str) -> None:
+        """Forget ``key``, e.g. once the item it names turned out to be invalid."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sources(self, key: str) -> set:
+        with self._lock:
+            entry = self._entries.get(key)
+            return set(entry[1]) if entry else set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'duplicates_suppressed': dict(self.duplicates)}
+
+
+class OrphanPool:
+    """Bounded, time-expiring buffer of blocks whose parent hasn't arrived yet.
+
+    Blocks are indexed by their own hash and by ``previous_hash`` so that
+    every child of a newly connected block is found directly. The oldest
+    orphans are dropped once ``maxsize`` is reached or ``ttl`` seconds pass.
+    """
+
+    def __init__(self, maxsize: int = 500, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._blocks: "OrderedDict[str, tuple]" = OrderedDict()
+        self._children: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.counters = {'added': 0, 'connected': 0, 'expired': 0, 'evicted': 0}
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, block_hash) -> bool:
+        return block_hash in self._blocks
+
+    def _discard(self, block_hash: str) -> None:
+        _, block = self._blocks.pop(block_hash)
+        siblings = self._children.get(block['previous_hash'])
+        if siblings is not None:
+            siblings.discard(block_hash)
+            if not siblings:
+                del self._children[block['previous_hash']]
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.ttl
+        while self._blocks:
+            block_hash, (added_at, _) = next(iter(self._blocks.items()))
+            if added_at > cutoff:
+                break
+            self._discard(block_hash)
+            self.counters['expired'] += 1
+
+    def add(self, block: dict) -> bool:
+        """Buffer ``block`` until its parent arrives; return ``False`` if it's already held."""
+        block_hash = block['hash']
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if block_hash in self._blocks:
+                return False
+            while len(self._blocks) >= self.maxsize:
+                self._discard(next(iter(self._blocks)))
+                self.counters['evicted'] += 1
+            self._blocks[block_hash] = (now, block)
+            self._children.setdefault(block['previous_hash'], set()).add(block_hash)
+            self.counters['added'] += 1
+            return True
+
+    def pop_children(self, parent_hash: str) -> list:
+        """Remove and return the buffered blocks built on ``parent_hash``."""
+        with self._lock:
+            self._expire(time.time())
+            children = [self._blocks[h][1] for h in self._children.get(parent_hash, ())]
+            for block in children:
+                self._discard(block['hash'])
+            self.counters['connected'] += len(children)
+            return children
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.time())
+            return {'size': len(self._blocks), **self.counters}
 
 
 class PeerNode:
-    """Simple peer node for block and transaction propagation."""
+    """Simple peer node for block and transaction propagation.
 
-    def __init__(self, blockchain, key_file: str | None = 'node_private.pem', peers_file: str | None = 'peers.json'):
+    New items are announced by hash in batched, signed inventory messages
+    (``/p2p/inv``). A peer replies with the hashes it is missing, and those
+    items are sent back together in one signed ``/p2p/data`` message, so
+    peers that already have an item never download it again. Blocks that
+    arrive before their parent wait in an :class:`OrphanPool` and are added
+    as soon as the parent connects.
+    """
+
+    def __init__(self, blockchain, key_file: str | None = 'node_private.pem', peers_file: str | None = 'peers.json',
+                 on_transaction=None, inventory_batch: int = 500, inventory_interval: float = 0.2,
+                 request_timeout: float = 30.0):
         self.blockchain = blockchain
         self.key_file = key_file
         self.peers_file = peers_file
+        # Applies chain mutations; the same writer everything else uses for this chain
+        self.writer = ChainWriter.of(blockchain)
+        self.on_transaction = on_transaction
+        self.inventory_batch = inventory_batch
+        self.inventory_interval = inventory_interval
+        self.request_timeout = request_timeout
+        self.dispatcher = BroadcastDispatcher(on_success=self._on_delivered,
+                                              on_failure=self._on_unreachable)
+        self.seen = SeenCache()
+        self.orphans = OrphanPool()
+        self._inventory: list = []
+        self._inventory_timer: threading.Timer | None = None
+        self._inventory_lock = threading.Lock()
+        # Items asked for in reply to an inventory message, by key; requests arrive on many threads
+        self._requested_lock = threading.Lock()
+        self._requested: Dict[str, float] = {}
+        self.inventory_stats = {
+            'announced': 0,
+            'requested': 0,
+            'served': 0,
+            'received': 0,
+        }
         self._load_or_create_keys()
+        self._peers_lock = threading.Lock()
         self.peers: Dict[str, Dict[str, str]] = {}
         if self.peers_file and os.path.exists(self.peers_file):
             try:
@@ -50,10 +375,15 @@ class PeerNode:
         self.node_id = hashlib.sha256(self.public_key_pem.encode()).hexdigest()
 
     def _save_peers(self):
-        if self.peers_file:
+        """Write the peer list; called from request and sender threads, so writes are serialized."""
+        if not self.peers_file:
+            return
+        with self._peers_lock:
+            tmp = self.peers_file + '.tmp'
             try:
-                with open(self.peers_file, 'w') as f:
-                    json.dump(self.peers, f)
+                with open(tmp, 'w') as f:
+                    json.dump(dict(self.peers), f)
+                os.replace(tmp, self.peers_file)
             except IOError as e:
                 logging.exception("Failed to save peers: %s", e)
 
@@ -64,6 +394,7 @@ class PeerNode:
             'public_key': public_key,
             'last_seen': time.time(),
         }
+        self.dispatcher.add_peer(peer_id)
         self._save_peers()
 
     def sign(self, data) -> str:
@@ -72,44 +403,292 @@ class PeerNode:
         return signature.hex()
 
     @staticmethod
-    def verify(data, public_key_pem: str, signature_hex: str) -> bool:
-        public_key = serialization.load_pem_public_key(public_key_pem.encode())
+    def gossip_key(kind: str, item) -> str | None:
+        """Seen-cache key for a gossiped item, from the hash of its contents rather than the hash it claims.
+
+        Keying on the claimed hash would let a peer send junk under a real
+        item's hash and have every genuine copy dropped as a duplicate.
+        """
+        if not isinstance(item, dict):
+            return None
         try:
-            public_key.verify(
-                bytes.fromhex(signature_hex),
-                json.dumps(data, sort_keys=True).encode(),
-                ec.ECDSA(hashes.SHA256()),
-            )
-            return True
-        except InvalidSignature:
-            return False
+            if kind == 'block':
+                return f'block:{Block.of(item).content_hash}'
+            return f'tx:{payload_hash(item)}'
+        except (KeyError, TypeError, ValueError):
+            return None
 
-    def _broadcast(self, endpoint: str, message: dict) -> None:
-        for peer_id, peer in list(self.peers.items()):
-            url = peer['url'] + endpoint
-            try:
-                requests.post(url, json=message, timeout=3)
-                self.peers[peer_id]['last_seen'] = time.time()
-            except requests.RequestException as e:
-                logging.warning("Failed to reach peer %s at %s: %s", peer_id, url, e)
-                self.peers.pop(peer_id, None)
-                self._save_peers()
+    @staticmethod
+    def verify(data, public_key_pem: str, signature_hex: str) -> bool:
+        return verify_signature(data, public_key_pem, signature_hex)
 
-    def broadcast_transaction(self, transaction: dict) -> None:
-        msg = {
-            'transaction': transaction,
+    def _signed(self, field: str, data) -> dict:
+        return {
+            field: data,
             'node_id': self.node_id,
             'public_key': self.public_key_pem,
-            'signature': self.sign(transaction),
+            'signature': self.sign(data),
         }
-        self._broadcast('/p2p/transaction', msg)
 
-    def broadcast_block(self, block: dict) -> None:
-        msg = {
-            'block': block,
-            'node_id': self.node_id,
-            'public_key': self.public_key_pem,
-            'signature': self.sign(block),
+    def authenticate(self, message: dict, field: str):
+        """Return the sender's node id if ``message[field]`` is signed by the key it carries, else ``None``."""
+        data = message.get(field)
+        pub = message.get('public_key')
+        peer_id = message.get('node_id')
+        sig = message.get('signature')
+        if data is None or not all([pub, peer_id, sig]) or not isinstance(pub, str):
+            return None
+        if peer_id != hashlib.sha256(pub.encode()).hexdigest():
+            return None
+        if not self.verify(data, pub, sig):
+            return None
+        return peer_id
+
+    def _on_delivered(self, peer_id: str, url: str, response) -> None:
+        peer = self.peers.get(peer_id)
+        if peer is not None:
+            peer['last_seen'] = time.time()
+
+    def _on_unreachable(self, peer_id: str, url: str, error: Exception) -> None:
+        logging.warning("Failed to reach peer %s at %s: %s", peer_id, url, error)
+        if self.peers.pop(peer_id, None) is not None:
+            self._save_peers()
+        self.dispatcher.remove_peer(peer_id)
+
+    def stats(self) -> dict:
+        """Counters describing peer fan-out."""
+        dispatch = dict(self.dispatcher.stats)
+        latency_total = dispatch.pop('latency_total')
+        dispatch['avg_latency'] = latency_total / dispatch['delivered'] if dispatch['delivered'] else 0.0
+        return {
+            'peers': len(self.peers),
+            'broadcast': dispatch,
+            'queue_depths': self.dispatcher.queue_depths(),
+            'gossip': self.seen.stats(),
+            'inventory': dict(self.inventory_stats),
+            'orphans': self.orphans.stats(),
         }
-        self._broadcast('/p2p/block', msg)
 
+    # ----- Announcing -----
+
+    def announce(self, kind: str, item_hash: str) -> None:
+        """Queue an inventory entry; entries go out in batches of ``inventory_batch`` or after ``inventory_interval``."""
+        self.seen.add(f'{kind}:{item_hash}')
+        with self._inventory_lock:
+            self._inventory.append({'type': kind, 'hash': item_hash})
+            if len(self._inventory) < self.inventory_batch:
+                if self._inventory_timer is None:
+                    self._inventory_timer = threading.Timer(self.inventory_interval, self.flush_inventory)
+                    self._inventory_timer.daemon = True
+                    self._inventory_timer.start()
+                return
+        self.flush_inventory()
+
+    def flush_inventory(self) -> None:
+        """Send queued inventory to every peer now, leaving out items a peer sent us."""
+        with self._inventory_lock:
+            batch, self._inventory = self._inventory, []
+            if self._inventory_timer is not None:
+                self._inventory_timer.cancel()
+                self._inventory_timer = None
+        if not batch:
+            return
+        sources = [self.seen.sources(f"{item['type']}:{item['hash']}") for item in batch]
+        # Most peers get the same list, so each distinct list is signed once
+        messages: Dict[tuple, dict] = {}
+        for peer_id, peer in list(self.peers.items()):
+            items = tuple(i for i, sent_by in enumerate(sources) if peer_id not in sent_by)
+            if not items:
+                continue
+            msg = messages.get(items)
+            if msg is None:
+                msg = messages[items] = self._signed('inventory', [batch[i] for i in items])
+            self.dispatcher.submit(peer_id, peer['url'] + '/p2p/inv', msg, on_response=self._on_getdata)
+            self.inventory_stats['announced'] += len(items)
+
+    def broadcast_transaction(self, transaction: dict) -> None:
+        self.announce('tx', transaction.get('transaction_hash'))
+
+    def broadcast_block(self, block: dict) -> None:
+        self.announce('block', block.get('hash'))
+
+    # ----- Serving requests -----
+
+    def _on_getdata(self, peer_id: str, response) -> None:
+        """Send a peer the items it asked for in reply to an inventory message."""
+        try:
+            wanted = response.json().get('getdata') or []
+        except (AttributeError, ValueError):
+            return
+        if not isinstance(wanted, list):
+            return
+        transactions, blocks = self._lookup(self.writer.snapshot, wanted)
+        peer = self.peers.get(peer_id)
+        if peer is None or not (transactions or blocks):
+            return
+        msg = self._signed('items', {'transactions': transactions, 'blocks': blocks})
+        self.dispatcher.submit(peer_id, peer['url'] + '/p2p/data', msg)
+        self.inventory_stats['served'] += len(transactions) + len(blocks)
+
+    @staticmethod
+    def _lookup(snapshot, wanted: list) -> tuple:
+        """The transactions and blocks named in a getdata list that ``snapshot`` has."""
+        transactions, blocks = [], []
+        for item in wanted:
+            if not isinstance(item, dict):
+                continue
+            if item.get('type') == 'tx':
+                tx = snapshot.get_tx(item.get('hash'))
+                if tx is not None:
+                    transactions.append(tx)
+            elif item.get('type') == 'block':
+                block = snapshot.get_block_by_hash(item.get('hash'))
+                if block is not None:
+                    blocks.append(block)
+        return transactions, blocks
+
+    # ----- Receiving -----
+
+    def _is_known(self, snapshot, kind: str, item_hash: str) -> bool:
+        if kind == 'tx':
+            return item_hash in snapshot.tx_index
+        return item_hash in self.orphans or snapshot.get_block_by_hash(item_hash) is not None
+
+    def _unknown(self, candidates: list) -> list:
+        """The ``(key, kind, hash)`` candidates this node has neither on the chain nor pending."""
+        snapshot = self.writer.snapshot
+        return [c for c in candidates if not self._is_known(snapshot, c[1], c[2])]
+
+    def handle_inventory(self, message: dict):
+        """Answer an inventory message with the items this node is missing; ``None`` if unauthenticated."""
+        peer_id = self.authenticate(message, 'inventory')
+        if peer_id is None or not isinstance(message['inventory'], list):
+            return None
+        candidates = []
+        for item in message['inventory']:
+            if not isinstance(item, dict):
+                continue
+            kind, item_hash = item.get('type'), item.get('hash')
+            if kind not in ('tx', 'block') or not isinstance(item_hash, str):
+                continue
+            key = f'{kind}:{item_hash}'
+            if self.seen.seen(key, peer_id):
+                continue
+            candidates.append((key, kind, item_hash))
+        if candidates:
+            candidates = self._unknown(candidates)
+        now = time.time()
+        wanted = []
+        with self._requested_lock:
+            for key, requested_at in list(self._requested.items()):
+                if now - requested_at > self.request_timeout:
+                    del self._requested[key]
+            for key, kind, item_hash in candidates:
+                if key in self._requested:
+                    continue
+                # Ask only the first peer that announces an item until the request times out
+                self._requested[key] = now
+                wanted.append({'type': kind, 'hash': item_hash})
+        self.inventory_stats['requested'] += len(wanted)
+        return {'status': True, 'getdata': wanted}
+
+    def _received(self, kind: str, item: dict, peer_id: str) -> str | None:
+        """Clear the request for a delivered item; its seen-cache key, or ``None`` if already seen or malformed."""
+        claimed = item.get('hash') if kind == 'block' else item.get('transaction_hash')
+        with self._requested_lock:
+            self._requested.pop(f'{kind}:{claimed}', None)
+        key = self.gossip_key(kind, item)
+        if key is None or self.seen.seen(key, peer_id):
+            return None
+        # Marked first so it isn't announced back to the sender; forgotten if rejected
+        self.seen.add(key, peer_id)
+        return key
+
+    def handle_data(self, message: dict):
+        """Accept the blocks (by height) then transactions of a data message; ``None`` if unauthenticated."""
+        peer_id = self.authenticate(message, 'items')
+        if peer_id is None or not isinstance(message['items'], dict):
+            return None
+        items = message['items']
+        accepted = {'blocks': 0, 'transactions': 0}
+        blocks = [b for b in items.get('blocks') or [] if isinstance(b, dict)]
+        transactions = [tx for tx in items.get('transactions') or [] if isinstance(tx, dict)]
+        for block in sorted(blocks, key=lambda b: b.get('index', 0) if isinstance(b.get('index'), int) else 0):
+            key = self._received('block', block, peer_id)
+            if key is None:
+                continue
+            if self.accept_block(block):
+                accepted['blocks'] += 1
+            elif block.get('hash') not in self.orphans:
+                self.seen.discard(key)
+        for tx in transactions:
+            key = self._received('tx', tx, peer_id)
+            if key is None:
+                continue
+            if self.accept_transaction(tx).get('status'):
+                accepted['transactions'] += 1
+            else:
+                self.seen.discard(key)
+        self.inventory_stats['received'] += accepted['blocks'] + accepted['transactions']
+        return {'status': True, 'accepted': accepted}
+
+    def accept_transaction(self, transaction: dict) -> dict:
+        """Add a transaction received from a peer and announce it onwards."""
+        result = self.writer.add_transaction(transaction)
+        if result.get('status'):
+            self.broadcast_transaction(transaction)
+            if self.on_transaction:
+                self.on_transaction()
+        return result
+
+    def _is_orphan(self, block: Block) -> bool:
+        """Whether a rejected block is ahead of our tip on an unknown parent and carries valid work.
+
+        The work must meet at least our current difficulty; a block claiming
+        less (even none) is cheap enough to flood the pool with.
+        """
+        try:
+            if block['index'] <= self.blockchain.get_last_index():
+                return False
+            if self.blockchain.get_block_by_hash(block['previous_hash']) is not None:
+                return False
+        except (KeyError, TypeError):
+            return False
+        difficulty = block.get('difficulty')
+        if not isinstance(difficulty, int) or difficulty < max(self.blockchain.difficulty, 1):
+            return False
+        block_hash = block.content_hash
+        return block_hash == block.get('hash') and block_hash.startswith('0' * difficulty)
+
+    def _add_block(self, block: dict) -> bool:
+        # Signatures were verified by accept_block before the block reached the writer
+        return self.blockchain.add_block(block, verify_signatures=False) and self.blockchain.is_chain_valid(full=False)
+
+    def accept_block(self, block: dict) -> bool:
+        """Add a block received from a peer, then any orphans it connects, and announce them onwards.
+
+        A block whose parent is unknown is held in the orphan pool; ``False``
+        is returned for it until it connects. Signatures are checked here,
+        before the writer, so buffered orphans are already verified too.
+        """
+        if not self.blockchain.verify_block_signatures(block):
+            return False
+        connected = self.writer.call(self._connect, Block.of(block))
+        for added in connected:
+            self.broadcast_block(added)
+        return bool(connected)
+
+    def _connect(self, block: Block) -> list:
+        """On the writer: add ``block`` and the orphans it connects; returns the blocks added."""
+        if not self._add_block(block):
+            if self._is_orphan(block):
+                self.orphans.add(block)
+            return []
+        connected = [block]
+        parents = [block['hash']]
+        while parents:
+            for child in self.orphans.pop_children(parents.pop()):
+                if self._add_block(child):
+                    connected.append(child)
+                    parents.append(child['hash'])
+        return connected
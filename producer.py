@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from chainstate import ChainWriter
+
+
+class BlockProducer:
+    """Background thread that assembles pending transactions into blocks.
+
+    A block is mined when ``max_transactions`` are pending, or when at least
+    ``min_fill`` are pending and ``max_interval`` seconds have passed since
+    the last block. Submitters call :meth:`notify` after adding a
+    transaction and can block on :meth:`wait_for_confirmation`. Blocks are
+    mined through the chain's :class:`ChainWriter`, so other writes carry
+    on during proof of work.
+    """
+
+    def __init__(self, blockchain, on_block: Optional[Callable[[dict], None]] = None,
+                 max_transactions: int = 500, max_interval: float = 2.0, min_fill: int = 1,
+                 miner_address: Optional[str] = None):
+        self.blockchain = blockchain
+        self.on_block = on_block
+        self.max_transactions = max_transactions
+        self.max_interval = max_interval
+        self.min_fill = max(min_fill, 1)
+        self.miner_address = miner_address
+        self.writer = ChainWriter.of(blockchain)
+        self._wakeup = threading.Event()
+        self._mined = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_block_time = time.time()
+        self.blocks_produced = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='block-producer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self) -> None:
+        """Tell the producer a transaction was added to the mempool."""
+        self._wakeup.set()
+
+    def _should_mine(self, pending: int, now: float) -> bool:
+        if pending >= self.max_transactions:
+            return True
+        return pending >= self.min_fill and now - self.last_block_time >= self.max_interval
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            pending = len(self.blockchain.mempool)
+            now = time.time()
+            if self._should_mine(pending, now):
+                if self.produce_block().get('status'):
+                    continue
+                # Don't redo proof of work straight away on a block that just failed
+                self._stop.wait(self.max_interval)
+                continue
+            if pending >= self.min_fill:
+                timeout = max(self.last_block_time + self.max_interval - now, 0.01)
+            else:
+                timeout = self.max_interval
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def produce_block(self) -> dict:
+        """Mine one block from the mempool now and notify any waiters."""
+        try:
+            result = self.writer.mine(self.miner_address, max_transactions=self.max_transactions)
+        except Exception as e:
+            logging.exception("Block production failed: %s", e)
+            result = {'status': False, 'error': str(e)}
+        self.last_block_time = time.time()
+        if result.get('status'):
+            self.blocks_produced += 1
+            if self.on_block:
+                try:
+                    self.on_block(result['block'])
+                except Exception as e:
+                    logging.exception("Block callback failed: %s", e)
+        with self._mined:
+            self._mined.notify_all()
+        return result
+
+    def wait_for_confirmation(self, tx_hash: str, timeout: float) -> dict:
+        """Block until ``tx_hash`` is confirmed or ``timeout`` seconds pass; return its status."""
+        deadline = time.time() + timeout
+        with self._mined:
+            status = self.writer.snapshot.get_tx_status(tx_hash)
+            while status['status'] == 'pending':
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._mined.wait(remaining)
+                status = self.writer.snapshot.get_tx_status(tx_hash)
+        return status
@@ -0,0 +1,156 @@
+"""Opt-in per-request timing and slow-request profiles for the Flask app.
+
+Nothing here runs unless ``RequestProfiler.install`` is called: the hooks
+and admin routes are only registered on the app then, so a node started
+without ``--profile`` pays nothing.
+
+When installed, every request runs under ``cProfile`` and its wall-clock
+and CPU time are recorded per endpoint. Profiles of requests slower than
+``threshold`` seconds are kept, newest first, up to ``keep`` of them, and
+served by ``GET /admin/profiles``. Those routes answer only requests that
+carry ``Authorization: Bearer <token>`` when a ``token`` is set, and only
+requests from the loopback interface otherwise.
+"""
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import marshal
+import pstats
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from flask import abort, current_app, g, jsonify, request
+
+
+class RequestProfiler:
+    """Request timing and slow-request capture, attached to an app with ``install``."""
+
+    def __init__(self, threshold: float = 0.5, keep: int = 20, token: Optional[str] = None):
+        self.threshold = threshold
+        self.keep = keep
+        self.token = token
+        self.profiles: deque = deque(maxlen=keep)
+        self.endpoints: Dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def install(self, app) -> "RequestProfiler":
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+        app.add_url_rule('/admin/profiles', 'profiles', self.list_view)
+        app.add_url_rule('/admin/profiles/<int:profile_id>', 'profile', self.profile_view)
+        return self
+
+    def _start(self) -> None:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process; this request is only timed
+            profile = None
+        g.profiling = (profile, time.perf_counter(), time.thread_time())
+
+    def _finish(self, response):
+        state = g.pop('profiling', None)
+        if state is None:
+            return response
+        profile, wall_start, cpu_start = state
+        if profile is not None:
+            profile.disable()
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            totals = self.endpoints.setdefault(endpoint, {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'max_wall': 0.0})
+            totals['count'] += 1
+            totals['wall'] += wall
+            totals['cpu'] += cpu
+            totals['max_wall'] = max(totals['max_wall'], wall)
+        if profile is not None and wall >= self.threshold:
+            self._capture(profile, endpoint, response.status_code, wall, cpu)
+        response.headers['Server-Timing'] = f'app;dur={wall * 1000:.1f}, cpu;dur={cpu * 1000:.1f}'
+        return response
+
+    def _discard(self, exc=None) -> None:
+        state = g.pop('profiling', None)
+        if state is not None and state[0] is not None:
+            state[0].disable()
+
+    def _capture(self, profile: cProfile.Profile, endpoint: str, status: int, wall: float, cpu: float) -> None:
+        profile.create_stats()
+        entry = {
+            'id': next(self._ids),
+            'timestamp': time.time(),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': endpoint,
+            'status': status,
+            'wall': wall,
+            'cpu': cpu,
+            # Same format as pstats' dump_stats, so downloads open in any pstats viewer
+            'data': marshal.dumps(profile.stats),
+        }
+        with self._lock:
+            self.profiles.appendleft(entry)
+        logging.info("Slow request %s %s took %.3fs (%.3fs CPU), profile %d",
+                     entry['method'], entry['path'], wall, cpu, entry['id'])
+
+    def _authorize(self) -> None:
+        """Abort unless the request may see profiles, which include paths and query strings."""
+        if self.token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied.encode(), f'Bearer {self.token}'.encode()):
+                abort(401)
+        elif request.remote_addr not in ('127.0.0.1', '::1'):
+            abort(403)
+
+    def get(self, profile_id: int) -> Optional[dict]:
+        with self._lock:
+            return next((p for p in self.profiles if p['id'] == profile_id), None)
+
+    def report(self, profile_id: int, sort: str = 'cumulative', limit: int = 40) -> Optional[str]:
+        """The profile as pstats text, or ``None`` if it is no longer kept."""
+        entry = self.get(profile_id)
+        if entry is None:
+            return None
+        stats = pstats.Stats(_Loaded(marshal.loads(entry['data'])), stream=io.StringIO())
+        stats.sort_stats(sort).print_stats(limit)
+        return stats.stream.getvalue()
+
+    def list_view(self):
+        self._authorize()
+        with self._lock:
+            profiles = [{k: v for k, v in p.items() if k != 'data'} for p in self.profiles]
+            endpoints = {name: dict(totals) for name, totals in self.endpoints.items()}
+        return jsonify({'threshold': self.threshold, 'profiles': profiles, 'endpoints': endpoints})
+
+    def profile_view(self, profile_id: int):
+        """pstats text by default; ``?format=prof`` downloads the raw profile."""
+        self._authorize()
+        entry = self.get(profile_id)
+        if entry is None:
+            abort(404)
+        if request.args.get('format') == 'prof':
+            response = current_app.response_class(entry['data'], mimetype='application/octet-stream')
+            response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.prof'
+            return response
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            abort(400)
+        limit = request.args.get('limit', 40, type=int)
+        return self.report(profile_id, sort, limit), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+
+class _Loaded:
+    """Lets ``pstats.Stats`` read stats that were already unmarshalled."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
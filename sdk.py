@@ -1,3 +1,5 @@
+import asyncio
+import functools
 import os
 import random
 import string
@@ -5,8 +7,11 @@ import json
 import time
 import hashlib
 import base64
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -14,21 +19,62 @@ from cryptography.fernet import Fernet
 
 
 class SDKChain:
-    chain_path = 'http://127.0.0.1:5000/'
+    """Client for a node's HTTP API.
 
-    def __init__(self, rel_chain_path):
+    Every request goes through one pooled ``requests.Session``, so
+    connections are reused. Idempotent requests are retried with backoff on
+    connection errors and 502/503/504 responses, and every request has a
+    timeout. ``GET /mine`` mines a block each time it is served, so it is
+    retried only when no connection could be made. Methods return
+    ``{'status': <HTTP status>, 'data': <JSON body>}``.
+    """
+
+    def __init__(self, rel_chain_path='chain', base_url='http://127.0.0.1:5000', timeout=10.0,
+                 retries=3, pool_size=10, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
         self.chain_rel_path = rel_chain_path
-        self.chain_path = os.path.join(self.chain_path, self.chain_rel_path)
+        self.chain_path = self._url(rel_chain_path)
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=retries, backoff_factor=0.1, status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            # The longest matching prefix wins, so /mine gets its own adapter
+            connect_only = Retry(total=retries, read=0, status=0, other=0, backoff_factor=0.1,
+                                 raise_on_status=False)
+            session.mount(self._url('mine'), HTTPAdapter(max_retries=connect_only))
+        self.session = session
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _url(self, *parts):
+        return '/'.join([self.base_url] + [str(p).strip('/') for p in parts])
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        resp = self.session.request(method, url, **kwargs)
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {'error': resp.text}
+        return {'status': resp.status_code, 'data': data}
 
     def get_chain(self):
-        r_get_chain = requests.get(self.chain_path)
-        status = r_get_chain.status_code
-        data = r_get_chain.json()
-        return {'status': status, 'data': data}
+        return self._request('GET', self.chain_path)
 
     @staticmethod
-    def create_wallet():
-        resp = requests.get('http://127.0.0.1:5000/address/create')
+    def create_wallet(base_url='http://127.0.0.1:5000', timeout=10.0):
+        resp = requests.get(base_url.rstrip('/') + '/address/create', timeout=timeout)
         return resp.json()
 
     @staticmethod
@@ -90,10 +136,13 @@ class SDKChain:
         return tx
 
     def post_transaction(self, transaction):
-        r_post_transaction = requests.post(self.chain_path, json=transaction)
-        status = r_post_transaction.status_code
-        data = r_post_transaction.json()
-        return {'status': status, 'data': data}
+        return self._request('POST', self.chain_path, json=transaction)
+
+    def post_transactions(self, transactions):
+        return self._request('POST', self._url('transactions/batch'), json={'transactions': transactions})
+
+    def get_receipt(self, tx_hash, wait=0):
+        return self._request('GET', self._url('tx', tx_hash, 'receipt'), params={'wait': wait})
 
     def create_fake_transactions(self, num_transactions):
         for _ in range(num_transactions):
@@ -116,48 +165,94 @@ class SDKChain:
             ).hexdigest()
             self.post_transaction(tx)
 
+    def get_balance(self, address):
+        return self._request('GET', self._url('address', address))
+
+    def get_block(self, block_index):
+        return self._request('GET', self._url(self.chain_rel_path, 'block', block_index))
+
+    def get_total_blocks(self):
+        return self._request('GET', self._url(self.chain_rel_path, 'total-blocks'))
+
     def get_last_block(self):
-        url = os.path.join(self.chain_path, 'last-block')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url(self.chain_rel_path, 'last-block'))
 
     def get_validity(self):
-        url = os.path.join(self.chain_path, 'valid')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url(self.chain_rel_path, 'valid'))
 
     def get_last_hash(self):
-        url = os.path.join(self.chain_path, 'last-hash')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url(self.chain_rel_path, 'last-hash'))
 
     def get_total_transactions(self):
-        url = os.path.join(self.chain_path, 'total-transactions')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url(self.chain_rel_path, 'total-transactions'))
 
     def get_median_transaction(self):
-        url = os.path.join(self.chain_path, 'median-transaction')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url('tx/median-transaction'))
 
     def get_pending_transactions(self):
-        url = os.path.join('http://127.0.0.1:5000', 'pending-transactions')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url('pending-transactions'))
 
     def mine(self, miner_address=None):
-        url = os.path.join('http://127.0.0.1:5000', 'mine')
         params = {'miner_address': miner_address} if miner_address else {}
-        resp = requests.get(url, params=params)
-        return {'status': resp.status_code, 'data': resp.json()}
+        # Mining takes as long as it takes, and a timed-out GET would be retried and mine again
+        return self._request('GET', self._url('mine'), params=params, timeout=None)
 
     def get_block_hash(self, block_index):
-        url = os.path.join(self.chain_path, f'block/{block_index}/hash')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url(self.chain_rel_path, 'block', block_index, 'hash'))
 
     def determine_winner(self):
-        url = os.path.join('http://127.0.0.1:5000', 'determine-winner')
-        resp = requests.get(url)
-        return {'status': resp.status_code, 'data': resp.json()}
+        return self._request('GET', self._url('determine-winner'))
+
+
+class AsyncSDKChain:
+    """asyncio front end for :class:`SDKChain`.
+
+    Each call runs the blocking client on a thread pool sized to
+    ``max_concurrency``, sharing one connection pool of the same size, so
+    many queries and submissions can be in flight at once. The network
+    methods of :class:`SDKChain` are available as coroutines.
+    """
+
+    methods = (
+        'get_chain', 'post_transaction', 'post_transactions', 'get_receipt',
+        'get_balance', 'get_block', 'get_total_blocks', 'get_last_block', 'get_validity', 'get_last_hash', 'get_total_transactions',
+        'get_median_transaction', 'get_pending_transactions', 'mine', 'get_block_hash',
+        'determine_winner',
+    )
+
+    def __init__(self, rel_chain_path='chain', base_url='http://127.0.0.1:5000', max_concurrency=32,
+                 **client_options):
+        client_options.setdefault('pool_size', max_concurrency)
+        self.client = SDKChain(rel_chain_path, base_url=base_url, **client_options)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='sdk')
+
+    async def _call(self, name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(getattr(self.client, name), *args, **kwargs))
+
+    def __getattr__(self, name):
+        if name not in self.methods:
+            raise AttributeError(name)
+        return functools.partial(self._call, name)
+
+    async def create_wallet(self):
+        return await self._call('create_wallet', self.client.base_url, self.client.timeout)
+
+    async def submit_many(self, transactions, batch_size=500):
+        """Post ``transactions`` as concurrent batches; return the per-transaction results in order."""
+        batches = [transactions[i:i + batch_size] for i in range(0, len(transactions), batch_size)]
+        responses = await asyncio.gather(*(self.post_transactions(batch) for batch in batches))
+        results = []
+        for batch, resp in zip(batches, responses):
+            results.extend(resp['data'].get('results') or [{'status': False, 'error': resp['data']}] * len(batch))
+        return results
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,283 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from metrics import storage_bytes_written, storage_write_duration
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)",
+    """CREATE TABLE IF NOT EXISTS blocks (
+        height INTEGER PRIMARY KEY,
+        hash TEXT NOT NULL,
+        previous_hash TEXT NOT NULL,
+        header TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_blocks_hash ON blocks (hash)",
+    """CREATE TABLE IF NOT EXISTS transactions (
+        block_height INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        hash TEXT,
+        sender TEXT,
+        recipient TEXT,
+        amount NUMERIC,
+        fee NUMERIC,
+        data TEXT NOT NULL,
+        PRIMARY KEY (block_height, position)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_hash ON transactions (hash)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_sender ON transactions (sender)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_recipient ON transactions (recipient)",
+    """CREATE TABLE IF NOT EXISTS mempool (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash TEXT UNIQUE,
+        sender TEXT,
+        data TEXT NOT NULL,
+        added_at REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_mempool_sender ON mempool (sender)",
+    """CREATE TABLE IF NOT EXISTS balances (
+        address TEXT PRIMARY KEY,
+        received NUMERIC NOT NULL,
+        sent NUMERIC NOT NULL,
+        tx_count INTEGER NOT NULL
+    )""",
+)
+
+
+class ChainStore:
+    """SQLite storage with one row per block, transaction and pending transaction.
+
+    New blocks and pending transactions are appended without touching the
+    rest of the chain, so a write costs the size of the change rather than
+    the size of the chain.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # The API writes from request threads and the block producer thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(mempool)")}
+            if 'added_at' not in columns:
+                self.conn.execute("ALTER TABLE mempool ADD COLUMN added_at REAL")
+        self._migrate_legacy_state()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _migrate_legacy_state(self) -> None:
+        """Move the old JSON ``chain``/``pending`` rows of ``state`` into the new tables."""
+        cur = self.conn.cursor()
+        chain_row = cur.execute("SELECT value FROM state WHERE key='chain'").fetchone()
+        pending_row = cur.execute("SELECT value FROM state WHERE key='pending'").fetchone()
+        if chain_row is None and pending_row is None:
+            return
+        try:
+            chain = json.loads(chain_row[0]) if chain_row else []
+            pending = json.loads(pending_row[0]) if pending_row else []
+        except json.JSONDecodeError as e:
+            logging.exception("Failed to migrate legacy blockchain state: %s", e)
+            return
+        with self.conn:
+            if self.block_count() == 0:
+                for height, block in enumerate(chain):
+                    self._insert_block(height, block)
+            self._insert_pending(pending)
+            self.conn.execute("DELETE FROM state WHERE key IN ('chain', 'pending')")
+        logging.info("Migrated %d blocks and %d pending transactions from legacy state",
+                     len(chain), len(pending))
+
+    # ----- reads -----
+    def block_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    def load_chain(self) -> List[dict]:
+        """Rebuild the list of block dicts ordered by height."""
+        cur = self.conn.cursor()
+        chain = []
+        for height, header in cur.execute("SELECT height, header FROM blocks ORDER BY height"):
+            block = json.loads(header)
+            block['transactions'] = []
+            chain.append(block)
+        rows = cur.execute(
+            "SELECT block_height, data FROM transactions ORDER BY block_height, position"
+        )
+        for height, data in rows:
+            chain[height]['transactions'].append(json.loads(data))
+        return chain
+
+    def load_mempool(self) -> List[Tuple[dict, Optional[float]]]:
+        """Pending transactions in arrival order, each with the time it arrived (``None`` if unknown)."""
+        rows = self.conn.execute("SELECT data, added_at FROM mempool ORDER BY seq")
+        return [(json.loads(data), added_at) for data, added_at in rows]
+
+    def load_balances(self):
+        """Return the stored balance rows and the block height they reflect."""
+        height = self.get_state('balances_height')
+        if height is None:
+            return [], -1
+        rows = self.conn.execute("SELECT address, received, sent, tx_count FROM balances")
+        return rows.fetchall(), height
+
+    def get_state(self, key: str):
+        row = self.conn.execute("SELECT value FROM state WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    # ----- writes -----
+    def _insert_block(self, height: int, block: dict) -> int:
+        """Write one block and its transactions; return the JSON bytes written."""
+        header = json.dumps({k: v for k, v in block.items() if k != 'transactions'})
+        self.conn.execute(
+            "INSERT OR REPLACE INTO blocks (height, hash, previous_hash, header) VALUES (?, ?, ?, ?)",
+            (height, block.get('hash', ''), block.get('previous_hash', ''), header),
+        )
+        rows = [
+            (
+                height, position, tx.get('transaction_hash'), tx.get('sender'),
+                tx.get('recipient'), tx.get('amount'), tx.get('fee'), json.dumps(tx),
+            )
+            for position, tx in enumerate(block['transactions'])
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO transactions "
+            "(block_height, position, hash, sender, recipient, amount, fee, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        return len(header) + sum(len(row[-1]) for row in rows)
+
+    def _upsert_balances(self, balances: dict, height: int) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO balances (address, received, sent, tx_count) VALUES (?, ?, ?, ?)",
+            [(a, b['received'], b['sent'], b['tx_count']) for a, b in balances.items()],
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES ('balances_height', ?)",
+            (json.dumps(height),),
+        )
+
+    def _insert_pending(self, transactions: Iterable[dict], arrival: Optional[Callable] = None) -> int:
+        """Store pending transactions; ``arrival`` maps a hash to when it arrived, otherwise now."""
+        now = time.time()
+        rows = [
+            (tx.get('transaction_hash'), tx.get('sender'), json.dumps(tx),
+             arrival(tx.get('transaction_hash')) if arrival else now)
+            for tx in transactions
+        ]
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO mempool (hash, sender, data, added_at) VALUES (?, ?, ?, ?)", rows
+        )
+        return sum(len(row[2]) for row in rows)
+
+    def append_block(self, height: int, block: dict, balances: Optional[dict] = None) -> None:
+        """Store a new block and drop its transactions from the mempool table.
+
+        ``balances`` holds the accounts the block touched; they are written
+        in the same database transaction so the index never lags the chain.
+        """
+        try:
+            with storage_write_duration.time('append_block'), self.lock, self.conn:
+                written = self._insert_block(height, block)
+                if balances is not None:
+                    self._upsert_balances(balances, height)
+                self.conn.executemany(
+                    "DELETE FROM mempool WHERE hash=?",
+                    [(tx.get('transaction_hash'),) for tx in block['transactions']],
+                )
+            storage_bytes_written.inc(written, 'append_block')
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to save block %s: %s", height, e)
+
+    def replace_blocks_from(self, height: int, blocks: List[dict]) -> None:
+        """Replace every block from ``height`` upwards with ``blocks``, as after a reorganization."""
+        try:
+            with storage_write_duration.time('replace_blocks'), self.lock, self.conn:
+                self.conn.execute("DELETE FROM blocks WHERE height >= ?", (height,))
+                self.conn.execute("DELETE FROM transactions WHERE block_height >= ?", (height,))
+                written = sum(self._insert_block(height + offset, block) for offset, block in enumerate(blocks))
+                self.conn.executemany(
+                    "DELETE FROM mempool WHERE hash=?",
+                    [(tx.get('transaction_hash'),) for block in blocks for tx in block['transactions']],
+                )
+            storage_bytes_written.inc(written, 'replace_blocks')
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to replace blocks from %s: %s", height, e)
+
+    def add_pending(self, transactions: Iterable[dict], arrival: Optional[Callable] = None) -> None:
+        try:
+            with storage_write_duration.time('add_pending'), self.lock, self.conn:
+                written = self._insert_pending(transactions, arrival)
+            storage_bytes_written.inc(written, 'add_pending')
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to save pending transactions: %s", e)
+
+    def update_pending(self, added: Iterable[dict], removed: Iterable[str],
+                       arrival: Optional[Callable] = None) -> None:
+        """Insert and delete pending transactions in one database transaction."""
+        try:
+            with storage_write_duration.time('update_pending'), self.lock, self.conn:
+                self.conn.executemany(
+                    "DELETE FROM mempool WHERE hash=?", [(h,) for h in removed]
+                )
+                written = self._insert_pending(added, arrival)
+            storage_bytes_written.inc(written, 'update_pending')
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to save pending transactions: %s", e)
+
+    def remove_pending(self, tx_hashes: Iterable[str]) -> None:
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "DELETE FROM mempool WHERE hash=?", [(h,) for h in tx_hashes]
+                )
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to remove pending transactions: %s", e)
+
+    def set_state(self, key: str, value) -> None:
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value)),
+                )
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to save %s: %s", key, e)
+
+    def replace_balances(self, balances: dict, height: int) -> None:
+        try:
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM balances")
+                self._upsert_balances(balances, height)
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to save balance index: %s", e)
+
+    def replace_all(self, chain: List[dict], pending: Iterable[dict], state: Optional[dict] = None,
+                    balances: Optional[dict] = None, pending_arrival: Optional[Callable] = None) -> None:
+        """Rewrite every table from scratch; only used for bootstrapping and repair."""
+        try:
+            with storage_write_duration.time('replace_all'), self.lock, self.conn:
+                self.conn.execute("DELETE FROM blocks")
+                self.conn.execute("DELETE FROM transactions")
+                self.conn.execute("DELETE FROM mempool")
+                self.conn.execute("DELETE FROM balances")
+                written = sum(self._insert_block(height, block) for height, block in enumerate(chain))
+                written += self._insert_pending(pending, pending_arrival)
+                if balances is not None:
+                    self._upsert_balances(balances, len(chain) - 1)
+                for key, value in (state or {}).items():
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                        (key, json.dumps(value)),
+                    )
+            storage_bytes_written.inc(written, 'replace_all')
+        except sqlite3.DatabaseError as e:
+            logging.exception("Failed to save blockchain state: %s", e)
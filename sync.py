@@ -0,0 +1,214 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from blocks import Block
+
+
+def block_work(block: dict) -> int:
+    """Expected number of hashes behind a block's proof of work."""
+    return 16 ** block.get('difficulty', 1)
+
+
+class SyncError(Exception):
+    """A range of blocks could not be fetched from any peer."""
+
+
+class HttpTransport:
+    """Fetches headers and blocks from peers' ``/p2p/headers`` and ``/p2p/blocks`` endpoints.
+
+    Each download thread keeps its own keep-alive session.
+    """
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def headers(self, url: str, locator: List[str], limit: int) -> List[dict]:
+        resp = self._session().post(url + '/p2p/headers', json={'locator': locator, 'limit': limit},
+                                    timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()['headers']
+
+    def blocks(self, url: str, start: int, end: int) -> List[dict]:
+        resp = self._session().get(url + '/p2p/blocks', params={'start': start, 'end': end},
+                                   timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()['blocks']
+
+
+class ChainSync:
+    """Headers-first catch-up from a node's registered peers.
+
+    Headers are fetched from every peer, starting after the newest block we
+    share with it, and the header chain with the most proof of work that
+    forks off our chain wins. Its bodies are then downloaded in ranges of
+    ``batch_size`` blocks spread over the peers that have that chain. Each
+    range is checked against its headers by the thread that downloaded it,
+    while ranges that are already complete are linked, signature-checked
+    and applied in order. If the best chain forks below our tip, the
+    replaced blocks are swapped out in one reorganization at the end.
+
+    ``transport`` needs ``headers(url, locator, limit)`` and
+    ``blocks(url, start, end)``; tests pass one that calls other nodes
+    in-process.
+    """
+
+    def __init__(self, node, transport=None, workers: int = 4, batch_size: int = 100,
+                 header_limit: int = 2000):
+        self.node = node
+        self.blockchain = node.blockchain
+        self.transport = transport or HttpTransport()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.header_limit = header_limit
+        self._running = threading.Lock()
+        self.last_result: dict = {}
+
+    def _peer_urls(self) -> List[str]:
+        return [peer['url'] for peer in list(self.node.peers.values())]
+
+    def _fetch_headers(self, url: str, locator: List[str]) -> List[dict]:
+        headers = []
+        while True:
+            batch = self.transport.headers(url, locator, self.header_limit)
+            headers.extend(batch)
+            if len(batch) < self.header_limit:
+                return headers
+            locator = [batch[-1]['hash']]
+
+    def _fork_gain(self, headers: List[dict], chain):
+        """Return ``(fork_height, extra_work)`` for a header chain, or ``None`` if it doesn't fit ``chain``."""
+        if headers and headers[0].get('index') == 0:
+            if headers[0].get('hash') != chain[0].get('hash'):
+                return None
+            headers = headers[1:]
+        if not headers:
+            return None
+        fork_height = headers[0].get('index', 0) - 1
+        if not 0 <= fork_height < len(chain) or headers[0].get('previous_hash') != chain[fork_height].get('hash'):
+            return None
+        previous = headers[0]['previous_hash']
+        for offset, header in enumerate(headers):
+            if header.get('index') != fork_height + 1 + offset or header.get('previous_hash') != previous:
+                return None
+            block_hash = header.get('hash')
+            if not isinstance(block_hash, str) or not block_hash.startswith('0' * header.get('difficulty', 1)):
+                return None
+            previous = block_hash
+        work = sum(block_work(h) for h in headers) - sum(block_work(b) for b in chain[fork_height + 1:])
+        return fork_height, work
+
+    def _fetch_range(self, headers: List[dict], urls: List[str]) -> List[dict]:
+        """Download the bodies for ``headers`` from the first of ``urls`` that returns matching blocks."""
+        start, end = headers[0]['index'], headers[-1]['index'] + 1
+        for url in urls:
+            try:
+                blocks = self.transport.blocks(url, start, end)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                logging.warning("Fetching blocks %s-%s from %s failed: %s", start, end, url, e)
+                continue
+            if len(blocks) == len(headers) and all(isinstance(block, dict) for block in blocks):
+                # Hashed here, in the download thread; the cached hashes are reused when applying
+                blocks = [Block(block) for block in blocks]
+                if all(block.get('hash') == block.content_hash == header['hash']
+                       for block, header in zip(blocks, headers)):
+                    return blocks
+            logging.warning("Peer %s sent blocks %s-%s that don't match their headers", url, start, end)
+        raise SyncError(f'No peer served blocks {start}-{end}')
+
+    def _signatures_valid(self, blocks: List[dict]) -> bool:
+        signed = [tx for block in blocks for tx in block['transactions'] if tx.get('sender') != '']
+        return all(self.blockchain.verifier.verify_batch(signed))
+
+    def sync(self) -> dict:
+        """Catch up with the best chain among the peers; returns what was done."""
+        if not self._running.acquire(blocking=False):
+            return {'status': False, 'error': 'Sync already running'}
+        try:
+            self.last_result = self._sync()
+            return self.last_result
+        finally:
+            self._running.release()
+
+    def _sync(self) -> dict:
+        writer = self.node.writer
+        locator = self.blockchain.get_block_locator(writer.snapshot)
+        urls = self._peer_urls()
+        candidates: Dict[str, List[dict]] = {}
+        with ThreadPoolExecutor(max_workers=max(min(self.workers, len(urls)), 1)) as pool:
+            futures = {url: pool.submit(self._fetch_headers, url, locator) for url in urls}
+            for url, future in futures.items():
+                try:
+                    candidates[url] = future.result()
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    logging.warning("Fetching headers from %s failed: %s", url, e)
+
+        best: Optional[tuple] = None
+        snapshot = writer.snapshot
+        for url, headers in candidates.items():
+            gain = self._fork_gain(headers, snapshot)
+            if gain is not None and gain[1] > 0 and (best is None or gain[1] > best[1][1]):
+                best = (url, gain, headers)
+        if best is None:
+            return {'status': True, 'added': 0, 'reorganized': False, 'height': snapshot.height}
+
+        url, (fork_height, _), headers = best
+        headers = [h for h in headers if h['index'] > fork_height]
+        tip_hash = headers[-1]['hash']
+        # Only peers that announced the winning chain are asked for its bodies
+        sources = [u for u, hs in candidates.items() if any(h.get('hash') == tip_hash for h in hs)]
+        ranges = [headers[i:i + self.batch_size] for i in range(0, len(headers), self.batch_size)]
+        reorganize = fork_height < snapshot.height
+        collected: List[dict] = []
+        added = 0
+        previous = headers[0]['previous_hash']
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as pool:
+            futures = [
+                pool.submit(self._fetch_range, batch, sources[i % len(sources):] + sources[:i % len(sources)])
+                for i, batch in enumerate(ranges)
+            ]
+            try:
+                for future in futures:
+                    blocks = future.result()
+                    if blocks[0]['previous_hash'] != previous or not self._signatures_valid(blocks):
+                        raise SyncError(f"Blocks from {blocks[0]['index']} failed validation")
+                    previous = blocks[-1]['hash']
+                    if reorganize:
+                        collected.extend(blocks)
+                        continue
+                    appended = writer.call(self._append, blocks)
+                    added += appended
+                    if appended < len(blocks):
+                        raise SyncError(f"Block {blocks[appended]['index']} no longer fits the chain")
+            except SyncError as e:
+                for future in futures:
+                    future.cancel()
+                logging.warning("Chain sync from %s stopped: %s", url, e)
+                return {'status': False, 'error': str(e), 'added': added, 'reorganized': False,
+                        'height': writer.snapshot.height}
+
+        if reorganize:
+            if not writer.call(self.blockchain.reorganize, fork_height, collected):
+                return {'status': False, 'error': 'Chain changed during sync', 'added': 0,
+                        'reorganized': False, 'height': writer.snapshot.height}
+            added = len(collected)
+        valid = writer.is_chain_valid(full=False)
+        logging.info("Synced %d blocks from %d peers (fork at %d)", added, len(sources), fork_height)
+        return {'status': valid, 'added': added, 'reorganized': reorganize, 'height': writer.snapshot.height}
+
+    def _append(self, blocks: List[dict]) -> int:
+        """On the writer: add downloaded blocks to the tip; returns how many fitted."""
+        for count, block in enumerate(blocks):
+            if not self.blockchain.add_block(block, verify_signatures=False):
+                return count
+        return len(blocks)
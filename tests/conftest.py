@@ -0,0 +1,36 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+
+from chainstate import ChainWriter
+from discard_token import DiscardToken
+
+
+@pytest.fixture
+def funded_chain(tmp_path):
+    """A difficulty 1 chain in ``tmp_path`` and the wallet that mined its second block."""
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    chain.max_difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    return chain, wallet
+
+
+@pytest.fixture
+def signed():
+    """``signed(chain, wallet, count)``: that many signed transfers of 1 from ``wallet``."""
+    def sign(chain, wallet, count):
+        return [chain.create_transaction(wallet['address'], f'r{i}', 1, wallet['private_key']) for i in range(count)]
+    return sign
+
+
+@pytest.fixture
+def submit(signed):
+    """``submit(chain, wallet, count)``: admit that many transfers through the chain's writer; returns their hashes."""
+    def admit(chain, wallet, count):
+        hashes = []
+        for tx in signed(chain, wallet, count):
+            assert ChainWriter.of(chain).add_transaction(tx)['status']
+            hashes.append(tx['transaction_hash'])
+        return hashes
+    return admit
@@ -0,0 +1,59 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import random
+from statistics import mean, median
+
+import pytest
+
+from analytics import SortedAmounts, TransactionStats
+
+
+def test_sorted_amounts_matches_sorted_list():
+    values = [random.randint(0, 500) for _ in range(5000)]
+    amounts = SortedAmounts(load=16)
+    for v in values:
+        amounts.add(v)
+    expected = sorted(values)
+    assert len(amounts) == len(expected)
+    assert [amounts[i] for i in range(len(expected))] == expected
+    assert amounts.max() == expected[-1]
+    assert amounts[-1] == expected[-1]
+
+
+def test_transaction_stats_streaming():
+    stats = TransactionStats(exclude_amount=1000)
+    blocks = [
+        {'transactions': [{'amount': 1000}]},
+        {'transactions': [{'amount': 10}, {'amount': 40}]},
+        {'transactions': [{'amount': 20}, {'amount': 30}]},
+    ]
+    for block in blocks:
+        stats.apply_block(block)
+    amounts = [10, 40, 20, 30]
+    assert stats.total == sum(amounts)
+    assert stats.mean() == mean(amounts)
+    assert stats.median() == median(amounts)
+    assert stats.max() == 40
+    assert stats.percentile(0) == 10
+    assert stats.percentile(100) == 40
+    assert stats.percentile(50) == median(amounts)
+    with pytest.raises(ValueError):
+        stats.percentile(101)
+
+
+def test_transaction_stats_empty():
+    stats = TransactionStats()
+    assert stats.mean() == 0
+    assert stats.median() == 0
+    assert stats.max() == 0
+    assert stats.percentile(90) == 0
+
+
+def test_sorted_amounts_views_keep_their_values():
+    amounts = SortedAmounts(load=4)
+    views, expected = [], []
+    for v in [random.randint(0, 50) for _ in range(200)]:
+        amounts.add(v)
+        expected.append(sorted(expected[-1] + [v]) if expected else [v])
+        views.append(amounts.view())
+    for view, values in zip(views, expected):
+        assert [view[i] for i in range(len(view))] == values
@@ -0,0 +1,31 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import json
+import pickle
+
+import pytest
+
+from blocks import Block
+from discard_token import DiscardToken
+
+
+def test_block_caches_hash_and_is_read_only():
+    block = Block({'index': 1, 'previous_hash': 'abc', 'transactions': [], 'nonce': 7}, hash='h')
+    assert block.content_hash == DiscardToken.get_block_hash({k: v for k, v in block.items() if k != 'hash'})
+    assert json.loads(json.dumps(block)) == dict(block)
+    with pytest.raises(TypeError):
+        block['nonce'] = 8
+    with pytest.raises(TypeError):
+        block.update(nonce=8)
+    restored = pickle.loads(pickle.dumps(block))
+    assert restored == block and restored.content_hash == block.content_hash
+
+
+def test_chain_blocks_are_cached_after_mining_and_reload(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    chain.max_difficulty = 1
+    chain.mine('miner')
+    assert all(isinstance(block, Block) for block in chain.chain)
+    assert chain.get_last_block_hash() == chain.chain[-1]['hash']
+    reloaded = DiscardToken(str(tmp_path / 'chain.db'))
+    assert all(block.content_hash == block['hash'] for block in reloaded.chain)
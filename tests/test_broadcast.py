@@ -0,0 +1,278 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import json
+import shutil
+import threading
+
+import requests
+
+from blocks import Block
+from discard_token import DiscardToken
+from metrics import broadcast_messages
+from p2p import BroadcastDispatcher, OrphanPool, PeerNode, SeenCache
+
+
+class FakeResponse:
+
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """Records posts instead of sending them; URLs containing 'down' fail and 'bad' get a 400."""
+
+    instances = []
+
+    def __init__(self, release=None):
+        self.posts = []
+        self.release = release
+        FakeSession.instances.append(self)
+
+    def post(self, url, data=None, timeout=None, headers=None):
+        if self.release is not None:
+            self.release.wait(5)
+        if 'down' in url:
+            raise requests.ConnectionError('unreachable')
+        self.posts.append((url, json.loads(data)))
+        return FakeResponse({}, 400 if 'bad' in url else 200)
+
+    def close(self):
+        pass
+
+
+def test_dispatcher_delivers_in_order_per_peer():
+    dispatcher = BroadcastDispatcher(session_factory=FakeSession)
+    FakeSession.instances = []
+    for i in range(5):
+        dispatcher.submit('peer-a', 'http://a/p2p/block', {'n': i})
+    assert dispatcher.flush()
+    assert [msg['n'] for _, msg in FakeSession.instances[0].posts] == list(range(5))
+    assert dispatcher.stats['delivered'] == 5
+
+    rejected = broadcast_messages.value('rejected')
+    dispatcher.submit('peer-b', 'http://bad/p2p/block', {'n': 5})
+    assert dispatcher.flush()
+    assert (dispatcher.stats['delivered'], dispatcher.stats['rejected'], dispatcher.stats['failed']) == (5, 1, 0)
+    assert broadcast_messages.value('rejected') == rejected + 1
+
+
+def test_full_queue_drops_without_blocking():
+    release = threading.Event()
+    dispatcher = BroadcastDispatcher(max_queue=2, session_factory=lambda: FakeSession(release))
+    results = [dispatcher.submit('slow', 'http://slow/x', {'n': i}) for i in range(5)]
+    assert results.count(False) >= 2
+    assert dispatcher.stats['dropped'] == results.count(False)
+    release.set()
+    assert dispatcher.flush()
+
+
+def test_removed_peer_gets_no_new_queue_until_added_again():
+    dispatcher = BroadcastDispatcher(session_factory=FakeSession)
+    assert dispatcher.submit('peer-a', 'http://a/x', {'n': 0})
+    dispatcher.remove_peer('peer-a')
+    assert dispatcher.submit('peer-a', 'http://a/x', {'n': 1}) is False
+    assert dispatcher.queue_depths() == {}
+    dispatcher.add_peer('peer-a')
+    assert dispatcher.submit('peer-a', 'http://a/x', {'n': 2})
+    assert dispatcher.flush()
+
+
+def test_node_broadcast_returns_immediately_and_drops_dead_peers(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    node = PeerNode(chain, key_file=None, peers_file=None)
+    node.dispatcher.session_factory = FakeSession
+    live = PeerNode(chain, key_file=None, peers_file=None)
+    dead = PeerNode(chain, key_file=None, peers_file=None)
+    node.add_peer('http://live', live.public_key_pem)
+    node.add_peer('http://down', dead.public_key_pem)
+
+    node.broadcast_transaction({'transaction_hash': 'abc'})
+    node.flush_inventory()
+    assert node.dispatcher.flush()
+    assert list(node.peers) == [live.node_id]
+    assert node.dispatcher.submit(dead.node_id, 'http://down', {}) is False
+    stats = node.stats()
+    assert stats['broadcast']['delivered'] == 1
+    assert stats['broadcast']['failed'] == 1
+    assert stats['peers'] == 1
+
+
+def test_seen_cache_counts_duplicates_and_expires():
+    cache = SeenCache(maxsize=2, ttl=60)
+    assert cache.seen('tx:a', 'p1') is False
+    cache.add('tx:a', 'p1')
+    assert cache.seen('tx:a', 'p2') is True
+    assert cache.sources('tx:a') == {'p1', 'p2'}
+    cache.add('block:b')
+    cache.add('tx:c')
+    assert cache.seen('tx:a') is False
+    assert cache.stats() == {'size': 2, 'duplicates_suppressed': {'tx': 1}}
+    cache.ttl = 0
+    assert cache.seen('tx:c') is False
+    assert len(cache) == 0
+
+
+def test_broadcast_skips_peers_that_sent_the_item(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    node = PeerNode(chain, key_file=None, peers_file=None)
+    FakeSession.instances = []
+    node.dispatcher.session_factory = FakeSession
+    origin = PeerNode(chain, key_file=None, peers_file=None)
+    other = PeerNode(chain, key_file=None, peers_file=None)
+    node.add_peer('http://origin', origin.public_key_pem)
+    node.add_peer('http://other', other.public_key_pem)
+
+    node.seen.add('tx:abc', origin.node_id)
+    node.broadcast_transaction({'transaction_hash': 'abc'})
+    node.flush_inventory()
+    assert node.dispatcher.flush()
+    posts = [post for session in FakeSession.instances for post in session.posts]
+    assert [url for url, _ in posts] == ['http://other/p2p/inv']
+    assert posts[0][1]['inventory'] == [{'type': 'tx', 'hash': 'abc'}]
+    assert node.seen.seen('tx:abc', other.node_id)
+
+
+def test_gossip_key_ignores_the_claimed_hash(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    wallet = chain.create_wallet()
+    tx = chain.create_transaction(wallet['address'], 'bob', 1, wallet['private_key'])
+    forged = dict(tx, amount=1000)
+    assert PeerNode.gossip_key('tx', tx) == f"tx:{tx['transaction_hash']}"
+    assert PeerNode.gossip_key('tx', forged) != PeerNode.gossip_key('tx', tx)
+    block = chain.chain[0]
+    assert PeerNode.gossip_key('block', dict(block)) == f"block:{block['hash']}"
+    assert PeerNode.gossip_key('block', dict(block, nonce=1)) != f"block:{block['hash']}"
+    assert PeerNode.gossip_key('tx', {'transaction_hash': 'abc'}) is None
+    assert PeerNode.gossip_key('block', [('hash', 'abc')]) is None
+
+    cache = SeenCache()
+    cache.add('tx:abc', 'p1')
+    assert 'tx:abc' in cache and 'tx:def' not in cache
+    assert cache.sources('tx:abc') == {'p1'} and cache.stats()['duplicates_suppressed'] == {}
+    cache.discard('tx:abc')
+    assert cache.seen('tx:abc', 'p2') is False
+
+
+class RoutingSession:
+    """Delivers posts straight to the in-process node registered for the URL's host."""
+
+    nodes = {}
+    posts = []
+
+    def post(self, url, data=None, timeout=None, headers=None):
+        host, path = url.split('/p2p/')
+        RoutingSession.posts.append(url)
+        node = RoutingSession.nodes[host]
+        handler = node.handle_inventory if path == 'inv' else node.handle_data
+        return FakeResponse(handler(json.loads(data)))
+
+    def close(self):
+        pass
+
+
+def test_inventory_fetches_only_missing_items(tmp_path):
+    chain_a = DiscardToken(str(tmp_path / 'a.db'))
+    chain_a.difficulty = 1
+    chain_a.max_difficulty = 1
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'b.db')
+    chain_b = DiscardToken(str(tmp_path / 'b.db'))
+    node_a = PeerNode(chain_a, key_file=None, peers_file=None)
+    node_b = PeerNode(chain_b, key_file=None, peers_file=None)
+    for node in (node_a, node_b):
+        node.dispatcher.session_factory = RoutingSession
+    node_a.add_peer('http://b', node_b.public_key_pem)
+    node_b.add_peer('http://a', node_a.public_key_pem)
+    RoutingSession.nodes = {'http://a': node_a, 'http://b': node_b}
+    RoutingSession.posts = []
+
+    wallet = chain_a.create_wallet()
+    # Through the writer, so that node A's snapshot has what it announces
+    block = node_a.writer.mine(wallet['address'])['block']
+    tx = chain_a.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    assert node_a.writer.add_transaction(tx)['status']
+    node_a.broadcast_block(block)
+    node_a.broadcast_transaction(tx)
+    node_a.flush_inventory()
+    assert node_a.dispatcher.flush()
+    node_b.flush_inventory()
+    assert node_b.dispatcher.flush()
+
+    assert chain_b.get_block_by_hash(block['hash']) == block
+    assert tx['transaction_hash'] in chain_b.mempool
+    # One inventory and one data message; B has nothing to send back to A
+    assert RoutingSession.posts == ['http://b/p2p/inv', 'http://b/p2p/data']
+    assert node_a.stats()['inventory']['served'] == 2
+    assert node_b.stats()['inventory']['received'] == 2
+
+    node_a.broadcast_transaction(tx)
+    node_a.flush_inventory()
+    assert node_a.dispatcher.flush()
+    assert RoutingSession.posts[-1] == 'http://b/p2p/inv'
+    assert node_a.stats()['inventory']['served'] == 2
+
+
+def test_inventory_rejects_forged_sender(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    node = PeerNode(chain, key_file=None, peers_file=None)
+    other = PeerNode(chain, key_file=None, peers_file=None)
+    msg = other._signed('inventory', [{'type': 'tx', 'hash': 'abc'}])
+    assert node.handle_inventory(msg) == {'status': True, 'getdata': [{'type': 'tx', 'hash': 'abc'}]}
+    assert node.handle_inventory(msg) == {'status': True, 'getdata': []}
+    junk = other._signed('inventory', [1, None, 'tx', {'type': 'tx', 'hash': 'ghi'}])
+    assert node.handle_inventory(junk) == {'status': True, 'getdata': [{'type': 'tx', 'hash': 'ghi'}]}
+    msg['inventory'] = [{'type': 'tx', 'hash': 'def'}]
+    assert node.handle_inventory(msg) is None
+
+
+def test_forged_data_does_not_hide_the_real_item(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    chain.max_difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    node = PeerNode(chain, key_file=None, peers_file=None)
+    peer = PeerNode(chain, key_file=None, peers_file=None)
+    tx = chain.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    forged = dict(tx, signature='00')
+
+    assert node.handle_data(peer._signed('items', {'transactions': [forged]}))['accepted']['transactions'] == 0
+    assert node.handle_data(peer._signed('items', {'transactions': [dict(tx, amount=1)]}))['accepted']['transactions'] == 0
+    assert node.handle_data(peer._signed('items', {'transactions': [tx]}))['accepted']['transactions'] == 1
+    assert tx['transaction_hash'] in chain.mempool
+    assert node.handle_data(peer._signed('items', {'transactions': [tx]}))['accepted']['transactions'] == 0
+
+
+def test_out_of_order_blocks_connect_from_orphan_pool(tmp_path):
+    source = DiscardToken(str(tmp_path / 'a.db'))
+    source.difficulty = 1
+    source.max_difficulty = 1
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'b.db')
+    blocks = [source.mine('miner')['block'] for _ in range(3)]
+    chain = DiscardToken(str(tmp_path / 'b.db'))
+    chain.difficulty = 1
+    node = PeerNode(chain, key_file=None, peers_file=None)
+
+    assert node.accept_block(blocks[2]) is False
+    assert node.accept_block(blocks[1]) is False
+    tampered = dict(blocks[2], hash='f' * 64)
+    assert node.accept_block(tampered) is False
+    free = Block(dict(blocks[2], index=50, difficulty=0, nonce=0))
+    assert node.accept_block(dict(free, hash=free.content_hash)) is False
+    assert len(node.orphans) == 2
+    assert node.accept_block(blocks[0]) is True
+    assert [b['hash'] for b in node.blockchain.chain] == [b['hash'] for b in source.chain]
+    assert node.stats()['orphans'] == {'size': 0, 'added': 2, 'connected': 2, 'expired': 0, 'evicted': 0}
+
+
+def test_orphan_pool_expires_by_age_and_size():
+    pool = OrphanPool(maxsize=2, ttl=60)
+    for i in range(3):
+        assert pool.add({'hash': f'h{i}', 'previous_hash': 'p'})
+    assert not pool.add({'hash': 'h2', 'previous_hash': 'p'})
+    assert 'h0' not in pool
+    pool.ttl = 0
+    assert pool.pop_children('p') == []
+    assert pool.stats() == {'size': 0, 'added': 3, 'connected': 0, 'expired': 2, 'evicted': 1}
@@ -0,0 +1,142 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from chainstate import ChainWriter
+from p2p import PeerNode
+from producer import BlockProducer
+
+
+@pytest.fixture
+def writer_chain(funded_chain):
+    chain, wallet = funded_chain
+    writer = ChainWriter(chain)
+    writer.start()
+    yield writer, chain, wallet
+    writer.stop()
+
+
+def test_concurrent_writes_are_all_applied(writer_chain, signed):
+    writer, chain, wallet = writer_chain
+    transactions = signed(chain, wallet, 40)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(writer.add_transaction, transactions))
+    assert all(result['status'] for result in results)
+    # Each caller's write is visible in the snapshot once its call returns
+    assert len(writer.snapshot.pending) == 40
+    assert writer.writes == 40 and writer.batches <= 40
+
+    before = writer.snapshot
+    result = writer.mine('miner')
+    assert result['status'] and len(result['block']['transactions']) == 41
+    after = writer.snapshot
+    assert (before.height, len(before.pending)) == (1, 40)
+    assert (after.height, after.pending, after.tip_hash) == (2, (), chain.get_last_block_hash())
+    assert after[-1] is after.tip and after[1:] == [chain.chain[1], chain.chain[2]]
+    with pytest.raises(IndexError):
+        before[2]
+
+
+def test_write_exceptions_reach_the_caller(writer_chain):
+    writer, chain, _ = writer_chain
+    with pytest.raises(KeyError):
+        writer.call(chain.add_block, {'index': 2})
+    assert writer.call(lambda: writer.call(chain.get_last_index)) == 1
+
+
+def test_snapshots_answer_index_lookups_as_of_their_version(writer_chain, signed):
+    writer, chain, wallet = writer_chain
+    tx = signed(chain, wallet, 1)[0]
+    assert writer.add_transaction(tx)['status']
+    before = writer.snapshot
+    writer.mine('miner')
+    after = writer.snapshot
+
+    assert before.get_tx_status(tx['transaction_hash']) == {'status': 'pending'}
+    assert before.get_wallet_balance(wallet['address'])['pending_outgoing'] == 1
+    assert not before.has_address('r0') and before.get_tx(tx['transaction_hash']) == tx
+    assert after.get_tx_status(tx['transaction_hash'])['status'] == 'confirmed'
+    assert after.get_wallet_balance('r0')['balance'] == 1
+    assert after.get_all_addresses() == chain.get_all_addresses()
+    assert 'r0' not in before.get_all_addresses()['address_lst']
+    assert before.get_total_tokens() + 1 + chain.mining_reward + tx['fee'] == after.get_total_tokens()
+    assert after.get_headers([before.tip_hash]) == [{k: v for k, v in chain.chain[2].items() if k != 'transactions'}]
+
+
+def test_signatures_are_checked_before_the_writer(writer_chain, signed):
+    writer, chain, wallet = writer_chain
+    forged = dict(signed(chain, wallet, 1)[0], amount=2)
+    assert writer.add_transaction(forged) == {'status': False, 'error': 'Invalid Signature'}
+    block = chain.create_block([forged])
+    block['hash'] = chain.proof_of_work(block)
+    assert writer.add_block(block) is False
+    # Neither forgery reached the writer
+    assert writer.writes == 0 and len(chain.chain) == 2
+
+
+def test_mining_does_not_block_writes_and_retries_on_a_new_tip(writer_chain, signed):
+    writer, chain, wallet = writer_chain
+    in_pow, release = threading.Event(), threading.Event()
+    proof_of_work = chain.proof_of_work
+
+    def slow_proof_of_work(block):
+        if not in_pow.is_set():
+            in_pow.set()
+            release.wait(10)
+        return proof_of_work(block)
+
+    chain.proof_of_work = slow_proof_of_work
+    first, second = signed(chain, wallet, 2)
+    assert writer.add_transaction(first)['status']
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        mining = pool.submit(writer.mine)
+        assert in_pow.wait(10)
+        # While the first candidate is being mined, writes and reads carry on
+        assert writer.add_transaction(second)['status']
+        assert len(writer.snapshot.pending) == 2
+        # and a competing block confirms the candidate's transaction
+        assert writer.call(chain.mine)['status']
+        release.set()
+        result = mining.result(10)
+    assert result == {'status': False, 'error': 'No transactions to mine'}
+    assert writer.snapshot.height == 2 and writer.snapshot.pending == ()
+    mined = [tx['transaction_hash'] for tx in chain.chain[2]['transactions']]
+    assert sorted(mined) == sorted([first['transaction_hash'], second['transaction_hash']])
+    assert chain.is_chain_valid(full=True)
+
+
+def test_a_chain_has_one_writer(writer_chain):
+    writer, chain, _ = writer_chain
+    assert ChainWriter.of(chain) is writer
+    assert PeerNode(chain, key_file=None, peers_file=None).writer is writer
+    assert BlockProducer(chain).writer is writer
+    with pytest.raises(ValueError):
+        ChainWriter(chain)
+
+
+def test_full_validation_runs_outside_the_writer(writer_chain):
+    writer, chain, _ = writer_chain
+    validate_chain = chain.validate_chain
+    threads = []
+
+    def recording_validate_chain(blocks, difficulty, workers=None):
+        threads.append(threading.current_thread())
+        # Writes carry on while the snapshot is validated
+        if len(threads) == 1:
+            assert writer.call(chain.mine, 'miner')['status']
+        return validate_chain(blocks, difficulty, workers)
+
+    chain.validate_chain = recording_validate_chain
+    assert writer.is_chain_valid(full=True)
+    assert threads == [threading.current_thread()]
+    # Adding the new block checked it, and the older result doesn't move the checkpoint back
+    assert (chain.verified_height, writer.snapshot.height) == (2, 2)
+
+    # A result for a chain that has since been replaced is not recorded
+    stale = chain.chain[:2] + [dict(chain.chain[2], hash='0' * 64)]
+    assert chain.record_validation(stale, False) is False
+    assert chain.verified_height == 2
+    assert chain.record_validation(chain.chain[:], False) is False
+    assert chain.verified_height == 0
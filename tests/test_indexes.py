@@ -0,0 +1,70 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from discard_token import DiscardToken
+from indexes import BalanceIndex
+
+
+def test_balance_index_tracks_blocks(funded_chain):
+    chain, wallet = funded_chain
+    recipient = chain.create_wallet()
+    tx = chain.create_transaction(wallet['address'], recipient['address'], 10, wallet['private_key'])
+    chain.add_transaction(tx)
+    chain.mine()
+
+    sender = chain.get_wallet_balance(wallet['address'])
+    assert sender['amount_received'] == 50
+    assert sender['amount_sent'] == 11
+    assert sender['balance'] == 39
+    assert sender['transactions'] == 2
+    assert chain.get_wallet_balance(recipient['address'])['balance'] == 10
+
+    rebuilt = BalanceIndex()
+    rebuilt.rebuild(chain.get_chain())
+    assert rebuilt.accounts == chain.balances.accounts
+
+
+def test_balance_index_persisted(tmp_path, funded_chain):
+    chain, wallet = funded_chain
+    reloaded = DiscardToken(str(tmp_path / 'chain.db'))
+    assert reloaded.balances.height == 1
+    assert reloaded.balances.accounts == chain.balances.accounts
+    assert reloaded.get_wallet_balance(wallet['address'])['balance'] == 50
+
+
+def test_tx_index_pending_then_confirmed(funded_chain):
+    chain, wallet = funded_chain
+    tx = chain.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    chain.add_transaction(tx)
+    tx_hash = tx['transaction_hash']
+    assert tx_hash in chain.tx_index.pending
+    assert chain.tx_index.locate(tx_hash) is None
+    assert chain.add_transaction(tx)['error'] == 'Duplicate Transaction'
+
+    chain.mine()
+    assert tx_hash not in chain.tx_index.pending
+    assert chain.tx_index.locate(tx_hash) == (2, 0)
+    assert chain.get_tx(tx_hash) == tx
+    assert chain.add_transaction(tx)['error'] == 'Duplicate Transaction'
+    assert chain.get_tx('missing') is None
+
+
+def test_address_registry_pages_sorted(funded_chain):
+    chain, wallet = funded_chain
+    for recipient in ('carol', 'alice', 'bob'):
+        tx = chain.create_transaction(wallet['address'], recipient, 1, wallet['private_key'])
+        chain.add_transaction(tx)
+    chain.mine()
+
+    assert chain.has_address('alice')
+    assert not chain.has_address('mallory')
+    addresses = chain.get_all_addresses()['address_lst']
+    assert addresses == sorted(addresses)
+    assert len(addresses) == 7
+
+    page = chain.get_addresses_page(offset=1, limit=3)
+    assert page['total'] == 7
+    assert [a['address'] for a in page['addresses']] == addresses[1:4]
+    first = chain.get_addresses_page(0, 1)['addresses'][0]
+    assert first == {'address': '', 'first_seen': 1, 'last_seen': 1}
+    seen = chain.address_registry.addresses[wallet['address']]
+    assert seen == (1, 2)
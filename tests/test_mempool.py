@@ -0,0 +1,151 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from discard_token import DiscardToken
+from mempool import Mempool
+
+
+def make_tx(n, fee=1, sender='alice', amount=5):
+    return {'transaction_hash': f'h{n}', 'sender': sender, 'recipient': 'bob',
+            'amount': amount, 'fee': fee}
+
+
+def test_sender_totals_and_removal():
+    pool = Mempool()
+    pool.add(make_tx(1, amount=5))
+    pool.add(make_tx(2, amount=7))
+    pool.add(make_tx(3, sender='carol', amount=2))
+    assert pool.pending_outgoing('alice') == 12
+    assert pool.pending_outgoing('carol') == 2
+    assert pool.add(make_tx(1)) == (False, [])
+    pool.remove(['h1', 'h3'])
+    assert pool.pending_outgoing('alice') == 7
+    assert pool.pending_outgoing('carol') == 0
+    assert [tx['transaction_hash'] for tx in pool] == ['h2']
+
+
+def test_select_orders_by_fee_rate():
+    pool = Mempool()
+    for n, fee in enumerate([1, 5, 3, 5]):
+        pool.add(make_tx(n, fee=fee))
+    assert [tx['transaction_hash'] for tx in pool.select(3)] == ['h1', 'h3', 'h2']
+    assert len(pool.select()) == 4
+
+
+def test_full_pool_evicts_lowest_fee():
+    pool = Mempool(max_size=2)
+    pool.add(make_tx(1, fee=2))
+    pool.add(make_tx(2, fee=1))
+    assert pool.add(make_tx(3, fee=1)) == (False, [])
+    accepted, evicted = pool.add(make_tx(4, fee=3))
+    assert accepted
+    assert [tx['transaction_hash'] for tx in evicted] == ['h2']
+    assert 'h2' not in pool and 'h4' in pool
+    assert pool.bytes == sum(e['size'] for e in pool.entries.values())
+
+
+def test_expiry():
+    pool = Mempool(expiry=10)
+    pool.add(make_tx(1), now=100)
+    pool.add(make_tx(2), now=105)
+    assert [tx['transaction_hash'] for tx in pool.expire(now=112)] == ['h1']
+    assert len(pool) == 1
+    assert pool.pending_outgoing('alice') == 5
+
+
+def test_arrival_time_survives_restart(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    tx = chain.create_transaction(wallet['address'], 'bob', 1, wallet['private_key'])
+    assert chain.add_transaction(tx)['status']
+    arrived = chain.mempool.added_at(tx['transaction_hash'])
+    reloaded = DiscardToken(str(tmp_path / 'chain.db'))
+    assert reloaded.mempool.added_at(tx['transaction_hash']) == arrived
+    assert reloaded.mempool.expire(now=arrived + reloaded.mempool.expiry + 1) == [tx]
+
+
+def test_chain_rejects_when_mempool_full(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    chain.mempool.max_size = 1
+    first = chain.create_transaction(wallet['address'], 'bob', 1, wallet['private_key'])
+    assert chain.add_transaction(first)['status']
+    second = chain.create_transaction(wallet['address'], 'bob', 1, wallet['private_key'], fee=0)
+    assert chain.add_transaction(second)['error'] == 'Mempool Full'
+    richer = chain.create_transaction(wallet['address'], 'bob', 1, wallet['private_key'], fee=5)
+    assert chain.add_transaction(richer)['status']
+    assert chain.get_pending_transactions() == [richer]
+    assert DiscardToken(str(tmp_path / 'chain.db')).get_pending_transactions() == [richer]
+
+
+def test_batch_admission_dedupes_and_tracks_running_balances(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])  # 50 token reward
+
+    def spend(amount):
+        return chain.create_transaction(wallet['address'], 'bob', amount, wallet['private_key'])
+
+    first, second, overspend = spend(20), spend(20), spend(20)
+    forged = dict(spend(5), amount=4)
+    results = chain.add_transactions([first, dict(first), second, overspend, forged, dict(spend(1), amount=0), 'x'])
+    assert [r['status'] for r in results] == [True, False, True, False, False, False, False]
+    assert [r.get('error') for r in results[1:] if not r['status']] == [
+        'Duplicate Transaction', 'Insufficient Balance', 'Invalid Signature', 'Invalid Amount', 'Invalid Signature']
+    assert chain.get_pending_outgoing_total(wallet['address']) == 40
+    reloaded = DiscardToken(str(tmp_path / 'chain.db'))
+    assert {tx['transaction_hash'] for tx in reloaded.get_pending_transactions()} == {
+        first['transaction_hash'], second['transaction_hash']}
+
+
+def test_batch_eviction_releases_the_evicted_senders_funds(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])  # 50 token reward
+    chain.mempool.max_size = 1
+
+    def spend(amount, fee):
+        return chain.create_transaction(wallet['address'], 'bob', amount, wallet['private_key'], fee=fee)
+
+    # Each transaction evicts the one before it, so the third only has to fit next to nothing
+    batch = [spend(20, 1), spend(20, 5), spend(15, 10)]
+    verdicts = chain.verify_transactions(batch)
+    assert verdicts == [True, True, True]
+    results = chain.add_transactions(batch, verdicts)
+    assert [r['status'] for r in results] == [False, False, True]
+    assert chain.get_pending_outgoing_total(wallet['address']) == 15
+    assert chain.verify_transactions([batch[0], dict(batch[0]), 'x']) == [True, False, False]
+
+
+def test_views_are_unaffected_by_later_changes():
+    pool = Mempool()
+    pool.add(make_tx(1, amount=5))
+    pool.add(make_tx(2, amount=7))
+    first, totals = pool.view()
+    assert pool.view()[0] is first
+    pool.remove(['h1'])
+    pool.add(make_tx(3, sender='carol', amount=2))
+    second, _ = pool.view()
+    pool.clear()
+    assert [tx['transaction_hash'] for tx in first.values()] == ['h1', 'h2']
+    assert totals['alice'] == 12 and 'carol' not in totals
+    assert 'h1' not in second and second['h3']['sender'] == 'carol' and len(second) == 2
+    assert [tx['transaction_hash'] for tx in second.values()] == ['h2', 'h3']
+    assert len(pool.view()[0]) == 0
+
+
+def test_views_fold_their_layers_back_into_a_copy():
+    pool = Mempool()
+    views = []
+    for n in range(1200):
+        pool.add(make_tx(n))
+        views.append(pool.view()[0])
+    # Past the layer limit or the change budget, views stop stacking layers
+    assert len(views[-1]._layers) <= pool._entries_journal.max_layers
+    assert all(len(view) == n + 1 and f'h{n}' in view for n, view in enumerate(views))
+    assert f'h{len(views) - 1}' not in views[-2]
@@ -0,0 +1,55 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import metrics
+from discard_token import DiscardToken
+from metrics import Registry
+
+
+def test_render_uses_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests served.', ('method',))
+    requests.inc(1, 'GET')
+    requests.inc(2, 'GET')
+    requests.inc(1, 'PO"ST')
+    registry.gauge('queue_depth', 'Queued items.', ('peer',), fn=lambda: {('a',): 3})
+    registry.gauge('height', 'Chain height.').set(7)
+    text = registry.render()
+    assert '# HELP requests_total Requests served.\n# TYPE requests_total counter\n' in text
+    assert 'requests_total{method="GET"} 3\n' in text
+    assert 'requests_total{method="PO\\"ST"} 1\n' in text
+    assert 'queue_depth{peer="a"} 3\n' in text
+    assert '# TYPE height gauge\nheight 7\n' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 2\n' in text
+    assert 'latency_seconds_bucket{le="1.0"} 3\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4\n' in text
+    assert 'latency_seconds_sum 3.65\n' in text
+    assert 'latency_seconds_count 4\n' in text
+    with latency.time():
+        pass
+    assert latency.count() == 5
+
+
+def test_mining_and_storage_writes_are_recorded(tmp_path):
+    saved = metrics.storage_bytes_written.value('replace_all')
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    # A new database is bootstrapped with the genesis block in one full write
+    assert metrics.storage_bytes_written.value('replace_all') > saved
+    chain.difficulty = 1
+    chain.max_difficulty = 1
+    mined = metrics.mining_duration.count()
+    hashes = metrics.mining_hashes.value()
+    appends = metrics.storage_write_duration.count('append_block')
+    written = metrics.storage_bytes_written.value('append_block')
+    assert chain.mine('miner')['status']
+    assert metrics.mining_duration.count() == mined + 1
+    assert metrics.mining_hashes.value() > hashes
+    assert metrics.storage_write_duration.count('append_block') == appends + 1
+    assert metrics.storage_bytes_written.value('append_block') > written
+    assert 'discard_mining_hashes_total ' in metrics.REGISTRY.render()
@@ -0,0 +1,54 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from discard_token import DiscardToken
+from mining import NonceHasher, ParallelMiner
+
+
+def sample_block():
+    return {
+        'index': 1,
+        'timestamp': 1700000000.0,
+        'transactions': [{'sender': 'a', 'recipient': 'b', 'amount': 1, 'fee': 1}],
+        'previous_hash': 'ab' * 32,
+        'difficulty': 3,
+        'nonce': 0,
+    }
+
+
+def test_parallel_miner_matches_block_hash():
+    block = sample_block()
+    miner = ParallelMiner(workers=2, inline_below=0)
+    result = miner.mine(block, 3)
+    block['nonce'] = result['nonce']
+    assert DiscardToken.get_block_hash(block) == result['hash']
+    assert result['hash'].startswith('000')
+    assert result['attempts'] > 0
+    assert result['hash_rate'] > 0
+
+
+def test_inline_miner_finds_first_nonce():
+    block = sample_block()
+    result = ParallelMiner(workers=1).mine(block, 2)
+    for nonce in range(result['nonce']):
+        block['nonce'] = nonce
+        assert not DiscardToken.get_block_hash(block).startswith('00')
+    assert result['attempts'] == result['nonce'] + 1
+
+
+def test_mine_with_workers(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'), mining_workers=2)
+    chain.miner.inline_below = 0
+    chain.difficulty = 2
+    wallet = chain.create_wallet()
+    result = chain.mine(wallet['address'])
+    assert result['status']
+    assert result['hash_rate'] > 0
+    assert chain.is_chain_valid()
+
+
+def test_nonce_hasher_matches_get_block_hash():
+    block = sample_block()
+    block['transactions'].append({'nonce': 0.25, 'amount': 3, 'sender': 'x', 'recipient': 'y'})
+    hasher = NonceHasher(block)
+    for nonce in (0, 1, 9, 10, 12345, 10 ** 12):
+        assert hasher.hash(nonce) == DiscardToken.get_block_hash(dict(block, nonce=nonce))
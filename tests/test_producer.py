@@ -0,0 +1,64 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import time
+
+from producer import BlockProducer
+
+
+def test_mine_respects_max_transactions(funded_chain, submit):
+    chain, wallet = funded_chain
+    hashes = submit(chain, wallet, 3)
+    result = chain.mine('miner', max_transactions=2)
+    assert result['status']
+    mined = [tx['transaction_hash'] for tx in result['block']['transactions']]
+    assert len(mined) == 3 and set(mined[:2]) < set(hashes)
+    assert result['block']['transactions'][-1]['recipient'] == 'miner'
+    assert result['block']['transactions'][-1]['amount'] == chain.mining_reward + 2
+    statuses = sorted(chain.get_tx_status(h)['status'] for h in hashes)
+    assert statuses == ['confirmed', 'confirmed', 'pending']
+    assert chain.get_tx_status('missing') == {'status': 'unknown'}
+
+
+def test_producer_batches_and_confirms(funded_chain, submit):
+    chain, wallet = funded_chain
+    mined = []
+    producer = BlockProducer(chain, on_block=mined.append, max_transactions=4,
+                             max_interval=0.2)
+    hashes = submit(chain, wallet, 6)
+    producer.start()
+    try:
+        receipts = [producer.wait_for_confirmation(h, timeout=10) for h in hashes]
+    finally:
+        producer.stop()
+    assert all(receipt['status'] == 'confirmed' for receipt in receipts)
+    assert len(mined) == 2
+    assert [len(block['transactions']) for block in mined] == [4, 2]
+    assert chain.get_pending_transactions() == []
+
+
+def test_producer_waits_for_min_fill(funded_chain, submit):
+    chain, wallet = funded_chain
+    producer = BlockProducer(chain, max_transactions=10, max_interval=0.05, min_fill=3)
+    producer.start()
+    try:
+        hashes = submit(chain, wallet, 2)
+        producer.notify()
+        assert producer.wait_for_confirmation(hashes[0], timeout=0.3)['status'] == 'pending'
+        hashes += submit(chain, wallet, 1)
+        producer.notify()
+        assert producer.wait_for_confirmation(hashes[0], timeout=10)['status'] == 'confirmed'
+    finally:
+        producer.stop()
+
+
+def test_producer_backs_off_after_a_failed_block(funded_chain, submit):
+    chain, wallet = funded_chain
+    attempts = []
+    chain.add_block = lambda block, verify_signatures=True: attempts.append(block) and False
+    producer = BlockProducer(chain, max_transactions=1, max_interval=0.2)
+    submit(chain, wallet, 1)
+    producer.start()
+    try:
+        time.sleep(0.5)
+    finally:
+        producer.stop()
+    assert 1 <= len(attempts) <= 4
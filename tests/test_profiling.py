@@ -0,0 +1,77 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pstats
+import time
+
+from flask import Flask
+
+from profiling import RequestProfiler
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(0.05)
+        return 'slow'
+
+    @app.route('/fast')
+    def fast():
+        return 'fast'
+
+    return app
+
+
+def test_profiler_is_absent_until_installed():
+    app = make_app()
+    client = app.test_client()
+    assert 'Server-Timing' not in client.get('/fast').headers
+    assert client.get('/admin/profiles').status_code == 404
+    assert not app.before_request_funcs and not app.after_request_funcs
+
+
+def test_slow_requests_are_profiled_and_downloadable(tmp_path):
+    app = make_app()
+    profiler = RequestProfiler(threshold=0.04, keep=2).install(app)
+    client = app.test_client()
+    assert 'cpu;dur=' in client.get('/fast').headers['Server-Timing']
+    for _ in range(3):
+        client.get('/slow?n=1')
+
+    listing = client.get('/admin/profiles').get_json()
+    assert [p['path'] for p in listing['profiles']] == ['/slow?n=1', '/slow?n=1']
+    assert listing['endpoints']['fast']['count'] == 1
+    assert listing['endpoints']['slow']['max_wall'] >= 0.05
+    newest = listing['profiles'][0]
+    assert newest['id'] == 3 and newest['wall'] >= 0.05 and newest['cpu'] < newest['wall']
+
+    text = client.get(f"/admin/profiles/{newest['id']}?sort=tottime").get_data(as_text=True)
+    assert 'sleep' in text
+    assert client.get(f"/admin/profiles/{newest['id']}?sort=bogus").status_code == 400
+    assert client.get('/admin/profiles/1').status_code == 404
+
+    download = client.get(f"/admin/profiles/{newest['id']}?format=prof")
+    assert download.headers['Content-Type'] == 'application/octet-stream'
+    path = tmp_path / 'slow.prof'
+    path.write_bytes(download.data)
+    assert any(name == '<built-in method time.sleep>' for _, _, name in pstats.Stats(str(path)).stats)
+    assert profiler.report(99) is None
+
+
+def test_admin_routes_need_the_token_or_a_local_client():
+    app = make_app()
+    RequestProfiler(threshold=10).install(app)
+    client = app.test_client()
+    assert client.get('/admin/profiles').status_code == 200
+    assert client.get('/admin/profiles', environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 403
+
+    app = make_app()
+    RequestProfiler(threshold=0, token='s3cret').install(app)
+    client = app.test_client()
+    client.get('/fast')
+    assert client.get('/admin/profiles').status_code == 401
+    assert client.get('/admin/profiles/1', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    remote = {'REMOTE_ADDR': '10.0.0.5'}
+    auth = {'Authorization': 'Bearer s3cret'}
+    assert client.get('/admin/profiles', headers=auth, environ_base=remote).status_code == 200
+    assert client.get('/admin/profiles/1', headers=auth, environ_base=remote).status_code == 200
@@ -0,0 +1,80 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sdk import AsyncSDKChain, SDKChain
+
+
+class Handler(BaseHTTPRequestHandler):
+    flaky = {}
+    requests = []
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        Handler.requests.append(('GET', self.path))
+        if Handler.flaky.get(self.path):
+            Handler.flaky[self.path] -= 1
+            return self._reply(503, {'error': 'busy'})
+        self._reply(200, {'path': self.path})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        Handler.requests.append(('POST', self.path))
+        results = [{'status': True, 'transaction_hash': tx['transaction_hash']} for tx in body['transactions']]
+        self._reply(200, {'accepted': len(results), 'rejected': 0, 'results': results})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Handler.requests = []
+    Handler.flaky = {'/chain/last-hash': 1}
+    yield f'http://127.0.0.1:{httpd.server_port}/'
+    httpd.shutdown()
+
+
+def test_client_builds_urls_from_base_and_retries(server):
+    with SDKChain('chain', base_url=server) as client:
+        assert client.get_last_hash() == {'status': 200, 'data': {'path': '/chain/last-hash'}}
+        assert client.get_block_hash(3)['data']['path'] == '/chain/block/3/hash'
+        assert client.get_pending_transactions()['data']['path'] == '/pending-transactions'
+        assert client.get_block(2)['data']['path'] == '/chain/block/2'
+        assert client.get_total_blocks()['data']['path'] == '/chain/total-blocks'
+        assert client.get_balance('abc')['data']['path'] == '/address/abc'
+        assert client.mine('abc')['data']['path'] == '/mine?miner_address=abc'
+        # A failed mine may still have mined a block, so it is not retried
+        Handler.flaky['/mine'] = 1
+        assert client.mine()['status'] == 503
+    assert Handler.requests[:2] == [('GET', '/chain/last-hash')] * 2
+    assert Handler.requests.count(('GET', '/mine')) == 1
+    assert SDKChain.create_wallet(server) == {'path': '/address/create'}
+
+
+def test_async_client_pipelines_requests_and_batches(server):
+    txs = [{'transaction_hash': f'h{i}'} for i in range(25)]
+
+    async def run():
+        async with AsyncSDKChain(base_url=server, max_concurrency=8) as client:
+            blocks = await asyncio.gather(*(client.get_block_hash(i) for i in range(10)))
+            results = await client.submit_many(txs, batch_size=10)
+        return blocks, results
+
+    blocks, results = asyncio.run(run())
+    assert [b['data']['path'] for b in blocks] == [f'/chain/block/{i}/hash' for i in range(10)]
+    assert [r['transaction_hash'] for r in results] == [tx['transaction_hash'] for tx in txs]
+    assert Handler.requests.count(('POST', '/transactions/batch')) == 3
@@ -0,0 +1,66 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import json
+import sqlite3
+
+from discard_token import DiscardToken
+
+
+def test_state_survives_restart(tmp_path):
+    db = str(tmp_path / 'chain.db')
+    chain = DiscardToken(db)
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    tx = chain.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    assert chain.add_transaction(tx)['status']
+
+    reloaded = DiscardToken(db)
+    assert reloaded.get_chain() == chain.get_chain()
+    assert reloaded.get_pending_transactions() == [tx]
+    assert reloaded.difficulty == chain.difficulty
+
+    chain.mine()
+    reloaded = DiscardToken(db)
+    assert len(reloaded.get_chain()) == 3
+    assert reloaded.get_pending_transactions() == []
+    assert reloaded.is_chain_valid()
+
+
+def test_blocks_are_stored_as_rows(tmp_path):
+    db = str(tmp_path / 'chain.db')
+    chain = DiscardToken(db)
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 2
+    row = conn.execute(
+        "SELECT block_height FROM transactions WHERE recipient=?", (wallet['address'],)
+    ).fetchone()
+    assert row == (1,)
+    assert conn.execute("SELECT COUNT(*) FROM state WHERE key='chain'").fetchone()[0] == 0
+
+
+def test_migrates_legacy_state_table(tmp_path):
+    db = str(tmp_path / 'chain.db')
+    source = DiscardToken(str(tmp_path / 'source.db'))
+    source.difficulty = 1
+    wallet = source.create_wallet()
+    source.mine(wallet['address'])
+    pending = source.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("CREATE TABLE state (key TEXT PRIMARY KEY, value TEXT)")
+        for key, value in (('chain', source.chain), ('pending', [pending]), ('difficulty', 3)):
+            conn.execute("INSERT INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+    conn.close()
+
+    migrated = DiscardToken(db)
+    assert migrated.get_chain() == source.get_chain()
+    assert migrated.get_pending_transactions() == [pending]
+    assert migrated.difficulty == 3
+    conn = sqlite3.connect(db)
+    keys = {k for (k,) in conn.execute("SELECT key FROM state")}
+    assert 'chain' not in keys and 'pending' not in keys
@@ -0,0 +1,133 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import shutil
+
+from discard_token import DiscardToken
+from p2p import PeerNode
+from sync import ChainSync
+
+
+class LocalTransport:
+    """Serves headers and blocks straight from in-process chains, keyed by URL."""
+
+    def __init__(self, chains, tampered=()):
+        self.chains = chains
+        self.tampered = set(tampered)
+        self.block_requests = []
+
+    def headers(self, url, locator, limit):
+        return self.chains[url].get_headers(locator, limit)
+
+    def blocks(self, url, start, end):
+        self.block_requests.append((url, start, end))
+        blocks = [dict(block) for block in self.chains[url].chain[start:end]]
+        if url in self.tampered:
+            blocks[0]['timestamp'] = 0
+        return blocks
+
+
+def open_chain(path):
+    chain = DiscardToken(str(path))
+    chain.difficulty = 1
+    chain.max_difficulty = 1
+    return chain
+
+
+def make_node(chain, peers):
+    node = PeerNode(chain, key_file=None, peers_file=None)
+    for url in peers:
+        node.peers[url] = {'url': url, 'public_key': '', 'last_seen': 0}
+    return node
+
+
+def test_lagging_node_downloads_ranges_from_several_peers(tmp_path):
+    base = open_chain(tmp_path / 'a.db')
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'b.db')
+    for _ in range(7):
+        base.mine('miner')
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'c.db')
+    lagging = open_chain(tmp_path / 'b.db')
+    transport = LocalTransport({'http://a': base, 'http://c': open_chain(tmp_path / 'c.db')})
+    syncer = ChainSync(make_node(lagging, ['http://a', 'http://c']), transport, batch_size=2)
+
+    result = syncer.sync()
+    assert result == {'status': True, 'added': 7, 'reorganized': False, 'height': 7}
+    assert [b['hash'] for b in lagging.chain] == [b['hash'] for b in base.chain]
+    assert {url for url, _, _ in transport.block_requests} == {'http://a', 'http://c'}
+    assert lagging.get_wallet_balance('miner') == base.get_wallet_balance('miner')
+    assert syncer.sync()['added'] == 0
+
+
+def test_independently_created_nodes_share_genesis_and_sync(tmp_path):
+    first = open_chain(tmp_path / 'a.db')
+    for _ in range(2):
+        first.mine('miner')
+    fresh = open_chain(tmp_path / 'b.db')
+    assert fresh.chain[0] == first.chain[0]
+
+    syncer = ChainSync(make_node(fresh, ['http://a']), LocalTransport({'http://a': first}))
+    assert syncer.sync() == {'status': True, 'added': 2, 'reorganized': False, 'height': 2}
+    assert [b['hash'] for b in fresh.chain] == [b['hash'] for b in first.chain]
+    assert fresh.is_chain_valid(full=True)
+
+
+def test_bad_bodies_are_fetched_again_from_another_peer(tmp_path):
+    base = open_chain(tmp_path / 'a.db')
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'b.db')
+    for _ in range(3):
+        base.mine('miner')
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'c.db')
+    lagging = open_chain(tmp_path / 'b.db')
+    transport = LocalTransport({'http://a': base, 'http://bad': open_chain(tmp_path / 'c.db')},
+                               tampered=['http://bad'])
+    syncer = ChainSync(make_node(lagging, ['http://bad', 'http://a']), transport, batch_size=1)
+
+    assert syncer.sync()['added'] == 3
+    assert lagging.chain[-1]['hash'] == base.chain[-1]['hash']
+    assert lagging.is_chain_valid()
+
+
+def test_node_reorganizes_onto_heavier_chain(tmp_path):
+    base = open_chain(tmp_path / 'a.db')
+    wallet = base.create_wallet()
+    base.mine(wallet['address'])
+    shutil.copy(tmp_path / 'a.db', tmp_path / 'b.db')
+    for _ in range(3):
+        base.mine('miner')
+    forked = open_chain(tmp_path / 'b.db')
+    tx = forked.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    assert forked.add_transaction(tx)['status']
+    forked.mine('other-miner')
+    assert forked.is_chain_valid(full=False)
+
+    syncer = ChainSync(make_node(forked, ['http://a']), LocalTransport({'http://a': base}))
+    result = syncer.sync()
+    assert result == {'status': True, 'added': 3, 'reorganized': True, 'height': 4}
+    assert [b['hash'] for b in forked.chain] == [b['hash'] for b in base.chain]
+    assert forked.get_wallet_balance('other-miner')['balance'] == 0
+    # The transaction from the abandoned block is pending again
+    assert forked.get_tx_status(tx['transaction_hash'])['status'] == 'pending'
+
+    reloaded = open_chain(tmp_path / 'b.db')
+    assert [b['hash'] for b in reloaded.chain] == [b['hash'] for b in base.chain]
+    assert reloaded.is_chain_valid()
+
+
+def test_reorganization_drops_pending_spends_the_new_chain_cannot_pay(tmp_path):
+    local = open_chain(tmp_path / 'a.db')
+    wallet = local.create_wallet()
+    local.mine(wallet['address'])  # this reward only exists on the local chain
+    spend = local.create_transaction(wallet['address'], 'bob', 40, wallet['private_key'])
+    assert local.add_transaction(spend)['status']
+    heavier = open_chain(tmp_path / 'b.db')
+    for _ in range(3):
+        heavier.mine('miner')
+
+    result = ChainSync(make_node(local, ['http://b']), LocalTransport({'http://b': heavier})).sync()
+    assert result['reorganized'] is True
+    assert local.get_wallet_balance(wallet['address'])['balance'] == 0
+    assert local.get_pending_outgoing_total(wallet['address']) == 0
+    assert local.get_tx_status(spend['transaction_hash'])['status'] == 'unknown'
+    block = local.mine('miner')['block']
+    assert spend['transaction_hash'] not in [tx['transaction_hash'] for tx in block['transactions']]
+    assert local.get_wallet_balance(wallet['address'])['balance'] == 0
+    assert open_chain(tmp_path / 'a.db').get_pending_transactions() == []
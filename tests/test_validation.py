@@ -0,0 +1,47 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from discard_token import DiscardToken
+
+
+def build_chain(tmp_path, blocks):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    chain.max_difficulty = 1
+    wallet = chain.create_wallet()
+    for _ in range(blocks):
+        chain.mine(wallet['address'])
+    return chain
+
+
+def test_incremental_validation_advances_checkpoint(tmp_path):
+    chain = build_chain(tmp_path, 3)
+    assert chain.verified_height == 3
+    assert chain.verified_hash == chain.get_chain()[-1]['hash']
+    bogus = chain.create_block([])
+    bogus['hash'] = 'f' * 64
+    chain.chain.append(bogus)
+    assert chain.is_chain_valid(full=False) is False
+    assert chain.verified_height == 3
+
+
+def test_incremental_skips_verified_blocks_but_full_does_not(tmp_path):
+    chain = build_chain(tmp_path, 3)
+    chain.chain[1]['transactions'][0]['amount'] = 99
+    assert chain.is_chain_valid(full=False) is True
+    assert chain.is_chain_valid(full=True) is False
+    assert chain.verified_height == 0
+
+
+def test_parallel_full_validation(tmp_path):
+    chain = build_chain(tmp_path, 6)
+    assert chain.is_chain_valid(full=True, workers=2) is True
+    chain.chain[4]['transactions'][0]['amount'] = 99
+    assert chain.is_chain_valid(full=True, workers=2) is False
+
+
+def test_reloaded_chain_is_revalidated(tmp_path):
+    build_chain(tmp_path, 2)
+    reloaded = DiscardToken(str(tmp_path / 'chain.db'))
+    assert reloaded.verified_height == 0
+    assert reloaded.is_chain_valid(full=False) is True
+    assert reloaded.verified_height == 2
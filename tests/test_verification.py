@@ -0,0 +1,77 @@
+import os,sys; sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from discard_token import DiscardToken
+from sdk import SDKChain
+from verification import PublicKeyCache, SignatureVerifier, public_key_cache, verify_transaction
+
+
+def signed_transactions(count):
+    wallet = DiscardToken.create_wallet()
+    return [
+        SDKChain.create_transaction(wallet['private_key'], wallet['address'], 'bob', i + 1)
+        for i in range(count)
+    ]
+
+
+def test_batch_verdicts_in_order():
+    txs = signed_transactions(6)
+    txs[1] = dict(txs[1], amount=999)
+    txs[3] = dict(txs[3], signature='00')
+    del txs[4]['public_key']
+    verifier = SignatureVerifier(workers=2, min_batch=2, chunk_size=2)
+    try:
+        assert verifier.verify_batch(txs) == [True, False, True, False, False, True]
+    finally:
+        verifier.close()
+    assert SignatureVerifier(workers=1).verify_batch(txs) == [True, False, True, False, False, True]
+
+
+def test_verify_transaction_rejects_garbage():
+    assert verify_transaction(None) is False
+    tx = signed_transactions(1)[0]
+    assert verify_transaction(tx) is True
+    assert verify_transaction(dict(tx, public_key='not a key')) is False
+
+
+def test_add_block_rejects_forged_transaction(tmp_path):
+    chain = DiscardToken(str(tmp_path / 'chain.db'))
+    chain.difficulty = 1
+    wallet = chain.create_wallet()
+    chain.mine(wallet['address'])
+    forged = chain.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    forged['amount'] = 40
+    block = chain.create_block([forged])
+    block['hash'] = chain.proof_of_work(block)
+    assert chain.add_block(dict(block)) is False
+
+    honest = chain.create_transaction(wallet['address'], 'bob', 5, wallet['private_key'])
+    block = chain.create_block([honest])
+    block['hash'] = chain.proof_of_work(block)
+    assert chain.add_block(block) is True
+
+
+def test_public_key_cache_hits_and_evicts():
+    cache = PublicKeyCache(maxsize=2)
+    wallets = [DiscardToken.create_wallet() for _ in range(3)]
+    pems = [w['public_key'] for w in wallets]
+    first = cache.load(pems[0])
+    assert cache.load(pems[0]) is first
+    assert cache.address(pems[0]) == wallets[0]['address']
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+    cache.load(pems[1])
+    cache.load(pems[2])
+    assert len(cache) == 2
+    cache.load(pems[0])
+    assert cache.stats()['misses'] == 4
+    assert cache.address(pems[2]) == wallets[2]['address']
+    assert cache.stats()['hits'] == 3
+    assert cache.address('not a key') == DiscardToken.hash_str('not a key')
+
+
+def test_repeat_verification_uses_cache():
+    public_key_cache.clear()
+    txs = signed_transactions(3)
+    assert all(verify_transaction(tx) for tx in txs)
+    # The address check misses once and parses the key; every later lookup hits
+    assert public_key_cache.stats()['misses'] == 1
+    assert public_key_cache.stats()['hits'] == 5
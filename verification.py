@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from metrics import signature_verify_duration, signatures_verified
+
+
+REQUIRED_FIELDS = ('sender', 'recipient', 'amount', 'fee', 'timestamp', 'nonce',
+                   'transaction_hash', 'signature', 'public_key')
+PAYLOAD_FIELDS = ('sender', 'recipient', 'amount', 'fee', 'timestamp', 'nonce')
+
+
+def _hash_json(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class PublicKeyCache:
+    """Bounded LRU cache of parsed public keys and their derived addresses, keyed by PEM.
+
+    A handful of active senders and peers sign most messages, so caching
+    skips the PEM/ASN.1 parse and the address hash on repeat visits. The
+    cache and its hit/miss counters belong to one process: batches that
+    :class:`SignatureVerifier` sends to worker processes use and count in
+    those workers' own caches.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, public_key_pem: str) -> tuple:
+        with self._lock:
+            entry = self._entries.get(public_key_pem)
+            if entry is not None:
+                self._entries.move_to_end(public_key_pem)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Parse outside the lock; a racing parse of the same key is harmless
+        entry = (
+            serialization.load_pem_public_key(public_key_pem.encode()),
+            _hash_json(public_key_pem),
+        )
+        with self._lock:
+            self._entries[public_key_pem] = entry
+            self._entries.move_to_end(public_key_pem)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def load(self, public_key_pem: str):
+        """Return the parsed key; raises ``ValueError`` for an invalid PEM."""
+        return self._get(public_key_pem)[0]
+
+    def address(self, public_key_pem: str) -> str:
+        """Return the wallet address (hash of the PEM) for a public key.
+
+        A miss parses and caches the key too, since the signature check that
+        follows the address check needs it.
+        """
+        try:
+            return self._get(public_key_pem)[1]
+        except (ValueError, TypeError, AttributeError):
+            # Not a parseable key, so nothing to cache; the signature check will fail
+            return _hash_json(public_key_pem)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                'maxsize': self.maxsize}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by every verifier in this process; worker processes get their own
+public_key_cache = PublicKeyCache()
+
+
+def verify_signature(data, public_key_pem: str, signature_hex: str) -> bool:
+    """Check an ECDSA/SHA-256 signature over the canonical JSON of ``data``."""
+    try:
+        public_key = public_key_cache.load(public_key_pem)
+        public_key.verify(
+            bytes.fromhex(signature_hex),
+            json.dumps(data, sort_keys=True).encode(),
+            ec.ECDSA(hashes.SHA256()),
+        )
+        return True
+    except (InvalidSignature, ValueError, TypeError, AttributeError):
+        return False
+
+
+def payload_hash(transaction: dict) -> str:
+    """The hash a transaction's ``transaction_hash`` must equal, computed from its payload fields."""
+    return _hash_json({k: transaction[k] for k in PAYLOAD_FIELDS})
+
+
+def verify_transaction(transaction) -> bool:
+    """Validate a signed transaction, stopping at the first failed check.
+
+    The cheap checks (fields, payload hash, address derivation) run before
+    the signature, so malformed transactions never reach ECDSA.
+    """
+    if not isinstance(transaction, dict) or not all(k in transaction for k in REQUIRED_FIELDS):
+        return False
+    if not isinstance(transaction['public_key'], str):
+        return False
+    payload = {k: transaction[k] for k in PAYLOAD_FIELDS}
+    if _hash_json(payload) != transaction['transaction_hash']:
+        return False
+    if public_key_cache.address(transaction['public_key']) != transaction['sender']:
+        return False
+    return verify_signature(payload, transaction['public_key'], transaction['signature'])
+
+
+def _verify_transactions(transactions: Sequence[dict]) -> List[bool]:
+    return [verify_transaction(tx) for tx in transactions]
+
+
+class SignatureVerifier:
+    """Verifies batches of signatures, spread over a process pool when large enough.
+
+    Batches smaller than ``min_batch`` (or any batch with a single worker)
+    are checked inline, since shipping them to a worker costs more than
+    the verification itself. Results are returned per item, in order.
+    """
+
+    def __init__(self, workers: Optional[int] = 1, min_batch: int = 64, chunk_size: int = 128):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_batch = min_batch
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _map(self, func, items: Sequence) -> List[bool]:
+        if self.workers < 2 or len(items) < self.min_batch:
+            return func(items)
+        with self._pool_lock:
+            # Batches are verified from request threads as well as the chain writer
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Aim for at least one chunk per worker so every core gets work
+        size = max(min(self.chunk_size, -(-len(items) // self.workers)), 1)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        results = []
+        for chunk_result in self._pool.map(func, chunks):
+            results.extend(chunk_result)
+        return results
+
+    @staticmethod
+    def _record(kind: str, start: float, verdicts: List[bool]) -> None:
+        signature_verify_duration.observe(time.perf_counter() - start, kind)
+        valid = sum(verdicts)
+        if valid:
+            signatures_verified.inc(valid, 'valid')
+        if valid < len(verdicts):
+            signatures_verified.inc(len(verdicts) - valid, 'invalid')
+
+    def verify(self, transaction) -> bool:
+        start = time.perf_counter()
+        verdict = verify_transaction(transaction)
+        self._record('single', start, [verdict])
+        return verdict
+
+    def verify_batch(self, transactions: Sequence[dict]) -> List[bool]:
+        """Return one verdict per transaction."""
+        start = time.perf_counter()
+        verdicts = self._map(_verify_transactions, list(transactions))
+        if verdicts:
+            self._record('batch', start, verdicts)
+        return verdicts
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None